@@ -0,0 +1,679 @@
+# -*- coding: utf-8 -*-
+
+"""
+Micro benchmarks for the WURFL Python matching engine. A WURFL Python
+database module must be generated first (see 'make dump').
+
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import os
+import sys
+import imp
+import time
+import codecs
+from optparse import OptionParser
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, ROOT)
+
+UAS = os.path.join(ROOT, 'extras', 'wurfl-php', 'tests', 'resources', 'ualist.txt')
+
+WURFL_XML = os.path.join(ROOT, 'extras', 'wurfl-php', 'tests', 'resources', 'wurfl-2.0.27.zip')
+
+# Path of the database being benchmarked.
+DATABASE = None
+
+# Loads a database in a fresh process: root and database paths are given
+# as arguments.
+LOAD = '''
+import sys
+import time
+sys.path.insert(0, sys.argv[1])
+start = time.time()
+import wurfl_python
+if sys.argv[2].endswith('.db'):
+    wurfl_python.load(sys.argv[2])
+elif sys.argv[2].endswith('.snapshot'):
+    wurfl_python.restore(sys.argv[2])
+else:
+    import imp
+    imp.load_source('wurfl', sys.argv[2])
+loaded = time.time()
+'''
+
+STARTUP = LOAD + '''
+for ua in sys.stdin.read().decode('utf8').splitlines():
+    wurfl_python.match(ua)
+matched = time.time()
+rss = 0.0
+for line in open('/proc/self/status'):
+    if line.startswith('VmRSS:'):
+        rss = int(line.split()[1]) / 1024.0
+sys.stdout.write('%f %f %f' % (loaded - start, matched - loaded, rss))
+'''
+
+WARM_UP = LOAD + '''
+if sys.argv[3] == 'warm':
+    wurfl_python.warm_up()
+warmed = time.time()
+latencies = []
+for ua in sys.stdin.read().decode('utf8').splitlines():
+    start = time.time()
+    wurfl_python.match(ua)
+    latencies.append(time.time() - start)
+latencies.sort()
+sys.stdout.write('%f %f %f %f' % (
+    warmed - loaded,
+    latencies[len(latencies) // 2],
+    latencies[int(len(latencies) * 0.99)],
+    latencies[-1]))
+'''
+
+
+def load_database(path):
+    '''
+    Returns the generated database module, or the 'wurfl_python' module
+    after loading a binary database (.db) or restoring a snapshot
+    (.snapshot).
+    '''
+    if path.endswith('.db'):
+        import wurfl_python
+        wurfl_python.load(path)
+        return wurfl_python
+    if path.endswith('.snapshot'):
+        import wurfl_python
+        wurfl_python.restore(path)
+        return wurfl_python
+    return imp.load_source('wurfl', path)
+
+
+def load_uas(path):
+    uas = []
+    with codecs.open(path, 'r', 'utf8', 'replace') as input:
+        for line in input:
+            ua = line.strip().strip(u'"')
+            if ua:
+                uas.append(ua)
+    return uas
+
+
+def timeit(function, uas, rounds):
+    best = None
+    for i in range(rounds):
+        start = time.time()
+        for ua in uas:
+            function(ua)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def rss():
+    '''
+    Resident memory of the process, in MB.
+    '''
+    if os.path.exists('/proc/self/status'):
+        for line in open('/proc/self/status'):
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024.0
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def report(name, elapsed, uas):
+    sys.stdout.write('  %-32s %8.3f s  %8.1f us/ua\n' % (
+        name, elapsed, elapsed * 1000000 / len(uas)))
+
+
+def benchmark_dispatch(wurfl, uas, rounds):
+    '''
+    Keyword dispatcher vs. the linear walk over the chain of handlers.
+    '''
+    from wurfl_python import handlers
+    from wurfl_python import _chain as chain
+
+    mismatches = [ua for ua in uas if chain.match(ua) != chain.match_linear(ua)]
+    sys.stdout.write('  mismatches: %d\n' % len(mismatches))
+
+    def linear(ua):
+        context = handlers.MatchContext(ua)
+        for handler in chain._handlers:
+            if handler.can_handle(ua, context):
+                return handler
+
+    def dispatched(ua):
+        context = handlers.MatchContext(ua)
+        for handler in chain._get_dispatcher().candidates(ua, context):
+            if handler.can_handle(ua, context):
+                return handler
+
+    report('linear can_handle() walk', timeit(linear, uas, rounds), uas)
+    report('dispatched can_handle() walk', timeit(dispatched, uas, rounds), uas)
+    report('linear match()', timeit(chain.match_linear, uas, rounds), uas)
+    report('dispatched match()', timeit(chain.match, uas, rounds), uas)
+
+
+def benchmark_batch(wurfl, uas, rounds):
+    '''
+    match_many() vs. match() on a Zipf-like mix of user agents.
+    '''
+    import random
+    import wurfl_python
+    random.seed(0)
+    mix = [uas[min(int(random.paretovariate(0.5)) - 1, len(uas) - 1)] for i in range(len(uas) * 10)]
+    sys.stdout.write('  %d user agents, %d distinct\n' % (len(mix), len(set(mix))))
+
+    def single(uas):
+        return [wurfl.match(ua) for ua in uas]
+
+    def batch(uas):
+        return wurfl_python.match_many(uas)
+
+    report('match()', timeit(single, [mix], rounds), mix)
+    report('match_many()', timeit(batch, [mix], rounds), mix)
+
+
+def benchmark_cache(wurfl, uas, rounds):
+    '''
+    match() with and without caching on a Zipf-like mix of user agents.
+    '''
+    import random
+    import wurfl_python
+    from wurfl_python import cache
+    random.seed(0)
+    mix = [uas[min(int(random.paretovariate(0.5)) - 1, len(uas) - 1)] for i in range(len(uas) * 10)]
+    sys.stdout.write('  %d user agents, %d distinct\n' % (len(mix), len(set(mix))))
+
+    def run(uas):
+        for ua in uas:
+            wurfl.match(ua)
+
+    report('no cache', timeit(run, [mix], rounds), mix)
+    for name, instance in [
+            ('LRU (100 entries)', cache.LRUCache(100)),
+            ('TinyLFU (100 entries)', cache.TinyLFUCache(100))]:
+        wurfl_python.set_cache(instance)
+        try:
+            report(name, timeit(run, [mix], 1), mix)
+        finally:
+            wurfl_python.set_cache(None)
+        stats = instance.stats()
+        sys.stdout.write('    hit ratio %.1f%%, %d evictions, %d rejections\n' % (
+            100.0 * stats['hits'] / (stats['hits'] + stats['misses']),
+            stats['evictions'],
+            stats['rejections']))
+
+
+def benchmark_memo(wurfl, uas, rounds):
+    '''
+    match() with and without the per handler normalized ua memo, on raw
+    user agents differing only in locale and serial numbers.
+    '''
+    import random
+    from wurfl_python import _chain as chain
+    random.seed(0)
+    locales = [u'en-us', u'en-gb', u'es-es', u'de-de', u'fr-fr', u'zh-tw', u'ja-jp', u'it-it']
+    templates = [
+        u'Mozilla/5.0 (Linux; U; Android 2.3.%d; %s; GT-I9100 Build/GINGERBREAD) AppleWebKit/533.1 (KHTML, like Gecko) Version/4.0 Mobile Safari/533.1',
+        u'Mozilla/5.0 (X11; U; Linux i686; %s) Gecko/2010%04d Firefox/3.6.%d',
+        u'Mozilla/5.0 (BlackBerry; U; BlackBerry 9800; %s) AppleWebKit/534.1+ (KHTML, like Gecko) Version/6.0.0.%d Mobile Safari/534.1+',
+        u'NokiaN95/%d.%d Series60/3.1 Profile/MIDP-2.0 Configuration/CLDC-1.1 /SN%015d',
+    ]
+    mix = []
+    for i in range(len(uas)):
+        template = random.choice(templates)
+        if template.startswith(u'Mozilla/5.0 (Linux'):
+            mix.append(template % (random.randint(1, 7), random.choice(locales)))
+        elif template.startswith(u'Mozilla/5.0 (X11'):
+            mix.append(template % (random.choice(locales), random.randint(1, 1231), random.randint(1, 20)))
+        elif template.startswith(u'Mozilla/5.0 (BlackBerry'):
+            mix.append(template % (random.choice(locales), random.randint(100, 999)))
+        else:
+            mix.append(template % (random.randint(10, 30), random.randint(0, 9), random.randint(0, 10 ** 15)))
+    sys.stdout.write('  %d user agents, %d distinct\n' % (len(mix), len(set(mix))))
+
+    memos = [(handler, handler._normalized_memo) for handler in chain._handlers]
+    try:
+        for handler, memo in memos:
+            handler._normalized_memo = None
+        report('without memo', timeit(wurfl.match, mix, rounds), mix)
+    finally:
+        for handler, memo in memos:
+            handler._normalized_memo = memo
+    report('with memo', timeit(wurfl.match, mix, rounds), mix)
+
+
+def benchmark_ris(wurfl, uas, rounds):
+    '''
+    RIS matcher lookups over the user agents of every handler, truncated
+    to force prefix matching.
+    '''
+    from wurfl_python import _chain as chain
+    from wurfl_python.handlers.matchers.ris import RISMatcher
+    matcher = RISMatcher.INSTANCE()
+    lookups = []
+    for handler in chain._handlers:
+        collection = handler._get_ordered_uas()
+        for ua in collection[::10]:
+            lookups.append((collection, ua[:int(len(ua) * 0.8)]))
+    sys.stdout.write('  %d lookups\n' % len(lookups))
+
+    def lookup(item):
+        matcher.match(item[0], item[1], 10)
+
+    report('RISMatcher.match()', timeit(lookup, lookups, rounds), lookups)
+
+
+def benchmark_ld(wurfl, uas, rounds):
+    '''
+    LD matcher lookups over the catch all buckets on randomly edited user
+    agents of every bucket: python-Levenshtein loop vs. NumPy engine, both
+    scanning the whole bucket and using its candidate index.
+    '''
+    import random
+    from wurfl_python import _chain as chain
+    from wurfl_python.handlers import CatchAllHandler
+    from wurfl_python.handlers.matchers.ld import LDIndex, LDMatcher, NumPyLDMatcher
+    matchers = [('Levenshtein', LDMatcher.INSTANCE())]
+    try:
+        matchers.append(('NumPy', NumPyLDMatcher.INSTANCE()))
+    except ImportError:
+        sys.stdout.write('  NumPy not available\n')
+    random.seed(0)
+
+    def edit(ua):
+        ua = list(ua)
+        for i in range(random.randint(0, 8)):
+            position = random.randint(0, len(ua))
+            char = random.choice(u'abcdefgh0123456789./; ')
+            if position == len(ua) or random.random() < 0.3:
+                ua.insert(position, char)
+            elif random.random() < 0.5:
+                ua[position] = char
+            else:
+                del ua[position]
+        return u''.join(ua)
+
+    handler = [handler for handler in chain._handlers if isinstance(handler, CatchAllHandler)][0]
+    tolerance = handler.MOZILLA_TOLERANCE
+    for name, collection in [
+            ('mozilla4', handler._get_mozilla4_ordered_uas()),
+            ('mozilla5', handler._get_mozilla5_ordered_uas()),
+            ('all', handler._get_ordered_uas())]:
+        needles = [edit(random.choice(collection)) for i in range(200)]
+        index = LDIndex(collection)
+        sys.stdout.write('  %s: %d user agents, %.1f candidates per lookup\n' % (
+            name, len(collection),
+            float(sum(len(index.positions(needle, tolerance)) for needle in needles)) / len(needles)))
+        for engine, matcher in matchers:
+            for label, target in [('scan', collection), ('index', index)]:
+                matcher.match(target, needles[0], tolerance)
+                report('%s %s %s' % (name, engine, label), timeit(
+                    lambda needle: matcher.match(target, needle, tolerance), needles, rounds), needles)
+
+
+def benchmark_memory(wurfl, uas, rounds):
+    '''
+    Resident memory of the process and memory held by the handler buckets
+    (containers plus user agents not shared with the devices).
+    '''
+    from wurfl_python import Repository
+    from wurfl_python import _chain as chain
+    from wurfl_python.handlers import CatchAllHandler
+
+    for ua in uas:
+        wurfl.match(ua)
+    device_uas = set(id(device.ua) for device in Repository._DEVICES.itervalues())
+    seen = set()
+    sizes = {'containers': 0, 'uas': 0}
+
+    def add(item, kind):
+        if id(item) not in seen:
+            seen.add(id(item))
+            sizes[kind] += sys.getsizeof(item)
+
+    for handler in chain._handlers:
+        buckets = [handler._uas_with_device_id]
+        if isinstance(handler, CatchAllHandler):
+            buckets.extend([handler._mozilla4_uas_with_device_id, handler._mozilla5_uas_with_device_id])
+        for bucket in buckets:
+            add(bucket, 'containers')
+            add(bucket.__dict__, 'containers')
+            for items in bucket._sorted:
+                add(items, 'containers')
+            for ua in bucket.uas:
+                if id(ua) not in device_uas:
+                    add(ua, 'uas')
+
+    sys.stdout.write('  %-32s %8.1f MB\n' % ('resident memory', rss()))
+    sys.stdout.write('  %-32s %8.2f MB\n' % ('bucket containers', sizes['containers'] / 1048576.0))
+    sys.stdout.write('  %-32s %8.2f MB\n' % ('bucket user agents', sizes['uas'] / 1048576.0))
+
+
+def benchmark_regex(wurfl, uas, rounds):
+    '''
+    Regular expression compilations while matching, interleaved with an
+    application using its own (more than re._MAXCACHE) regular expressions.
+    '''
+    import re
+    import sre_compile
+    application = [r'^/section%d/(?P<id>\d+)/$' % i for i in range(150)]
+    compilations = {'library': 0, 'application': 0}
+    compile = sre_compile.compile
+
+    def counting_compile(pattern, flags=0):
+        key = 'application' if pattern in application else 'library'
+        compilations[key] += 1
+        return compile(pattern, flags)
+
+    def run(ua):
+        re.match(application[hash(ua) % len(application)], '/section/1/')
+        wurfl.match(ua)
+
+    sre_compile.compile = counting_compile
+    try:
+        re.purge()
+        elapsed = timeit(run, uas, rounds)
+    finally:
+        sre_compile.compile = compile
+    report('match()', elapsed, uas)
+    sys.stdout.write('  library compilations: %d, application compilations: %d\n' % (
+        compilations['library'], compilations['application']))
+
+
+def benchmark_normalize(wurfl, uas, rounds):
+    '''
+    Generic normalization, sequential vs. guarded, and normalization by
+    every handler, with and without sharing the generic stage through the
+    match context.
+    '''
+    import wurfl_python
+    from wurfl_python import handlers
+    from wurfl_python import normalizers
+    from wurfl_python.normalizers import generic
+    sequential = normalizers.UserAgentNormalizer([
+        generic.UPLink(),
+        generic.BlackBerry(),
+        generic.YesWAP(),
+        generic.BabelFish(),
+        generic.SerialNumbers(),
+        generic.NovarraGoogleTranslator(),
+        generic.LocaleRemover(),
+        generic.UCWEB(),
+    ])
+    guarded = wurfl_python._create_generic_normalizers()
+    report('sequential generic', timeit(sequential.normalize, uas, rounds), uas)
+    report('guarded generic', timeit(guarded.normalize, uas, rounds), uas)
+
+    chain_normalizers = [handler._normalizer for handler in wurfl_python._chain._handlers]
+
+    def isolated(ua):
+        for normalizer in chain_normalizers:
+            normalizer.normalize(ua)
+
+    def staged(ua):
+        context = handlers.MatchContext(ua)
+        for normalizer in chain_normalizers:
+            normalizer.normalize_in_context(ua, context)
+
+    report('all handlers, isolated', timeit(isolated, uas, rounds), uas)
+    report('all handlers, staged', timeit(staged, uas, rounds), uas)
+
+
+def benchmark_exact(wurfl, uas, rounds):
+    '''
+    match() with and without the table of user agents of registered
+    devices, on those user agents and on the given ones.
+    '''
+    import wurfl_python
+    registered = [device.ua for device in wurfl_python.Repository._DEVICES.itervalues()]
+    for name, items in [('registered', registered), ('given', uas)]:
+        wurfl_python.set_exact_match(False)
+        try:
+            report('%s, without table' % name, timeit(wurfl.match, items, rounds), items)
+        finally:
+            wurfl_python.set_exact_match(True)
+        hits = wurfl_python.exact_match_hits()
+        report('%s, with table' % name, timeit(wurfl.match, items, rounds), items)
+        sys.stdout.write('    %.1f%% answered by the table\n' % (
+            100.0 * (wurfl_python.exact_match_hits() - hits) / (len(items) * rounds)))
+
+
+def benchmark_devices(wurfl, uas, rounds):
+    '''
+    Resident memory of the process and capability lookup latency over all
+    registered devices: first lookups and repeated ones.
+    '''
+    from wurfl_python import Repository
+    devices = list(Repository._DEVICES.itervalues())
+    names = ['brand_name', 'model_name', 'is_wireless_device', 'release_date']
+
+    def lookup(device):
+        for name in names:
+            getattr(device, name, None)
+
+    start = time.time()
+    for device in devices:
+        lookup(device)
+    elapsed = time.time() - start
+    sys.stdout.write('  %-32s %8.3f us\n' % ('first lookups', elapsed * 1000000 / (len(devices) * len(names))))
+    elapsed = timeit(lookup, devices, rounds)
+    sys.stdout.write('  %-32s %8.3f us\n' % ('repeated lookups', elapsed * 1000000 / (len(devices) * len(names))))
+    sys.stdout.write('  %-32s %8.1f MB\n' % ('resident memory', rss()))
+
+
+def benchmark_classification(wurfl, uas, rounds):
+    '''
+    Time to fill the buckets of all handlers with the uas of all registered
+    devices at runtime (i.e. consulting the chain and normalizing uas) and
+    from classifications precomputed by the processor, one by one and in
+    bulk.
+    '''
+    from wurfl_python import Repository, _chain
+    from wurfl_python.handlers.bucket import Bucket
+    devices = list(Repository._ORDINALS)
+    classifications = [_chain.classify(device.ua) for device in devices]
+    loaded = [handler._get_buckets() for handler in _chain._handlers]
+
+    def fill(register):
+        best = None
+        for i in range(rounds):
+            for handler in _chain._handlers:
+                handler._set_buckets([Bucket() for bucket in handler._get_buckets()])
+            start = time.time()
+            register()
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    try:
+        runtime = fill(lambda: [
+            _chain.filter(device.ua, device.id)
+            for device in devices])
+        precomputed = fill(lambda: [
+            _chain.add(device.ua, device.id, *classification)
+            for device, classification in zip(devices, classifications)])
+        bulk = fill(lambda: _chain.add_many([
+            (device.ua, device.id, classification)
+            for device, classification in zip(devices, classifications)]))
+    finally:
+        for handler, buckets in zip(_chain._handlers, loaded):
+            handler._set_buckets(buckets)
+    sys.stdout.write('  %-32s %8.3f s\n' % ('runtime', runtime))
+    sys.stdout.write('  %-32s %8.3f s\n' % ('precomputed', precomputed))
+    sys.stdout.write('  %-32s %8.3f s\n' % ('precomputed, bulk', bulk))
+
+
+def benchmark_warm_up(wurfl, uas, rounds):
+    '''
+    Fresh process: latency of each of the first 1000 given user agents
+    (median, 99th percentile and maximum), with indexes built lazily by the
+    first matches needing them and built by warm_up() beforehand.
+    '''
+    import subprocess
+    for mode in ['lazy', 'warm']:
+        best = None
+        for i in range(rounds):
+            process = subprocess.Popen(
+                [sys.executable, '-c', WARM_UP, ROOT, DATABASE, mode],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            output, errors = process.communicate(u'\n'.join(uas[:1000]).encode('utf8'))
+            result = [float(value) for value in output.split()]
+            best = result if best is None else [min(a, b) for a, b in zip(best, result)]
+        sys.stdout.write('  %-32s %8.3f s\n' % ('%s: warm_up()' % mode, best[0]))
+        sys.stdout.write('  %-32s %8.3f ms %8.3f ms %8.3f ms\n' % (
+            '%s: median, p99, max' % mode, best[1] * 1000, best[2] * 1000, best[3] * 1000))
+
+
+def benchmark_startup(wurfl, uas, rounds):
+    '''
+    Fresh process: time to import the library and load the database, time
+    of the first match() of the first 1000 given user agents and resident
+    memory.
+    '''
+    import subprocess
+    best = None
+    for i in range(rounds):
+        process = subprocess.Popen(
+            [sys.executable, '-c', STARTUP, ROOT, DATABASE],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        output, errors = process.communicate(u'\n'.join(uas[:1000]).encode('utf8'))
+        result = [float(value) for value in output.split()]
+        best = result if best is None else [min(a, b) for a, b in zip(best, result)]
+    sys.stdout.write('  %-32s %8.3f s\n' % ('load', best[0]))
+    sys.stdout.write('  %-32s %8.3f s\n' % ('first 1000 matches', best[1]))
+    sys.stdout.write('  %-32s %8.1f MB\n' % ('resident memory', best[2]))
+
+
+def benchmark_fall_back(wurfl, uas, rounds):
+    '''
+    Processing of the WURFL PHP test database (wurfl-2.0.27.zip) into a
+    Python module, with devices in their original order and shuffled (i.e.
+    most of them defined before their fall back device).
+    '''
+    import random
+    import shutil
+    import zipfile
+    import tempfile
+    from xml.etree import cElementTree
+    from wurfl_python.processor import Processor
+    directory = tempfile.mkdtemp()
+    try:
+        shuffled = os.path.join(directory, 'wurfl.xml')
+        with zipfile.ZipFile(WURFL_XML) as zfile:
+            tree = cElementTree.parse(zfile.open(zfile.namelist()[0]))
+        devices = tree.getroot().find('devices')
+        items = list(devices)
+        random.Random(0).shuffle(items)
+        devices[:] = items
+        tree.write(shuffled, encoding='utf-8')
+        del tree, devices, items
+
+        output = os.path.join(directory, 'wurfl.py')
+        for name, input in [('original order', WURFL_XML), ('shuffled', shuffled)]:
+            best = None
+            for i in range(rounds):
+                start = time.time()
+                processor = Processor(input, ['product_info'], output)
+                processor.process()
+                processor.output.close()
+                elapsed = time.time() - start
+                best = elapsed if best is None else min(best, elapsed)
+            sys.stdout.write('  %-32s %8.3f s\n' % (name, best))
+    finally:
+        shutil.rmtree(directory)
+
+
+def benchmark_jobs(wurfl, uas, rounds):
+    '''
+    Processing of the WURFL PHP test database (wurfl-2.0.27.zip) into a
+    Python module including all capability groups, with devices encoded
+    by 1, 2 and 4 processes.
+    '''
+    import shutil
+    import tempfile
+    from wurfl_python.processor import Processor
+    directory = tempfile.mkdtemp()
+    try:
+        output = os.path.join(directory, 'wurfl.py')
+        for jobs in (1, 2, 4):
+            best = None
+            for i in range(rounds):
+                start = time.time()
+                processor = Processor(WURFL_XML, None, output, jobs=jobs)
+                processor.process()
+                processor.output.close()
+                elapsed = time.time() - start
+                best = elapsed if best is None else min(best, elapsed)
+            sys.stdout.write('  %-32s %8.3f s\n' % ('%d jobs' % jobs, best))
+    finally:
+        shutil.rmtree(directory)
+
+
+BENCHMARKS = [
+    ('dispatch', benchmark_dispatch),
+    ('batch', benchmark_batch),
+    ('cache', benchmark_cache),
+    ('memo', benchmark_memo),
+    ('ris', benchmark_ris),
+    ('ld', benchmark_ld),
+    ('memory', benchmark_memory),
+    ('regex', benchmark_regex),
+    ('normalize', benchmark_normalize),
+    ('exact', benchmark_exact),
+    ('devices', benchmark_devices),
+    ('classification', benchmark_classification),
+    ('startup', benchmark_startup),
+    ('warm_up', benchmark_warm_up),
+    ('fall_back', benchmark_fall_back),
+    ('jobs', benchmark_jobs),
+]
+
+
+def main():
+    option_parser = OptionParser(usage='%prog [options] [benchmark ...]')
+    option_parser.add_option(
+        '-d',
+        '--database',
+        dest='database',
+        default=os.path.join(ROOT, 'tests', 'wurfl.py'),
+        help='WURFL Python database module, binary database (.db) or snapshot (.snapshot). Defaults to tests/wurfl.py.')
+    option_parser.add_option(
+        '-u',
+        '--uas',
+        dest='uas',
+        default=UAS,
+        help='File containing one user agent per line. Defaults to WURFL PHP ualist.txt.')
+    option_parser.add_option(
+        '-r',
+        '--rounds',
+        dest='rounds',
+        default=3,
+        type='int',
+        help='Number of rounds of every benchmark. Best one is reported. Defaults to 3.')
+
+    options, args = option_parser.parse_args()
+    names = args or [name for name, benchmark in BENCHMARKS]
+    unknown = set(names) - set(name for name, benchmark in BENCHMARKS)
+    if unknown:
+        sys.stderr.write('Unknown benchmarks: %s\n' % ', '.join(sorted(unknown)))
+        sys.exit(1)
+
+    global DATABASE
+    DATABASE = options.database
+    start = time.time()
+    wurfl = load_database(options.database)
+    sys.stdout.write('Database loaded in %.3f s\n' % (time.time() - start))
+    uas = load_uas(options.uas)
+    sys.stdout.write('%d user agents loaded\n' % len(uas))
+
+    for name, benchmark in BENCHMARKS:
+        if name in names:
+            sys.stdout.write('\n[%s] %s\n' % (name, benchmark.__doc__.strip()))
+            benchmark(wurfl, uas, options.rounds)
+
+if __name__ == '__main__':
+    main()
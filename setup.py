@@ -42,4 +42,7 @@ setup(
         'python-Levenshtein',
         'elementtree',
     ],
+    extras_require={
+        'numpy': ['numpy'],
+    },
 )
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import sys
+import unittest
+try:
+    import wurfl
+    import uas
+except ImportError:
+    sys.stderr.write("\nForgot to run 'make dump'? Please, check out the documentation.\n\n")
+    sys.exit(1)
+
+
+class BatchTestCase(unittest.TestCase):
+    def runTest(self):
+        # Duplicated user agents, in reverse order.
+        items = uas.UAS + uas.UAS[::-1]
+        ids = [id for (ua, id) in items]
+        self.assertEqual(ids, [device.id for device in wurfl.match_many([ua for (ua, id) in items])])
+        self.assertEqual(ids, [device.id for device in wurfl.match_many((ua for (ua, id) in items), stream=True, chunk_size=100)])
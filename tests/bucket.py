@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import unittest
+from wurfl_python.handlers.bucket import Bucket
+
+
+class BucketTestCase(unittest.TestCase):
+    def runTest(self):
+        bucket = Bucket()
+        bucket.set(u'b', u'id_b')
+        bucket.set(u'a', u'id_a')
+        bucket.set(u'c', u'id_c')
+        self.assertEqual([u'a', u'b', u'c'], bucket.uas)
+        self.assertEqual(u'id_b', bucket[u'b'])
+        self.assertEqual(None, bucket.get(u'd'))
+        self.assertRaises(KeyError, lambda: bucket[u'd'])
+
+        # Last device id set wins, also across merges.
+        bucket.set(u'b', u'id_b2')
+        bucket.set(u'd', u'id_d')
+        bucket.set(u'b', u'id_b3')
+        self.assertEqual([u'a', u'b', u'c', u'd'], bucket.uas)
+        self.assertEqual(u'id_b3', bucket[u'b'])
+        self.assertTrue(u'd' in bucket)
+        self.assertEqual(4, len(bucket))
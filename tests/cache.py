@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import sys
+import unittest
+try:
+    import wurfl
+    import uas
+except ImportError:
+    sys.stderr.write("\nForgot to run 'make dump'? Please, check out the documentation.\n\n")
+    sys.exit(1)
+import wurfl_python
+from wurfl_python import cache
+
+
+class LRUCacheTestCase(unittest.TestCase):
+    def runTest(self):
+        lru = cache.LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        self.assertEqual(1, lru.get('a'))
+        lru.set('c', 3)
+        self.assertEqual(None, lru.get('b'))
+        self.assertEqual(1, lru.get('a'))
+        self.assertEqual(3, lru.get('c'))
+        self.assertEqual({'size': 2, 'hits': 3, 'misses': 1, 'evictions': 1, 'rejections': 0}, lru.stats())
+
+
+class TinyLFUCacheTestCase(unittest.TestCase):
+    def runTest(self):
+        lfu = cache.TinyLFUCache(2)
+        for key in ('a', 'b'):
+            for i in range(5):
+                lfu.get(key)
+            lfu.set(key, key)
+        # One-off keys do not evict hot ones.
+        for key in ('x', 'y', 'z'):
+            self.assertEqual(None, lfu.get(key))
+            lfu.set(key, key)
+        self.assertEqual('a', lfu.get('a'))
+        self.assertEqual('b', lfu.get('b'))
+        self.assertEqual(3, lfu.rejections)
+        self.assertEqual(0, lfu.evictions)
+
+
+class MatchCacheTestCase(unittest.TestCase):
+    def runTest(self):
+        lfu = cache.TinyLFUCache(1000)
+        wurfl_python.set_cache(lfu)
+        try:
+            for i in range(2):
+                for (ua, id) in uas.UAS:
+                    self.assertEqual(id, wurfl.match(ua).id)
+        finally:
+            wurfl_python.set_cache(None)
+        self.assertTrue(lfu.hits > 0)
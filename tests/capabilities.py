@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import random
+import marshal
+import unittest
+from wurfl_python.capabilities import Store, BoolColumn, IntColumn, FloatColumn, EncodedColumn
+
+VALUES = {
+    u'bool': [True, False],
+    u'int': [0, 1, 240, 320, -1],
+    u'float': [0.0, 1.5, 2.25],
+    u'str': [u'', u'Apple', u'Nokia', u'true'],
+    # Mixed, so the column falls back to dictionary encoding.
+    u'mixed': [1, True, 1.0, u'1', 2 ** 40],
+}
+
+
+class StoreTestCase(unittest.TestCase):
+    def runTest(self):
+        random.seed(42)
+        store = Store()
+        parents = []
+        owns = []
+        for ordinal in range(2000):
+            parent = random.randint(-1, ordinal - 1) if ordinal else -1
+            own = {}
+            for name, values in VALUES.iteritems():
+                if random.random() < 0.3:
+                    own[name] = random.choice(values)
+            self.assertEqual(ordinal, store.add(parent, own))
+            parents.append(parent)
+            owns.append(own)
+
+            # Lookups interleaved with registrations.
+            if ordinal % 500 == 0:
+                self._check(store, parents, owns)
+        self._check(store, parents, owns)
+
+        self.assertTrue(isinstance(store._columns[u'bool'], BoolColumn))
+        self.assertTrue(isinstance(store._columns[u'int'], IntColumn))
+        self.assertTrue(isinstance(store._columns[u'float'], FloatColumn))
+        self.assertTrue(isinstance(store._columns[u'str'], EncodedColumn))
+        self.assertTrue(isinstance(store._columns[u'mixed'], EncodedColumn))
+        self.assertEqual(store.get(0, u'missing', 42), 42)
+
+        # Restored stores hold the same values and accept new devices.
+        store = Store.restore(marshal.loads(marshal.dumps(store.dump())))
+        self._check(store, parents, owns)
+        for ordinal in range(2000, 2200):
+            parent = random.randint(-1, ordinal - 1)
+            own = {u'int': random.choice(VALUES[u'int']), u'str': u'new %d' % ordinal}
+            self.assertEqual(ordinal, store.add(parent, own))
+            parents.append(parent)
+            owns.append(own)
+        self._check(store, parents, owns)
+
+    def _check(self, store, parents, owns):
+        for ordinal in range(len(parents)):
+            for name in VALUES:
+                expected = None
+                current = ordinal
+                while current >= 0:
+                    if name in owns[current]:
+                        expected = owns[current][name]
+                        break
+                    current = parents[current]
+                value = store.get(ordinal, name)
+                self.assertEqual((type(expected), expected), (type(value), value))
+
+
+class IncrementalResolveTestCase(unittest.TestCase):
+    def runTest(self):
+        store = Store()
+        store.add(-1, {u'bool': True, u'int': 1, u'str': u'generic'})
+        columns = dict((name, store.column(name)) for name in (u'bool', u'int', u'str'))
+        arrays = dict((name, (column._defined, column._values)) for name, column in columns.items())
+        for ordinal in range(1, 20):
+            own = {u'int': ordinal} if ordinal % 3 else {}
+            self.assertEqual(ordinal, store.add(ordinal - 1 if ordinal % 5 else -1, own))
+            self.assertEqual(store.get(ordinal, u'int'), ordinal if ordinal % 3 else (
+                None if ordinal % 5 == 0 else ordinal - 1))
+            self.assertEqual(store.get(ordinal, u'bool'), True if ordinal < 5 else None)
+
+        # Arrays are appended to, not replaced, on every lookup.
+        for name, column in columns.items():
+            store.column(name)
+            self.assertEqual(column.resolved, 20)
+            self.assertTrue(column._defined is arrays[name][0])
+            self.assertTrue(column._values is arrays[name][1])
+            self.assertEqual(len(column._defined), 20)
+        self.assertFalse(columns[u'bool']._complete)
+
+        # Codes of encoded columns growing past unsigned shorts.
+        for value in xrange(0x10000):
+            store.encode(u'value %d' % value)
+        store.add(-1, {u'str': u'last'})
+        self.assertEqual(store.get(20, u'str'), u'last')
+        self.assertEqual(store.get(4, u'str'), u'generic')
+        self.assertEqual(columns[u'str']._values.typecode, 'i')
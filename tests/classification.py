@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import sys
+import unittest
+try:
+    import wurfl
+except ImportError:
+    sys.stderr.write("\nForgot to run 'make dump'? Please, check out the documentation.\n\n")
+    sys.exit(1)
+import wurfl_python
+from wurfl_python.handlers.bucket import Bucket
+
+
+class ClassificationTestCase(unittest.TestCase):
+    def runTest(self):
+        chain = wurfl_python._chain
+        devices = wurfl_python.Repository._ORDINALS
+        loaded = [handler._get_buckets() for handler in chain._handlers]
+        try:
+            # Buckets built at runtime.
+            self._reset(chain)
+            for device in devices:
+                chain.filter(device.ua, device.id)
+            filtered = self._dump(chain)
+
+            # Buckets built from precomputed classifications.
+            self._reset(chain)
+            for device in devices:
+                chain.add(device.ua, device.id, *chain.classify(device.ua))
+            self.assertEqual(self._dump(chain), filtered)
+
+            # Buckets built in bulk, with and without classifications.
+            for classify in (chain.classify, lambda ua: None):
+                self._reset(chain)
+                chain.add_many([(device.ua, device.id, classify(device.ua)) for device in devices])
+                self.assertEqual(self._dump(chain), filtered)
+
+            # Buckets built by the loaded module.
+            self.assertEqual(
+                [[(bucket.uas, bucket.device_ids) for bucket in buckets] for buckets in loaded],
+                filtered)
+        finally:
+            for handler, buckets in zip(chain._handlers, loaded):
+                handler._set_buckets(buckets)
+
+    def _reset(self, chain):
+        for handler in chain._handlers:
+            handler._set_buckets([Bucket() for bucket in handler._get_buckets()])
+
+    def _dump(self, chain):
+        return [
+            [(bucket.uas, bucket.device_ids) for bucket in handler._get_buckets()]
+            for handler in chain._handlers]
+
+
+class ClassifyTestCase(unittest.TestCase):
+    def runTest(self):
+        chain = wurfl_python._chain
+        name, normalized_ua, indexes = chain.classify(
+            u'Mozilla/5.0 (Windows NT 6.1; rv:2.0) Gecko/20100101 Firefox/4.0')
+        self.assertEqual(name, u'FirefoxHandler')
+        self.assertEqual(indexes, (0,))
+        name, normalized_ua, indexes = chain.classify(u'Mozilla/5.0 (Unknown)')
+        self.assertEqual(name, u'CatchAllHandler')
+        self.assertEqual(indexes, (0, 2))
+
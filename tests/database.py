@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import os
+import sys
+import tempfile
+import unittest
+try:
+    import wurfl
+except ImportError:
+    sys.stderr.write("\nForgot to run 'make dump'? Please, check out the documentation.\n\n")
+    sys.exit(1)
+import wurfl_python
+from wurfl_python import database
+from wurfl_python.exceptions import InvalidDatabaseException, ReadOnlyDatabaseException
+
+
+class DatabaseTestCase(unittest.TestCase):
+    def setUp(self):
+        descriptor, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(descriptor)
+        database.write(self.path, wurfl_python._engine)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def runTest(self):
+        repository = wurfl_python.Repository
+        chain = wurfl_python._chain
+        mapped = database.Database(self.path)
+        self.assertEqual(mapped.version, repository.version)
+
+        # Devices.
+        devices = database.MappedDevices(mapped, wurfl_python.Engine()._create_device)
+        self.assertEqual(sorted(devices), sorted(repository._DEVICES))
+        store = mapped.capabilities()
+        self.assertEqual(sorted(store.names()), sorted(repository._CAPABILITIES.names()))
+        for id, device in repository._DEVICES.iteritems():
+            other = devices[id]
+            self.assertEqual(
+                (device.ordinal, device.parent_ordinal, device.id, device.ua, device.actual_device_root),
+                (other.ordinal, other.parent_ordinal, other.id, other.ua, other.actual_device_root))
+            for name in store.names():
+                expected = repository._CAPABILITIES.get(device.ordinal, name)
+                value = store.get(device.ordinal, name)
+                self.assertEqual((type(expected), expected), (type(value), value))
+        self.assertEqual(devices.get(u'missing_device'), None)
+
+        # Buckets.
+        handlers = mapped.handlers()
+        self.assertEqual(len(handlers), len(chain._handlers))
+        for handler, (name, buckets) in zip(chain._handlers, handlers):
+            self.assertEqual(name, handler.__class__.__name__)
+            for bucket, other in zip(handler._get_buckets(), buckets):
+                self.assertEqual(bucket.uas, list(other.uas))
+                self.assertEqual(bucket.device_ids, list(other.device_ids))
+
+        # Exact matches.
+        exact_uas = mapped.exact_uas()
+        for device in repository._DEVICES.itervalues():
+            self.assertEqual(chain.exact_match(device.ua), exact_uas.get(device.ua))
+
+        self.assertRaises(ReadOnlyDatabaseException, store.add, -1, {})
+
+
+class InvalidDatabaseTestCase(unittest.TestCase):
+    def runTest(self):
+        self.assertRaises(InvalidDatabaseException, database.Database, wurfl.__file__)
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import sys
+import unittest
+try:
+    import wurfl
+except ImportError:
+    sys.stderr.write("\nForgot to run 'make dump'? Please, check out the documentation.\n\n")
+    sys.exit(1)
+import wurfl_python
+
+
+class DevicesTestCase(unittest.TestCase):
+    def runTest(self):
+        generic = wurfl.find(u'generic')
+        self.assertEqual(generic.parent, None)
+        for device in wurfl_python.Repository._DEVICES.itervalues():
+            self.assertTrue(wurfl.find(device.id) is device)
+            if device.parent is not None:
+                self.assertTrue(device in device.parent.children)
+                self.assertEqual(device.parent.parent_ordinal, wurfl_python.Repository._CAPABILITIES._parents[device.parent.ordinal])
+            for name in (u'brand_name', u'model_name'):
+                self.assertEqual(getattr(device, name), wurfl_python.Repository._CAPABILITIES.get(device.ordinal, name))
+        self.assertRaises(AttributeError, getattr, generic, 'missing_capability')
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import sys
+import unittest
+try:
+    import wurfl
+    import uas
+except ImportError:
+    sys.stderr.write("\nForgot to run 'make dump'? Please, check out the documentation.\n\n")
+    sys.exit(1)
+import wurfl_python
+from wurfl_python import handlers
+
+
+class DispatcherTestCase(unittest.TestCase):
+    def runTest(self):
+        chain = wurfl_python._chain
+        for (ua, id) in uas.UAS:
+            # Same result as walking the whole chain.
+            self.assertEqual(chain.match_linear(ua), chain.match(ua), 'Dispatcher mismatch:\n  UA: %s\n' % ua)
+
+            # Dispatch keywords are necessary conditions of can_handle().
+            candidates = list(chain._get_dispatcher().candidates(ua, handlers.MatchContext(ua)))
+            for handler in chain._handlers:
+                if handler.can_handle(ua, handlers.MatchContext(ua)):
+                    self.assertIn(handler, candidates, 'Missing %s candidate:\n  UA: %s\n' % (
+                        handler.__class__.__name__,
+                        ua))
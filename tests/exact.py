@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import sys
+import unittest
+try:
+    import wurfl
+    import uas
+except ImportError:
+    sys.stderr.write("\nForgot to run 'make dump'? Please, check out the documentation.\n\n")
+    sys.exit(1)
+import wurfl_python
+
+
+class ExactMatchTestCase(unittest.TestCase):
+    def runTest(self):
+        registered = [device.ua for device in wurfl_python.Repository._DEVICES.itervalues()]
+        items = uas.UAS + [(ua, None) for ua in registered]
+        wurfl_python.set_exact_match(False)
+        try:
+            expected = [wurfl.match(ua).id for (ua, id) in items]
+        finally:
+            wurfl_python.set_exact_match(True)
+        hits = wurfl_python.exact_match_hits()
+        self.assertEqual(expected, [wurfl.match(ua).id for (ua, id) in items])
+        self.assertTrue(wurfl_python.exact_match_hits() - hits >= len(registered) * 0.9)
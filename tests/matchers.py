@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import random
+import unittest
+import wurfl_python
+from wurfl_python.handlers import Utils
+from wurfl_python.handlers.matchers.ld import LDIndex, LDMatcher, NumPyLDMatcher, numpy
+from wurfl_python.handlers.matchers.ris import RISMatcher
+
+
+def _longest_common_prefix_length(s, t):
+    length = min(len(s), len(t))
+    i = 0
+    while i < length and s[i] == t[i]:
+        i += 1
+    return i
+
+
+def _ris_match(collection, needle, tolerance):
+    # Straight port of WURFL PHP 'WURFL_Handlers_Matcher_RISMatcher'.
+    match = None
+    best_distance = 0
+    best_index = 0
+    low = 0
+    high = len(collection) - 1
+    while low <= high:
+        mid = (low + high) // 2
+        find = collection[mid]
+        distance = _longest_common_prefix_length(needle, find)
+        if distance >= tolerance and distance > best_distance:
+            best_index = mid
+            match = find
+            best_distance = distance
+        if find < needle:
+            low = mid + 1
+        elif find > needle:
+            high = mid - 1
+        else:
+            break
+    if best_distance < tolerance:
+        return None
+    if best_index == 0:
+        return match
+    while best_index > 0 and \
+          _longest_common_prefix_length(collection[best_index - 1], needle) == best_distance:
+        best_index -= 1
+    return collection[best_index]
+
+
+def _random_ua(random, alphabet, max_length):
+    return u''.join(random.choice(alphabet) for i in range(random.randint(0, max_length)))
+
+
+class RISMatcherTestCase(unittest.TestCase):
+    def runTest(self):
+        matcher = RISMatcher.INSTANCE()
+        generator = random.Random(0)
+        for i in range(5000):
+            alphabet = u'abc'[:generator.randint(1, 3)]
+            collection = sorted(set(_random_ua(generator, alphabet, 6) for j in range(generator.randint(0, 30))))
+            needle = _random_ua(generator, alphabet, 7)
+            tolerance = generator.randint(-1, 7)
+            self.assertEqual(
+                _ris_match(collection, needle, tolerance),
+                matcher.match(collection, needle, tolerance))
+
+
+class LDIndexTestCase(unittest.TestCase):
+    def runTest(self):
+        matcher = LDMatcher.INSTANCE()
+        generator = random.Random(0)
+        for i in range(500):
+            alphabet = u'abcdefghij'[:generator.randint(1, 10)]
+            collection = sorted(set(_random_ua(generator, alphabet, 25) for j in range(generator.randint(0, 50))))
+            index = LDIndex(collection)
+            for j in range(10):
+                needle = _random_ua(generator, alphabet, 28)
+                tolerance = generator.randint(-1, 6)
+                self.assertEqual(
+                    matcher.match(collection, needle, tolerance),
+                    matcher.match(index, needle, tolerance))
+
+
+@unittest.skipIf(numpy is None, 'NumPy not available')
+class NumPyLDMatcherTestCase(unittest.TestCase):
+    def runTest(self):
+        matcher = LDMatcher.INSTANCE()
+        numpy_matcher = NumPyLDMatcher.INSTANCE()
+        generator = random.Random(0)
+        for i in range(500):
+            alphabet = u'abcdefghij'[:generator.randint(1, 10)]
+            collection = sorted(set(_random_ua(generator, alphabet, 25) for j in range(generator.randint(0, 50))))
+            index = LDIndex(collection)
+            for j in range(10):
+                needle = _random_ua(generator, alphabet, 28)
+                tolerance = generator.randint(-1, 8)
+                expected = matcher.match(collection, needle, tolerance)
+                self.assertEqual(expected, numpy_matcher.match(collection, needle, tolerance))
+                self.assertEqual(expected, numpy_matcher.match(index, needle, tolerance))
+
+                # Bound lowered from block to block.
+                numpy_matcher.BLOCK_SIZE = 3
+                try:
+                    self.assertEqual(expected, numpy_matcher.match(collection, needle, tolerance))
+                    self.assertEqual(expected, numpy_matcher.match(index, needle, tolerance))
+                finally:
+                    del numpy_matcher.BLOCK_SIZE
+
+        wurfl_python.set_ld_matcher(NumPyLDMatcher)
+        try:
+            self.assertTrue(Utils.LD_MATCHER is NumPyLDMatcher)
+            self.assertEqual(Utils.ld_match([u'abcd', u'wxyz'], u'abce', 2), u'abcd')
+        finally:
+            wurfl_python.set_ld_matcher(LDMatcher)
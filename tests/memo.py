@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import unittest
+from wurfl_python.handlers import Handler, MatchContext
+
+
+class CountingHandler(Handler):
+    NORMALIZED_MEMO_SIZE = 2
+
+    def __init__(self):
+        super(CountingHandler, self).__init__()
+        self.conclusive_matches = 0
+
+    def can_handle(self, ua, context):
+        return True
+
+    def apply_conclusive_match(self, ua):
+        self.conclusive_matches += 1
+        return super(CountingHandler, self).apply_conclusive_match(ua)
+
+
+class UnmemoizedHandler(CountingHandler):
+    NORMALIZED_MEMO_SIZE = 0
+
+
+class NormalizedMemoTestCase(unittest.TestCase):
+    def runTest(self):
+        handler = self._create_handler(CountingHandler)
+
+        # Repeated variants are matched once.
+        for i in xrange(3):
+            self.assertEqual(self._match(handler, u'Foo/1.0 (c)'), u'foo')
+        self.assertEqual(handler.conclusive_matches, 1)
+
+        # Failed matches are not memoized.
+        for i in xrange(3):
+            self.assertEqual(self._match(handler, u'Qux'), u'generic')
+        self.assertEqual(handler.conclusive_matches, 4)
+        self.assertEqual(len(handler._normalized_memo), 1)
+
+        # The memo is bounded.
+        self.assertEqual(self._match(handler, u'Bar/2.0 (c)'), u'bar')
+        self.assertEqual(self._match(handler, u'Bar/2.0 (d)'), u'bar')
+        self.assertEqual(len(handler._normalized_memo), 2)
+
+        # Registering a device clears the memo.
+        handler.filter(u'Foo/1.0 (c)', u'foo_c', MatchContext(u'Foo/1.0 (c)'))
+        self.assertEqual(len(handler._normalized_memo), 0)
+        self.assertEqual(self._match(handler, u'Foo/1.0 (c)'), u'foo_c')
+        self.assertEqual(self._match(handler, u'Foo/1.0 (cd)'), u'foo_c')
+
+        # A zero size disables the memo.
+        handler = self._create_handler(UnmemoizedHandler)
+        self.assertEqual(handler._normalized_memo, None)
+        for i in xrange(3):
+            self.assertEqual(self._match(handler, u'Foo/1.0 (c)'), u'foo')
+        self.assertEqual(handler.conclusive_matches, 3)
+
+    def _create_handler(self, handler_class):
+        handler = handler_class()
+        for ua, device_id in [(u'Foo/1.0 (a)', u'foo'), (u'Bar/2.0 (b)', u'bar')]:
+            handler.filter(ua, device_id, MatchContext(ua))
+        return handler
+
+    def _match(self, handler, ua):
+        return handler.match(ua, MatchContext(ua))
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import sys
+import unittest
+try:
+    import wurfl
+    import uas
+except ImportError:
+    sys.stderr.write("\nForgot to run 'make dump'? Please, check out the documentation.\n\n")
+    sys.exit(1)
+import wurfl_python
+from wurfl_python import handlers
+from wurfl_python import normalizers
+from wurfl_python.normalizers import generic
+
+
+class GuardedNormalizersTestCase(unittest.TestCase):
+    def runTest(self):
+        sequential = normalizers.UserAgentNormalizer([
+            generic.UPLink(),
+            generic.BlackBerry(),
+            generic.YesWAP(),
+            generic.BabelFish(),
+            generic.SerialNumbers(),
+            generic.NovarraGoogleTranslator(),
+            generic.LocaleRemover(),
+            generic.UCWEB(),
+        ])
+        guarded = wurfl_python._create_generic_normalizers()
+        extra = [
+            u'Mozilla/5.0 (blackberry 9700; en) (via babelfish.yahoo.com) ',
+            u'Nokia6230/2.0 /S (via babelfish.yahoo.com) N123 [TF0123X]',
+            u'SAMSUNG-SGH-E250 Novarra-Vision/8.0',
+        ]
+        for ua in [ua for (ua, id) in uas.UAS] + extra:
+            self.assertEqual(sequential.normalize(ua), guarded.normalize(ua))
+
+
+class StagedNormalizersTestCase(unittest.TestCase):
+    def runTest(self):
+        for (ua, id) in uas.UAS:
+            context = handlers.MatchContext(ua)
+            for handler in wurfl_python._chain._handlers:
+                self.assertEqual(
+                    handler._normalizer.normalize(ua),
+                    handler._normalizer.normalize_in_context(ua, context))
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import os
+import bz2
+import gzip
+import shutil
+import zipfile
+import tempfile
+import unittest
+import wurfl_python
+from wurfl_python import database
+from wurfl_python.processor import Processor, Encoder
+from wurfl_python.exceptions import DeferredDeviceException, InvalidDatabaseException
+
+WURFL_XML = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', 'extras', 'wurfl-php', 'tests', 'resources', 'wurfl-light.xml')
+
+XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<wurfl>
+  <version><ver>test</ver></version>
+  <devices>
+%s
+  </devices>
+</wurfl>
+'''
+
+
+class StreamingProcessorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def runTest(self):
+        with open(WURFL_XML, 'rb') as input:
+            data = input.read()
+        inputs = [WURFL_XML]
+        for suffix, open_ in (('.gz', gzip.open), ('.bz2', bz2.BZ2File)):
+            path = os.path.join(self.directory, 'wurfl.xml' + suffix)
+            output = open_(path, 'wb')
+            output.write(data)
+            output.close()
+            inputs.append(path)
+        path = os.path.join(self.directory, 'wurfl.zip')
+        zfile = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        zfile.writestr('wurfl.xml', data)
+        zfile.close()
+        inputs.append(path)
+
+        modules = []
+        for index, input in enumerate(inputs):
+            output = os.path.join(self.directory, 'wurfl%d.py' % index)
+            processor = Processor(input, None, output)
+            processor.process()
+            processor.output.close()
+            self.assertEqual(processor.version, u'www.wurflpro.com - 2010-02-03 10:31:00')
+            self.assertEqual(processor.done, set([u'generic', u'generic_xhtml', u'generic_web_browser']))
+            with open(output, 'rb') as module:
+                modules.append([line for line in module if not line.startswith(b'# Generated on:')])
+        for module in modules[1:]:
+            self.assertEqual(module, modules[0])
+
+        # Unreadable inputs do not truncate the output.
+        path = os.path.join(self.directory, 'corrupt.xml.gz')
+        with open(path, 'wb') as output:
+            output.write(data[:100])
+        module = os.path.join(self.directory, 'wurfl0.py')
+        with open(module, 'rb') as input:
+            expected = input.read()
+        self.assertRaises(IOError, Processor, path, None, module)
+        with open(module, 'rb') as input:
+            self.assertEqual(input.read(), expected)
+
+
+class ParallelProcessorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def process(self, output, jobs, previous=None):
+        output = os.path.join(self.directory, output)
+        processor = Processor(WURFL_XML, None, output, previous=previous, jobs=jobs)
+        # Several batches.
+        processor.CHUNK_SIZE = 1
+        processor.process()
+        processor.output.close()
+        with open(output, 'rb') as module:
+            return [line for line in module if not line.startswith(b'# Generated on:')]
+
+    def runTest(self):
+        serial = self.process('serial.py', 1)
+        self.assertEqual(self.process('parallel.py', 3), serial)
+        with open(os.path.join(self.directory, 'serial.py.manifest'), 'rb') as manifest:
+            with open(os.path.join(self.directory, 'parallel.py.manifest'), 'rb') as other:
+                self.assertEqual(other.read(), manifest.read())
+
+        # Deltas.
+        previous = os.path.join(self.directory, 'serial.py')
+        self.assertEqual(
+            self.process('parallel_delta.py', 2, previous),
+            self.process('serial_delta.py', 1, previous))
+
+
+class EncodedModuleTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = wurfl_python._engine
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        wurfl_python._swap(self.engine)
+        shutil.rmtree(self.directory)
+
+    def runTest(self):
+        input = os.path.join(self.directory, 'wurfl.xml')
+        output = os.path.join(self.directory, 'wurfl.py')
+        with open(input, 'w') as xml:
+            xml.write(XML % '\n'.join(
+                '<device id="%s" user_agent="%s" fall_back="%s"><group id="product_info">%s</group></device>' % (
+                    id, id.upper(), parent, ''.join(
+                        '<capability name="%s" value="%s"/>' % item for item in sorted(capabilities.items())))
+                for id, parent, capabilities in [
+                    ('generic', 'root', {'brand_name': '', 'is_tablet': 'false', 'release_date': '2010'}),
+                    ('a', 'generic', {'brand_name': 'Nokia', 'is_tablet': 'true', 'release_date': '2010'}),
+                    ('b', 'a', {'brand_name': 'Nokia', 'is_tablet': 'false'}),
+                    ('c', 'b', {}),
+                ]))
+        processor = Processor(input, None, output)
+        processor.process()
+        processor.output.close()
+
+        # Every (name, value) pair and every classification is written
+        # once.
+        with open(output, 'r') as module:
+            lines = module.readlines()
+        constants = [line.strip() for line in lines if line.startswith("    (ur'''")]
+        self.assertEqual(len(constants), 5)
+        self.assertTrue("(ur'''is_tablet''', False)," in constants)
+        classifications = [line.strip() for line in lines if line.startswith("    (u'")]
+        self.assertEqual(classifications, ["(u'CatchAllHandler', None, (0,)),"])
+
+        wurfl_python.reload(output)
+        for id, expected in [
+                (u'generic', (u'', False, 2010)),
+                (u'a', (u'Nokia', True, 2010)),
+                (u'c', (u'Nokia', False, 2010))]:
+            device = wurfl_python.find(id)
+            self.assertEqual((device.brand_name, device.is_tablet, device.release_date), expected)
+
+
+class BinaryProcessorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = wurfl_python._engine
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        wurfl_python._swap(self.engine)
+        shutil.rmtree(self.directory)
+
+    def runTest(self):
+        # Devices registered by the process are not written.
+        wurfl_python._swap(wurfl_python.Engine())
+        wurfl_python.Repository.register(u'other', u'Other', False)
+        for output in ('first.db', 'second.db'):
+            output = os.path.join(self.directory, output)
+            Processor(WURFL_XML, None, output, format='binary').process()
+            mapped = database.Database(output)
+            self.assertEqual(mapped.version, u'www.wurflpro.com - 2010-02-03 10:31:00')
+            self.assertEqual(
+                [mapped.device_id(ordinal) for ordinal in xrange(mapped.devices_count)],
+                [u'generic', u'generic_xhtml', u'generic_web_browser'])
+        self.assertEqual([device.id for device in wurfl_python.Repository._ORDINALS], [u'other'])
+
+
+class EncoderTestCase(unittest.TestCase):
+    def runTest(self):
+        encoder = Encoder({}, 'python')
+        # Values of raw unicode literals, without evaluating them.
+        for text, expected in [
+                (u'Mozilla/5.0 (Linux; U)', u'Mozilla/5.0 (Linux; U)'),
+                (u'a\\u0041b\\U00000042', u'aAbB'),
+                (u'a\\\\u0041b', u'a\\\\u0041b'),
+                (u'\\\\\xe9 中\\u4e2d', u'\\\\\xe9 中中'),
+                (u"x''' + __import__('os').system('false') + '''", u"x''' + __import__('os').system('false') + '''")]:
+            self.assertEqual(encoder._get_literal_value(text), expected)
+
+
+class FallBackTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def process(self, devices):
+        '''
+        Processes a database with the given (id, fall back id) devices and
+        returns the ids of the devices in the order they are registered.
+        '''
+        input = os.path.join(self.directory, 'wurfl.xml')
+        output = os.path.join(self.directory, 'wurfl.py')
+        with open(input, 'w') as xml:
+            xml.write(XML % '\n'.join(
+                '<device id="%s" user_agent="%s" fall_back="%s"/>' % (id, id.upper(), parent)
+                for id, parent in devices))
+        processor = Processor(input, None, output)
+        try:
+            processor.process()
+        finally:
+            processor.output.close()
+        with open(output, 'r') as module:
+            return [line.split("'''")[1] for line in module if line.startswith("(ur'''")]
+
+    def runTest(self):
+        # Devices defined before their fall back device, at any depth.
+        self.assertEqual(
+            self.process([('c', 'b'), ('d', 'b'), ('e', 'c'), ('b', 'a'), ('a', 'root'), ('f', 'a')]),
+            ['a', 'b', 'c', 'd', 'e', 'f'])
+
+        # Missing fall back devices and cycles.
+        try:
+            self.process([('x', 'missing'), ('y', 'x'), ('p', 'q'), ('q', 'p'), ('r', 'p'), ('a', 'root')])
+        except DeferredDeviceException as e:
+            self.assertEqual(e.missing, {u'missing': [u'x']})
+            self.assertEqual(e.cycles, [[u'p', u'q']])
+            self.assertTrue(str(e).startswith('5 devices still deferred: missing (fall back device of x)'))
+        else:
+            self.fail('DeferredDeviceException not raised')
+
+
+class DeltaTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = wurfl_python._engine
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        wurfl_python._swap(self.engine)
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as output:
+            output.write(content)
+        return path
+
+    def xml(self, name, version, devices):
+        return self.write(name, XML.replace('<ver>test</ver>', '<ver>%s</ver>' % version) % '\n'.join(
+            '<device id="%s" user_agent="%s" fall_back="%s"><group id="product_info">%s</group></device>' % (
+                id, ua, parent, ''.join(
+                    '<capability name="%s" value="%s"/>' % item for item in sorted(capabilities.items())))
+            for id, ua, parent, capabilities in devices))
+
+    def state(self):
+        store = wurfl_python.Repository._CAPABILITIES
+        return wurfl_python.Repository.version, [
+            (device.id, device.ua, device.parent_ordinal, sorted(
+                (name, store.get(device.ordinal, name)) for name in store.names()
+                if store.get(device.ordinal, name) is not None))
+            for device in wurfl_python.Repository._ORDINALS]
+
+    def runTest(self):
+        base = self.xml('base.xml', '1', [
+            ('generic', '', 'root', {'model_name': 'Generic', 'release_date': '2010'}),
+            ('a', 'Nokia6600/1.0', 'generic', {'model_name': 'A'}),
+            ('b', 'Nokia6600/1.0 B', 'a', {}),
+            ('c', 'SonyEricssonK700i/R2AC', 'generic', {}),
+            ('d', 'SonyEricssonK700i/R2AC D', 'c', {}),
+        ])
+        new = self.xml('new.xml', '2', [
+            ('e', 'Nokia6600/1.0 B E', 'b', {}),
+            ('generic', '', 'root', {'model_name': 'Generic', 'release_date': '2010'}),
+            ('a', 'Nokia6600/1.0', 'generic', {'model_name': 'A2'}),
+            ('b', 'Nokia6600/1.0 B', 'c', {}),
+            ('c', 'SonyEricssonK700i/R2AC', 'generic', {}),
+        ])
+        patch = self.write('patch.xml', '''<?xml version="1.0" encoding="UTF-8"?>
+<wurfl_patch>
+  <devices>
+    <device id="c" user_agent="Patched" fall_back="generic">
+      <group id="product_info"><capability name="model_name" value="C"/></group>
+    </device>
+    <device id="f" user_agent="Mozilla/5.0 F" fall_back="c">
+      <group id="product_info"><capability name="release_date" value="2013"/></group>
+    </device>
+  </devices>
+</wurfl_patch>
+''')
+
+        def process(input, output, previous=None):
+            processor = Processor(
+                input, ['product_info'], os.path.join(self.directory, output),
+                patches=[patch] if input == new else [], previous=previous)
+            processor.process()
+            processor.output.close()
+            return processor
+
+        process(base, 'base.py')
+        process(new, 'full.py')
+        process(new, 'delta.py', os.path.join(self.directory, 'base.py'))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'delta.py.manifest')))
+        # Only new and changed devices are included.
+        with open(os.path.join(self.directory, 'delta.py'), 'r') as module:
+            self.assertEqual(
+                sorted(line.split("'''")[1] for line in module if line.startswith("(ur'''")),
+                ['a', 'b', 'c', 'e', 'f'])
+
+        wurfl_python.reload(os.path.join(self.directory, 'full.py'))
+        expected = self.state()
+        self.assertEqual(expected[0], u'2')
+        self.assertEqual(
+            [(id, ua) for (id, ua, parent, capabilities) in expected[1]],
+            [(u'generic', u''), (u'a', u'Nokia6600/1.0'), (u'c', u'SonyEricssonK700i/R2AC'),
+             (u'b', u'Nokia6600/1.0 B'), (u'e', u'Nokia6600/1.0 B E'), (u'f', u'Mozilla/5.0 F')])
+        self.assertEqual(wurfl_python.find(u'c').model_name, u'C')
+        self.assertEqual(wurfl_python.find(u'f').release_date, 2013)
+
+        wurfl_python.reload(
+            os.path.join(self.directory, 'base.py'), delta=os.path.join(self.directory, 'delta.py'))
+        self.assertEqual(self.state(), expected)
+
+        # Deltas only apply to the database module they were generated for.
+        self.assertRaises(
+            InvalidDatabaseException, wurfl_python.reload,
+            os.path.join(self.directory, 'full.py'), delta=os.path.join(self.directory, 'delta.py'))
+        self.assertRaises(
+            InvalidDatabaseException, Processor,
+            new, ['display'], os.path.join(self.directory, 'other.py'),
+            previous=os.path.join(self.directory, 'base.py'))
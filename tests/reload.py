@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import os
+import sys
+import tempfile
+import unittest
+try:
+    import wurfl
+    import uas
+except ImportError:
+    sys.stderr.write("\nForgot to run 'make dump'? Please, check out the documentation.\n\n")
+    sys.exit(1)
+import wurfl_python
+from wurfl_python import cache
+
+
+class ReloadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = wurfl_python._engine
+        descriptor, self.path = tempfile.mkstemp(suffix='.snapshot')
+        os.close(descriptor)
+        wurfl_python.snapshot(self.path)
+
+    def tearDown(self):
+        wurfl_python._swap(self.engine)
+        os.remove(self.path)
+
+    def runTest(self):
+        user_agents = [ua for (ua, id) in uas.UAS[:500]]
+        expected = [wurfl_python.match(ua).id for ua in user_agents]
+        device = wurfl_python.match(user_agents[0])
+        capabilities = dict(
+            (name, self.engine.capabilities.get(device.ordinal, name))
+            for name in self.engine.capabilities.names())
+
+        # Database module, built while matching goes on.
+        thread = wurfl_python.reload(wurfl.__file__, background=True)
+        self.assertEqual([wurfl_python.match(ua).id for ua in user_agents], expected)
+        thread.join()
+        self.assertTrue(wurfl_python._engine is not self.engine)
+        self.assertTrue(wurfl_python._chain is wurfl_python._engine.chain)
+        self.assertTrue(wurfl_python.is_ready())
+        self.assertEqual(wurfl_python.Repository.version, self.engine.version)
+        self.assertEqual(len(wurfl_python.Repository._ORDINALS), len(self.engine.ordinals))
+        self.assertEqual([wurfl_python.match(ua).id for ua in user_agents], expected)
+        self.assertEqual(sys.modules.get('wurfl'), wurfl)
+
+        # Devices of the previous engine keep working.
+        self.assertTrue(device._engine is self.engine)
+        for name, value in capabilities.items():
+            self.assertEqual(getattr(device, name), value)
+        self.assertTrue(wurfl_python.match(user_agents[0]) is not device)
+
+        # Snapshot.
+        reloaded = wurfl_python._engine
+        self.assertEqual(wurfl_python.reload(self.path), None)
+        self.assertTrue(wurfl_python._engine is not reloaded)
+        self.assertTrue(wurfl_python.is_ready())
+        self.assertEqual([wurfl_python.match(ua).id for ua in user_agents], expected)
+
+
+class ReloadCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = wurfl_python._engine
+        descriptor, self.path = tempfile.mkstemp(suffix='.snapshot')
+        os.close(descriptor)
+        wurfl_python.snapshot(self.path)
+
+    def tearDown(self):
+        wurfl_python.set_cache(None)
+        wurfl_python._swap(self.engine)
+        os.remove(self.path)
+
+    def runTest(self):
+        ua = uas.UAS[0][0]
+        matches = cache.LRUCache(100)
+        wurfl_python.set_cache(matches)
+        wurfl_python.set_exact_match(False)
+        try:
+            device = wurfl_python.match(ua)
+            self.assertEqual(len(matches), 1)
+
+            # Same database version: cached results are dropped.
+            wurfl_python.reload(self.path)
+            self.assertEqual(len(matches), 0)
+            self.assertEqual(wurfl_python.match(ua).id, device.id)
+            self.assertTrue(wurfl_python.match(ua)._engine is wurfl_python._engine)
+            self.assertFalse(wurfl_python._chain.exact_match_enabled)
+
+            # Other database version: cached results are dropped too.
+            engine = wurfl_python.Engine()
+            engine.set_version(u'%s (other)' % device._engine.version)
+            wurfl_python._swap(engine)
+            self.assertEqual(len(matches), 0)
+        finally:
+            wurfl_python.set_exact_match(True)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import os
+import sys
+import tempfile
+import unittest
+try:
+    import wurfl
+except ImportError:
+    sys.stderr.write("\nForgot to run 'make dump'? Please, check out the documentation.\n\n")
+    sys.exit(1)
+import wurfl_python
+from wurfl_python import database, snapshots
+from wurfl_python.exceptions import InvalidDatabaseException, IncompatibleSnapshotException
+
+
+class SnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        descriptor, self.path = tempfile.mkstemp(suffix='.snapshot')
+        os.close(descriptor)
+        wurfl_python.snapshot(self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def runTest(self):
+        repository = wurfl_python.Repository
+        chain = wurfl_python._chain
+        restored = snapshots.Snapshot(self.path, wurfl_python.Engine()._create_device, repository.version)
+        self.assertEqual(restored.version, repository.version)
+
+        # Devices.
+        self.assertEqual(len(restored.devices), len(repository._ORDINALS))
+        store = restored.capabilities
+        self.assertEqual(sorted(store.names()), sorted(repository._CAPABILITIES.names()))
+        for device, other in zip(repository._ORDINALS, restored.devices):
+            self.assertEqual(
+                (device.ordinal, device.parent_ordinal, device.id, device.ua, device.actual_device_root),
+                (other.ordinal, other.parent_ordinal, other.id, other.ua, other.actual_device_root))
+            for name in store.names():
+                expected = repository._CAPABILITIES.get(device.ordinal, name)
+                value = store.get(device.ordinal, name)
+                self.assertEqual((type(expected), expected), (type(value), value))
+
+        # Buckets.
+        self.assertEqual(
+            [name for (name, buckets) in restored.handlers],
+            [handler.__class__.__name__ for handler in chain._handlers])
+        for handler, (name, buckets) in zip(chain._handlers, restored.handlers):
+            for bucket, other in zip(handler._get_buckets(), buckets):
+                self.assertEqual((bucket.uas, bucket.device_ids), (other.uas, other.device_ids))
+
+        # Table of uas of registered devices.
+        self.assertEqual(restored.exact_uas, chain._exact_uas)
+        self.assertEqual(set(restored.inexact_uas), chain._get_inexact_uas())
+
+
+class DatabaseSnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = wurfl_python._engine
+        descriptor, self.database_path = tempfile.mkstemp(suffix='.db')
+        os.close(descriptor)
+        descriptor, self.path = tempfile.mkstemp(suffix='.snapshot')
+        os.close(descriptor)
+        database.write(self.database_path, self.engine)
+
+    def tearDown(self):
+        wurfl_python._swap(self.engine)
+        os.remove(self.database_path)
+        os.remove(self.path)
+
+    def runTest(self):
+        user_agents = [device.ua for device in self.engine.devices.itervalues()][:500]
+        expected = [wurfl_python.match(ua).id for ua in user_agents]
+        device = wurfl_python.match(user_agents[0])
+        store = self.engine.capabilities
+        capabilities = dict((name, store.get(device.ordinal, name)) for name in store.names())
+
+        # Snapshot of an engine loaded from a binary database.
+        wurfl_python.load(self.database_path)
+        wurfl_python.snapshot(self.path)
+        wurfl_python.restore(self.path)
+        self.assertEqual([wurfl_python.match(ua).id for ua in user_agents], expected)
+        store = wurfl_python._engine.capabilities
+        self.assertEqual(
+            dict((name, store.get(device.ordinal, name)) for name in store.names()), capabilities)
+        for ua in user_agents:
+            self.assertEqual(wurfl_python._chain.exact_match(ua), self.engine.chain.exact_match(ua))
+
+
+class IncompatibleSnapshotTestCase(unittest.TestCase):
+    def runTest(self):
+        descriptor, path = tempfile.mkstemp(suffix='.snapshot')
+        try:
+            os.write(descriptor, b'not a snapshot')
+            os.close(descriptor)
+            self.assertRaises(InvalidDatabaseException, wurfl_python.restore, path)
+
+            wurfl_python.snapshot(path)
+            self.assertRaises(
+                IncompatibleSnapshotException,
+                wurfl_python.restore, path, u'%s (other)' % wurfl_python.Repository.version)
+            library_version = wurfl_python.__version__
+            wurfl_python.__version__ = '%s.other' % library_version
+            try:
+                self.assertRaises(IncompatibleSnapshotException, wurfl_python.restore, path)
+            finally:
+                wurfl_python.__version__ = library_version
+        finally:
+            os.remove(path)
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import sys
+import unittest
+from multiprocessing.pool import ThreadPool
+try:
+    import wurfl
+    import uas
+except ImportError:
+    sys.stderr.write("\nForgot to run 'make dump'? Please, check out the documentation.\n\n")
+    sys.exit(1)
+
+
+class ThreadsTestCase(unittest.TestCase):
+    def runTest(self):
+        pool = ThreadPool(8)
+        try:
+            ids = pool.map(lambda item: wurfl.match(item[0]).id, uas.UAS, chunksize=16)
+        finally:
+            pool.close()
+        for (ua, id), device_id in zip(uas.UAS, ids):
+            self.assertEqual(id, device_id, 'Device detection mismatch:\n  UA: %s\n  WURLF PHP: %s\n  WURFL PYTHON: %s\n' % (
+                ua,
+                id,
+                device_id))
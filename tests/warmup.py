@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import sys
+import unittest
+try:
+    import wurfl
+    import uas
+except ImportError:
+    sys.stderr.write("\nForgot to run 'make dump'? Please, check out the documentation.\n\n")
+    sys.exit(1)
+import wurfl_python
+from wurfl_python.handlers import CatchAllHandler
+
+
+class WarmUpTestCase(unittest.TestCase):
+    def runTest(self):
+        user_agents = [ua for (ua, id) in uas.UAS[:500]]
+        chain = wurfl_python._chain
+        for handler in chain._handlers:
+            handler._reset_indexes()
+        expected = [wurfl_python.match(ua) for ua in user_agents]
+        for handler in chain._handlers:
+            handler._reset_indexes()
+
+        thread = wurfl_python.warm_up(background=True)
+        # Matching goes on while indexes are built.
+        self.assertEqual([wurfl_python.match(ua) for ua in user_agents], expected)
+        thread.join()
+        self.assertTrue(wurfl_python.is_ready())
+
+        for handler in chain._handlers:
+            if handler.USES_LD_MATCHER:
+                self.assertTrue(handler._ld_index is not None)
+            if isinstance(handler, CatchAllHandler):
+                self.assertTrue(handler._mozilla4_ld_index is not None)
+                self.assertTrue(handler._mozilla5_ld_index is not None)
+        self.assertTrue(chain._dispatcher is not None)
+        store = wurfl_python.Repository._CAPABILITIES
+        for name in store.names():
+            self.assertEqual(store._columns[name].resolved, len(store))
+        self.assertEqual([wurfl_python.match(ua) for ua in user_agents], expected)
+
+        self.assertEqual(wurfl_python.warm_up(), None)
+        self.assertTrue(wurfl_python.is_ready())
@@ -6,165 +6,722 @@
 """
 
 from __future__ import absolute_import
+import sys
+import imp
+import threading
+from functools import partial
 from wurfl_python import normalizers
+from wurfl_python import patterns
+from wurfl_python import capabilities
+from wurfl_python import database
+from wurfl_python import snapshots
 from wurfl_python.normalizers import generic
 from wurfl_python.normalizers import specific
 from wurfl_python import handlers
-from wurfl_python.exceptions import UnregisteredParentDeviceException
+from wurfl_python.exceptions import UnregisteredParentDeviceException, InvalidDatabaseException
 
-_chain = handlers.Chain()
+__version__ = '0.1'
+
+# Current engine (see 'Engine') and its chain of handlers, replaced at once
+# by load(), restore() and reload().
+_engine = None
+_chain = None
+
+# Engine being built by reload() in the current thread, if any.
+_building = threading.local()
+
+# Serializes reload().
+_reload_lock = threading.Lock()
+
+_cache = None
+
+_MISSING = object()
 
 
 def match(ua):
     '''
-    Returns a Device class based on the provided user agent using the
+    Returns a Device based on the provided user agent using the
     WURFL PHP 'accuracy' matching mode.
     @see WURFL PHP 'WURFL_UserAgentHandlerChain'.
     '''
-    return Repository.find(_chain.match(unicode(ua)))
+    ua = unicode(ua)
+    # Matches in flight finish on the engine they started on.
+    engine = _engine
+    device_id = engine.chain.exact_match(ua)
+    if device_id is not None:
+        return engine.find(device_id)
+    cache = _cache
+    if cache is not None:
+        key = (engine.version, ua)
+        device_id = cache.get(key)
+        if device_id is None:
+            device_id = engine.chain.match(ua)
+            cache.set(key, device_id)
+        return engine.find(device_id)
+    return engine.find(engine.chain.match(ua))
+
+
+def set_cache(cache):
+    '''
+    Sets the cache used by match(), keyed on the user agent and the
+    database version (see 'wurfl_python.cache'). None disables caching.
+    The cache is cleared whenever the engine is replaced.
+    '''
+    global _cache
+    _cache = cache
+
+
+def set_exact_match(enabled):
+    '''
+    Enables or disables the table of user agents of registered devices
+    consulted by match() and match_many() before anything else.
+    '''
+    _engine.chain.exact_match_enabled = enabled
+
+
+def set_ld_matcher(matcher):
+    '''
+    Sets the matcher used by handlers matching by Levenshtein distance:
+    'LDMatcher' (python-Levenshtein, the default) or 'NumPyLDMatcher'
+    (pip install wurfl-python[numpy]), which computes the distances to
+    blocks of candidates at once (see 'wurfl_python.handlers.matchers.ld').
+    Raises ImportError if the matcher is not available.
+    '''
+    # Fails early if the matcher is not available.
+    matcher.INSTANCE()
+    handlers.Utils.LD_MATCHER = matcher
+
+
+def exact_match_hits():
+    '''
+    Returns the number of user agents answered by the table of user agents
+    of registered devices.
+    '''
+    return _engine.chain.exact_match_hits
+
+
+def match_many(uas, stream=False, chunk_size=10000):
+    '''
+    Batch version of match(). Returns the Devices matching the
+    provided user agents, in the same order. Duplicated user agents are
+    matched just once, and user agents owned by the same handler are
+    matched together. If stream is True, a generator consuming the input
+    in chunks of chunk_size user agents is returned instead of a list.
+    '''
+    if stream:
+        return _match_many(uas, chunk_size)
+    return _match_chunk([unicode(ua) for ua in uas])
+
+
+def _match_many(uas, chunk_size):
+    chunk = []
+    for ua in uas:
+        chunk.append(unicode(ua))
+        if len(chunk) >= chunk_size:
+            for device in _match_chunk(chunk):
+                yield device
+            chunk = []
+    if chunk:
+        for device in _match_chunk(chunk):
+            yield device
+
+
+def _match_chunk(uas):
+    engine = _engine
+    return [engine.find(device_id) for device_id in engine.chain.match_many(uas)]
+
+
+def load(path):
+    '''
+    Loads a binary database generated by wurfl-python-processor
+    (--format=binary), replacing all registered devices. The file is
+    memory mapped, not read: devices, capabilities and handler buckets are
+    decoded on demand. Binary databases are read only, so no devices can
+    be registered afterwards.
+    '''
+    engine = Engine()
+    engine._load(database.Database(path), path)
+    _swap(engine)
+
+
+def reload(path, background=False, delta=None):
+    '''
+    Builds a new engine from a generated database module, a binary
+    database (.db) or a snapshot (.snapshot), warms it up (see warm_up())
+    and then replaces the current engine at once: matches in flight finish
+    on the previous engine and no match finds indexes to build. If
+    background is True, the new engine is built in a daemon thread, which
+    is returned, while matching goes on with the current one. If given,
+    delta is the path of a delta module generated on top of the database
+    module (wurfl-python-processor --previous), applied while the database
+    module is loaded.
+    @see WURFL PHP 'WURFL_Reloader_DefaultWURFLReloader'.
+    '''
+    if background:
+        thread = threading.Thread(target=_reload, args=(path, delta), name='wurfl-python-reload')
+        thread.daemon = True
+        thread.start()
+        return thread
+    _reload(path, delta)
+    return None
+
+
+def _reload(path, delta=None):
+    with _reload_lock:
+        engine = Engine()
+        if delta is not None:
+            if path.endswith(('.db', '.snapshot')):
+                raise InvalidDatabaseException('Deltas can only be applied to database modules, not to %s' % path)
+            _import(engine, delta)
+        if path.endswith('.db'):
+            engine._load(database.Database(path), path)
+        elif path.endswith('.snapshot'):
+            engine._restore(snapshots.Snapshot(path, engine._create_device), path)
+        else:
+            _import(engine, path)
+        if delta is not None:
+            engine._end_delta(delta)
+        engine.warm_up()
+        _swap(engine)
+
+
+def _import(engine, path):
+    '''
+    Imports a generated module (a database or a delta module), which
+    registers its devices through 'Repository' in the given engine.
+    '''
+    name = '_wurfl_python_reload_%d' % id(engine)
+    _building.engine = engine
+    try:
+        if path.endswith('.pyc'):
+            imp.load_compiled(name, path)
+        else:
+            imp.load_source(name, path)
+    finally:
+        del _building.engine
+        sys.modules.pop(name, None)
+
+
+def _swap(engine):
+    '''
+    Makes the given engine the current one.
+    '''
+    global _engine, _chain
+    previous = _engine
+    if previous is not None:
+        engine.chain.exact_match_enabled = previous.chain.exact_match_enabled
+    _engine = engine
+    _chain = engine.chain
+    cache = _cache
+    if cache is not None:
+        # Results of the previous engine would be served otherwise, if the
+        # version is the same, or would keep filling the cache (and, with
+        # TinyLFU admission, keep out the keys of the new version). Matches
+        # in flight on the previous engine cache results under its version.
+        cache.clear()
+
+
+def _get_engine():
+    '''
+    Returns the engine being built by reload() in the calling thread, if
+    any, or the current engine.
+    '''
+    return getattr(_building, 'engine', None) or _engine
+
+
+def warm_up(background=False):
+    '''
+    Builds everything otherwise built by the first matches and lookups
+    needing it: the dispatcher, the indexes of all handlers (sorted
+    buckets and LD indexes) and all capability columns. If background is
+    True, they are built in a daemon thread, which is returned, while
+    matching goes on. is_ready() returns False until they are built.
+    '''
+    engine = _engine
+    if background:
+        thread = threading.Thread(target=engine.warm_up, name='wurfl-python-warm-up')
+        thread.daemon = True
+        thread.start()
+        return thread
+    engine.warm_up()
+    return None
+
+
+def is_ready():
+    '''
+    Returns True once the current engine is warmed up by warm_up() or
+    reload() (e.g. for readiness probes). Engines replaced by load() or
+    restore() are not, so warm_up() should be called again afterwards.
+    '''
+    return _engine.ready.is_set()
+
+
+def snapshot(path):
+    '''
+    Writes a snapshot of the fully built matching engine (devices,
+    resolved capabilities, sorted handler buckets and the table of user
+    agents of registered devices), keyed by the WURFL version and the
+    library version (see 'wurfl_python.snapshots').
+    '''
+    snapshots.write(path, _engine)
+
+
+def restore(path, version=None):
+    '''
+    Restores a snapshot written by snapshot(), replacing all registered
+    devices. The file is read at once and nothing needs to be normalized,
+    sorted or resolved afterwards. If version is given, the snapshot must
+    hold that WURFL version. IncompatibleSnapshotException is raised if the
+    snapshot was written for another WURFL version or library version.
+    '''
+    engine = Engine()
+    engine._restore(snapshots.Snapshot(path, engine._create_device, version), path)
+    _swap(engine)
 
 
 def find(id):
     '''
-    Return a Device class linked to the provided WURFL device id. Returns
+    Return a Device linked to the provided WURFL device id. Returns
     None if it does not exist.
     '''
-    return Repository.find(id)
+    return _engine.find(id)
 
 
-class Repository(object):
-    _DEVICES = {}
+class Capability(object):
+    '''
+    Descriptor looking up a capability of a device in the columnar store of
+    the repository.
+    '''
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, device, owner):
+        if device is None:
+            return self
+        value = device._engine.capabilities.get(device.ordinal, self.name, _MISSING)
+        if value is _MISSING:
+            raise AttributeError(self.name)
+        return value
+
+
+class Device(object):
+    '''
+    WURFL device. Devices are plain objects referencing their fall back
+    device by ordinal (i.e. registration position), instead of one class
+    per device inheriting from the class of its fall back device.
+    Capabilities, including the inherited ones, are available as attributes
+    and are looked up in the columnar store of the engine holding the
+    device.
+    '''
+    __slots__ = ('ordinal', 'parent_ordinal', 'id', 'ua', 'actual_device_root', '_engine')
+
+    def __init__(self, ordinal, parent_ordinal, id, ua, actual_device_root, engine):
+        self.ordinal = ordinal
+        self.parent_ordinal = parent_ordinal
+        self.id = id
+        self.ua = ua
+        self.actual_device_root = actual_device_root
+        self._engine = engine
+
+    @property
+    def parent(self):
+        if self.parent_ordinal < 0:
+            return None
+        return self._engine.ordinals[self.parent_ordinal]
+
+    @property
+    def children(self):
+        engine = self._engine
+        return set(engine.ordinals[ordinal] for ordinal in engine.children.get(self.ordinal, ()))
+
+    def __getattr__(self, name):
+        # Only called the first time a capability is looked up. A
+        # descriptor is then added to the class, so next lookups avoid
+        # the failed attribute lookup.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        value = self._engine.capabilities.get(self.ordinal, name, _MISSING)
+        if value is _MISSING:
+            raise AttributeError(name)
+        if not hasattr(Device, name):
+            setattr(Device, name, Capability(name))
+        return value
+
+    def __repr__(self):
+        return '<Device %r>' % self.id
+
+
+class _RepositoryType(type):
+    '''
+    Exposes the state of the engine targeted by 'Repository' (see
+    '_get_engine()') as class attributes.
+    '''
+    _DEVICES = property(lambda cls: _get_engine().devices)
+    _ORDINALS = property(lambda cls: _get_engine().ordinals)
+    _CHILDREN = property(lambda cls: _get_engine().children)
+    _CAPABILITIES = property(lambda cls: _get_engine().capabilities)
+    version = property(lambda cls: _get_engine().version)
+
 
-    class AbstractDevice(object):
-        pass
+class Repository(object):
+    '''
+    Registration API used by generated database modules. Devices are
+    registered in the current engine or, while reload() imports a module,
+    in the engine being built.
+    '''
+    __metaclass__ = _RepositoryType
 
     @classmethod
-    def register(cls, id, ua, actual_device_root, capabilities={}, parent=None):
-        if parent is None:
-            class Device(cls.AbstractDevice):
-                pass
-        elif parent in cls._DEVICES:
-            parent = cls._DEVICES[parent]
+    def set_version(cls, version):
+        _get_engine().set_version(version)
 
-            class Device(parent):
-                pass
+    @classmethod
+    def set_delta(cls, base_version, base_size, version, order, records, capabilities=None, classifications=None):
+        '''
+        Used by delta modules (see 'Engine.set_delta()'). If given, records
+        are encoded as registered by register_encoded().
+        '''
+        if capabilities is not None:
+            records = _decode(capabilities, classifications, records)
+        _get_engine().set_delta(base_version, base_size, version, order, records)
 
-            parent.children.add(Device)
-        else:
-            raise UnregisteredParentDeviceException()
+    @classmethod
+    def register(cls, id, ua, actual_device_root, capabilities={}, parent=None, classification=None):
+        '''
+        Registers a device. If given, classification is the result of
+        classifying its ua with the handler chain (see 'Chain.classify()'),
+        as precomputed by the processor, and the ua is added to the
+        buckets of the handler without consulting the chain.
+        '''
+        _get_engine().register(id, ua, actual_device_root, capabilities, parent, classification)
 
-        Device.id = id
-        Device.ua = ua
-        Device.actual_device_root = actual_device_root
-        for name, value in capabilities.iteritems():
-            setattr(Device, name, value)
-        Device.parent = parent
-        Device.children = set()
+    @classmethod
+    def register_many(cls, records):
+        '''
+        Bulk version of register() for an iterable of (id, ua,
+        actual_device_root, capabilities, parent, classification) tuples,
+        fall back devices first. Capabilities are given as a dictionary or
+        as a list of (name, value) tuples. Devices are registered in one
+        pass and their uas are added to the handler buckets at once at the
+        end (see 'Chain.add_many()').
+        '''
+        _get_engine().register_many(records)
 
-        cls._DEVICES[Device.id] = Device
-        _chain.filter(Device.ua, Device.id)
+    @classmethod
+    def register_encoded(cls, capabilities, classifications, records):
+        '''
+        Same as register_many(), for records with their capabilities
+        encoded as a tuple of indexes into capabilities, the table of
+        (name, value) constants of the module, and their classification
+        as an index into classifications, the table of classifications of
+        the module, so every distinct name, value and classification is
+        written, compiled and unmarshalled once.
+        '''
+        _get_engine().register_many(records, capabilities, classifications)
 
     @classmethod
     def find(cls, id):
-        return cls._DEVICES.get(id, None)
+        return _get_engine().find(id)
 
 
-def _init():
+class Engine(object):
+    '''
+    Matching engine: registered devices (device table, fall back links
+    and capability store) plus the chain of handlers whose buckets hold
+    their uas. The current engine is replaced at once, by a new one fully
+    built, so the state seen by a match never mixes two databases.
+    '''
+    def __init__(self):
+        self.devices = {}
+        self.ordinals = []
+        self.children = {}
+        self.capabilities = capabilities.Store()
+        self.version = None
+        self.chain = _create_chain()
+        # Set once warm_up() completes.
+        self.ready = threading.Event()
+        self._create_device = partial(Device, engine=self)
+        # Delta applied while registering devices, if any.
+        self._delta = None
+
+    def set_version(self, version):
+        if self._delta is not None and version != self._delta.base_version:
+            raise InvalidDatabaseException(
+                'Delta of WURFL version %s applied to WURFL version %s' % (self._delta.base_version, version))
+        self.version = version
+
+    def set_delta(self, base_version, base_size, version, order, records):
+        '''
+        Sets a delta between two versions of a generated database module,
+        applied to the base_size devices of the module of base_version
+        registered next (see 'wurfl_python.reload()'). Their records are
+        collected, and then all devices are registered in the given order:
+        (start, stop) ranges of positions of devices in the base module,
+        registered with their record in records if changed, and ids of new
+        devices, registered with their record in records.
+        '''
+        if self.ordinals:
+            raise InvalidDatabaseException(
+                'Deltas are applied while loading a database module, see wurfl_python.reload()')
+        self._delta = _Delta(base_version, base_size, version, order, records)
+
+    def register(self, id, ua, actual_device_root, capabilities={}, parent=None, classification=None):
+        if self._delta is not None:
+            self._delta.base_records.append((id, ua, actual_device_root, capabilities, parent, classification))
+            return
+
+        if parent is None:
+            parent_ordinal = -1
+        elif parent in self.devices:
+            parent_ordinal = self.devices[parent].ordinal
+        else:
+            raise UnregisteredParentDeviceException()
+
+        ordinal = self.capabilities.add(parent_ordinal, capabilities)
+        device = Device(ordinal, parent_ordinal, id, ua, actual_device_root, self)
+        self.ordinals.append(device)
+        if parent_ordinal >= 0:
+            self.children.setdefault(parent_ordinal, []).append(device.ordinal)
+
+        self.devices[device.id] = device
+        if classification is None:
+            self.chain.filter(device.ua, device.id)
+        else:
+            self.chain.add(device.ua, device.id, *classification)
+
+    def register_many(self, records, capabilities=None, classifications=None):
+        '''
+        If the capabilities and classifications tables are given, records
+        are encoded as registered by 'Repository.register_encoded()', and
+        decoded while registered.
+        '''
+        if self._delta is not None:
+            if capabilities is not None:
+                records = _decode(capabilities, classifications, records)
+            self._delta.base_records.extend(records)
+            return
+        devices = self.devices
+        ordinals = self.ordinals
+        children = self.children
+        store = self.capabilities
+        registered = []
+        get = capabilities.__getitem__ if capabilities is not None else None
+        try:
+            for id, ua, actual_device_root, device_capabilities, parent, classification in records:
+                if get is not None:
+                    device_capabilities = map(get, device_capabilities)
+                    classification = classifications[classification]
+                if parent is None:
+                    parent_ordinal = -1
+                else:
+                    fall_back = devices.get(parent)
+                    if fall_back is None:
+                        raise UnregisteredParentDeviceException()
+                    parent_ordinal = fall_back.ordinal
+
+                ordinal = store.add(parent_ordinal, device_capabilities)
+                device = Device(ordinal, parent_ordinal, id, ua, actual_device_root, self)
+                ordinals.append(device)
+                if parent_ordinal >= 0:
+                    children.setdefault(parent_ordinal, []).append(ordinal)
+                devices[id] = device
+                registered.append((ua, id, classification))
+        finally:
+            # Devices registered before any failure are matchable.
+            self.chain.add_many(registered)
+
+    def find(self, id):
+        return self.devices.get(id, None)
+
+    def _end_delta(self, path):
+        delta = self._delta
+        if delta is None:
+            raise InvalidDatabaseException('%s is not a delta module' % path)
+        if self.version != delta.base_version or len(delta.base_records) != delta.base_size:
+            raise InvalidDatabaseException('%s is not a delta of the loaded database module' % path)
+        self._delta = None
+        self.register_many(delta.records_in_order())
+        self.version = delta.version
+
+    def warm_up(self):
+        self.chain.warm_up()
+        self.capabilities.warm_up()
+        self.ready.set()
+
+    def _load(self, mapped, path):
+        handlers = mapped.handlers()
+        self._check_handlers([name for (name, buckets) in handlers], path)
+        devices = database.MappedDevices(mapped, self._create_device)
+        self.devices = devices
+        self.ordinals = database.MappedOrdinals(devices)
+        self.children = database.MappedChildren(mapped)
+        self.capabilities = mapped.capabilities()
+        self.version = mapped.version
+        for handler, (name, buckets) in zip(self.chain._handlers, handlers):
+            handler._set_buckets(buckets)
+        self.chain._set_exact_uas(mapped.exact_uas())
+
+    def _restore(self, restored, path):
+        self._check_handlers([name for (name, buckets) in restored.handlers], path)
+        children = {}
+        for device in restored.devices:
+            if device.parent_ordinal >= 0:
+                children.setdefault(device.parent_ordinal, []).append(device.ordinal)
+        self.devices = dict((device.id, device) for device in restored.devices)
+        self.ordinals = restored.devices
+        self.children = children
+        self.capabilities = restored.capabilities
+        self.version = restored.version
+        for handler, (name, buckets) in zip(self.chain._handlers, restored.handlers):
+            handler._set_buckets(buckets)
+        self.chain._set_exact_uas(restored.exact_uas, restored.inexact_uas)
+
+    def _check_handlers(self, names, path):
+        if names != [handler.__class__.__name__ for handler in self.chain._handlers]:
+            raise InvalidDatabaseException('%s was built for a different chain of handlers' % path)
+
+
+class _Delta(object):
+    '''
+    Delta between two versions of a generated database module (see
+    'Engine.set_delta()').
+    '''
+    def __init__(self, base_version, base_size, version, order, records):
+        self.base_version = base_version
+        self.base_size = base_size
+        self.version = version
+        self.order = order
+        self.records = dict((record[0], record) for record in records)
+        # Records registered by the base module.
+        self.base_records = []
+
+    def records_in_order(self):
+        '''
+        Yields the records of all devices, in registration order.
+        '''
+        base_records = self.base_records
+        records = self.records
+        for item in self.order:
+            if isinstance(item, tuple):
+                for position in xrange(*item):
+                    record = base_records[position]
+                    yield records.get(record[0], record)
+            else:
+                yield records[item]
+
+
+def _decode(capabilities, classifications, records):
+    '''
+    Yields the given records (see 'Repository.register_encoded()') with
+    their capabilities, as lists of (name, value) tuples, and their
+    classification decoded.
+    '''
+    get = capabilities.__getitem__
+    for id, ua, actual_device_root, indexes, parent, classification in records:
+        yield id, ua, actual_device_root, map(get, indexes), parent, classifications[classification]
+
+
+def _create_chain():
     '''
     @see WURFL PHP 'WURFL_UserAgentHandlerChainFactory'.
     '''
+    chain = handlers.Chain()
     generic_normalizers = _create_generic_normalizers()
 
     # Java Midlets.
-    _chain.add_handler(handlers.JavaMidletHandler(generic_normalizers))
+    chain.add_handler(handlers.JavaMidletHandler(generic_normalizers))
 
     # Smart TVs.
-    _chain.add_handler(handlers.SmartTVHandler(generic_normalizers))
+    chain.add_handler(handlers.SmartTVHandler(generic_normalizers))
 
     # Mobile devices.
     kindle_normalizer = generic_normalizers.add_normalizer(specific.Kindle())
-    _chain.add_handler(handlers.KindleHandler(kindle_normalizer))
+    chain.add_handler(handlers.KindleHandler(kindle_normalizer))
     lguplus_normalizer = generic_normalizers.add_normalizer(specific.LGUPLUS())
-    _chain.add_handler(handlers.LGUPLUSHandler(lguplus_normalizer))
+    chain.add_handler(handlers.LGUPLUSHandler(lguplus_normalizer))
 
     # Mobile platforms.
     android_normalizer = generic_normalizers.add_normalizer(specific.Android())
-    _chain.add_handler(handlers.AndroidHandler(android_normalizer))
+    chain.add_handler(handlers.AndroidHandler(android_normalizer))
 
-    _chain.add_handler(handlers.AppleHandler(generic_normalizers))
-    _chain.add_handler(handlers.WindowsPhoneDesktopHandler(generic_normalizers))
-    _chain.add_handler(handlers.WindowsPhoneHandler(generic_normalizers))
-    _chain.add_handler(handlers.NokiaOviBrowserHandler(generic_normalizers))
+    chain.add_handler(handlers.AppleHandler(generic_normalizers))
+    chain.add_handler(handlers.WindowsPhoneDesktopHandler(generic_normalizers))
+    chain.add_handler(handlers.WindowsPhoneHandler(generic_normalizers))
+    chain.add_handler(handlers.NokiaOviBrowserHandler(generic_normalizers))
 
     # High workload mobile matchers.
-    _chain.add_handler(handlers.NokiaHandler(generic_normalizers))
-    _chain.add_handler(handlers.SamsungHandler(generic_normalizers))
-    _chain.add_handler(handlers.BlackBerryHandler(generic_normalizers))
-    _chain.add_handler(handlers.SonyEricssonHandler(generic_normalizers))
-    _chain.add_handler(handlers.MotorolaHandler(generic_normalizers))
+    chain.add_handler(handlers.NokiaHandler(generic_normalizers))
+    chain.add_handler(handlers.SamsungHandler(generic_normalizers))
+    chain.add_handler(handlers.BlackBerryHandler(generic_normalizers))
+    chain.add_handler(handlers.SonyEricssonHandler(generic_normalizers))
+    chain.add_handler(handlers.MotorolaHandler(generic_normalizers))
 
     # Other mobile matchers.
-    _chain.add_handler(handlers.AlcatelHandler(generic_normalizers))
-    _chain.add_handler(handlers.BenQHandler(generic_normalizers))
-    _chain.add_handler(handlers.DoCoMoHandler(generic_normalizers))
-    _chain.add_handler(handlers.GrundigHandler(generic_normalizers))
+    chain.add_handler(handlers.AlcatelHandler(generic_normalizers))
+    chain.add_handler(handlers.BenQHandler(generic_normalizers))
+    chain.add_handler(handlers.DoCoMoHandler(generic_normalizers))
+    chain.add_handler(handlers.GrundigHandler(generic_normalizers))
 
     htc_mac_normalizer = generic_normalizers.add_normalizer(specific.HTCMac())
-    _chain.add_handler(handlers.HTCMacHandler(htc_mac_normalizer))
+    chain.add_handler(handlers.HTCMacHandler(htc_mac_normalizer))
 
-    _chain.add_handler(handlers.HTCHandler(generic_normalizers))
-    _chain.add_handler(handlers.KDDIHandler(generic_normalizers))
-    _chain.add_handler(handlers.KyoceraHandler(generic_normalizers))
+    chain.add_handler(handlers.HTCHandler(generic_normalizers))
+    chain.add_handler(handlers.KDDIHandler(generic_normalizers))
+    chain.add_handler(handlers.KyoceraHandler(generic_normalizers))
 
     lg_normalizer = generic_normalizers.add_normalizer(specific.LG())
-    _chain.add_handler(handlers.LGHandler(lg_normalizer))
-
-    _chain.add_handler(handlers.MitsubishiHandler(generic_normalizers))
-    _chain.add_handler(handlers.NecHandler(generic_normalizers))
-    _chain.add_handler(handlers.NintendoHandler(generic_normalizers))
-    _chain.add_handler(handlers.PanasonicHandler(generic_normalizers))
-    _chain.add_handler(handlers.PantechHandler(generic_normalizers))
-    _chain.add_handler(handlers.PhilipsHandler(generic_normalizers))
-    _chain.add_handler(handlers.PortalmmmHandler(generic_normalizers))
-    _chain.add_handler(handlers.QtekHandler(generic_normalizers))
-    _chain.add_handler(handlers.ReksioHandler(generic_normalizers))
-    _chain.add_handler(handlers.SagemHandler(generic_normalizers))
-    _chain.add_handler(handlers.SanyoHandler(generic_normalizers))
-    _chain.add_handler(handlers.SharpHandler(generic_normalizers))
-    _chain.add_handler(handlers.SiemensHandler(generic_normalizers))
-    _chain.add_handler(handlers.SPVHandler(generic_normalizers))
-    _chain.add_handler(handlers.ToshibaHandler(generic_normalizers))
-    _chain.add_handler(handlers.VodafoneHandler(generic_normalizers))
+    chain.add_handler(handlers.LGHandler(lg_normalizer))
+
+    chain.add_handler(handlers.MitsubishiHandler(generic_normalizers))
+    chain.add_handler(handlers.NecHandler(generic_normalizers))
+    chain.add_handler(handlers.NintendoHandler(generic_normalizers))
+    chain.add_handler(handlers.PanasonicHandler(generic_normalizers))
+    chain.add_handler(handlers.PantechHandler(generic_normalizers))
+    chain.add_handler(handlers.PhilipsHandler(generic_normalizers))
+    chain.add_handler(handlers.PortalmmmHandler(generic_normalizers))
+    chain.add_handler(handlers.QtekHandler(generic_normalizers))
+    chain.add_handler(handlers.ReksioHandler(generic_normalizers))
+    chain.add_handler(handlers.SagemHandler(generic_normalizers))
+    chain.add_handler(handlers.SanyoHandler(generic_normalizers))
+    chain.add_handler(handlers.SharpHandler(generic_normalizers))
+    chain.add_handler(handlers.SiemensHandler(generic_normalizers))
+    chain.add_handler(handlers.SPVHandler(generic_normalizers))
+    chain.add_handler(handlers.ToshibaHandler(generic_normalizers))
+    chain.add_handler(handlers.VodafoneHandler(generic_normalizers))
 
     webos_normalizer = generic_normalizers.add_normalizer(specific.WebOS())
-    _chain.add_handler(handlers.WebOSHandler(webos_normalizer))
+    chain.add_handler(handlers.WebOSHandler(webos_normalizer))
 
-    _chain.add_handler(handlers.OperaMiniHandler(generic_normalizers))
+    chain.add_handler(handlers.OperaMiniHandler(generic_normalizers))
 
     # Robots / Crawlers.
-    _chain.add_handler(handlers.BotCrawlerTranscoderHandler(generic_normalizers))
+    chain.add_handler(handlers.BotCrawlerTranscoderHandler(generic_normalizers))
 
     # Desktop Browsers.
     chrome_normalizer = generic_normalizers.add_normalizer(specific.Chrome())
-    _chain.add_handler(handlers.ChromeHandler(chrome_normalizer))
+    chain.add_handler(handlers.ChromeHandler(chrome_normalizer))
 
     firefox_normalizer = generic_normalizers.add_normalizer(specific.Firefox())
-    _chain.add_handler(handlers.FirefoxHandler(firefox_normalizer))
+    chain.add_handler(handlers.FirefoxHandler(firefox_normalizer))
 
     msie_normalizer = generic_normalizers.add_normalizer(specific.MSIE())
-    _chain.add_handler(handlers.MSIEHandler(msie_normalizer))
+    chain.add_handler(handlers.MSIEHandler(msie_normalizer))
 
     opera_normalizer = generic_normalizers.add_normalizer(specific.Opera())
-    _chain.add_handler(handlers.OperaHandler(opera_normalizer))
+    chain.add_handler(handlers.OperaHandler(opera_normalizer))
 
     safari_normalizer = generic_normalizers.add_normalizer(specific.Safari())
-    _chain.add_handler(handlers.SafariHandler(safari_normalizer))
+    chain.add_handler(handlers.SafariHandler(safari_normalizer))
 
     konqueror_normalizer = generic_normalizers.add_normalizer(specific.Konqueror())
-    _chain.add_handler(handlers.KonquerorHandler(konqueror_normalizer))
+    chain.add_handler(handlers.KonquerorHandler(konqueror_normalizer))
 
     # All other requests.
-    _chain.add_handler(handlers.CatchAllHandler(generic_normalizers))
+    chain.add_handler(handlers.CatchAllHandler(generic_normalizers))
+
+    return chain
 
 
 def _create_generic_normalizers():
@@ -173,14 +730,17 @@ def _create_generic_normalizers():
     '''
     return normalizers.UserAgentNormalizer([
         generic.UPLink(),
-        generic.BlackBerry(),
-        generic.YesWAP(),
-        generic.BabelFish(),
-        generic.SerialNumbers(),
-        generic.NovarraGoogleTranslator(),
+        # Rarely needed, so checked at once.
+        normalizers.Guarded(patterns.GENERIC_NORMALIZERS_GUARD, [
+            generic.BlackBerry(),
+            generic.YesWAP(),
+            generic.BabelFish(),
+            generic.SerialNumbers(),
+            generic.NovarraGoogleTranslator(),
+        ]),
         generic.LocaleRemover(),
         generic.UCWEB(),
     ])
 
 
-_init()
+_swap(Engine())
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import threading
+from abc import ABCMeta
+from array import array
+from collections import OrderedDict
+
+
+class Interface(object):
+    '''
+    Match results cache. Implementations must be thread safe.
+    '''
+    __metaclass__ = ABCMeta
+
+    def get(self, key):
+        '''
+        Returns the value linked to the given key, or None if missing.
+        '''
+        raise NotImplementedError('Please implement this method')
+
+    def set(self, key, value):
+        raise NotImplementedError('Please implement this method')
+
+    def clear(self):
+        raise NotImplementedError('Please implement this method')
+
+
+class AdmissionPolicy(object):
+    '''
+    Decides whether a new entry may replace the entry that would be evicted
+    to make room for it in a full cache.
+    '''
+    __metaclass__ = ABCMeta
+
+    def record(self, key):
+        '''
+        Called on every cache access.
+        '''
+        raise NotImplementedError('Please implement this method')
+
+    def admit(self, candidate, victim):
+        raise NotImplementedError('Please implement this method')
+
+    def clear(self):
+        raise NotImplementedError('Please implement this method')
+
+
+class TinyLFU(AdmissionPolicy):
+    '''
+    Frequency based admission policy: approximate access frequencies are
+    kept in a 4 bit count-min sketch, halved every sample_size accesses so
+    old popularity fades away. A candidate is only admitted if it has been
+    accessed more often than the victim, so the long tail of one-off keys
+    cannot evict the hot ones.
+    See 'TinyLFU: A Highly Efficient Cache Admission Policy', Einziger et al.
+    '''
+    DEPTH = 4
+    MAX_COUNT = 15
+
+    def __init__(self, max_size, sample_size=None):
+        width = 1
+        while width < max(max_size, 16):
+            width <<= 1
+        self._mask = width - 1
+        self._sample_size = sample_size if sample_size is not None else 10 * max_size
+        self._table = array('B', [0]) * (width * self.DEPTH)
+        self._additions = 0
+
+    def record(self, key):
+        table = self._table
+        indexes = self._indexes(key)
+        count = min(table[index] for index in indexes)
+        if count < self.MAX_COUNT:
+            # Conservative update: only increment the minimum counters.
+            for index in indexes:
+                if table[index] == count:
+                    table[index] = count + 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._reset()
+
+    def admit(self, candidate, victim):
+        return self.frequency(candidate) > self.frequency(victim)
+
+    def frequency(self, key):
+        table = self._table
+        return min(table[index] for index in self._indexes(key))
+
+    def clear(self):
+        for index in xrange(len(self._table)):
+            self._table[index] = 0
+        self._additions = 0
+
+    def _indexes(self, key):
+        h1 = hash(key)
+        h2 = (h1 >> 16) | 1
+        width = self._mask + 1
+        return [row * width + ((h1 + row * h2) & self._mask) for row in xrange(self.DEPTH)]
+
+    def _reset(self):
+        table = self._table
+        for index in xrange(len(table)):
+            table[index] >>= 1
+        self._additions //= 2
+
+
+class LRUCache(Interface):
+    '''
+    Thread safe, size bounded cache evicting the least recently used entry
+    when full. An optional admission policy (e.g. 'TinyLFU') may refuse to
+    replace that entry. Hits, misses, evictions and rejected insertions are
+    counted.
+    '''
+    def __init__(self, max_size, admission=None):
+        self.max_size = max_size
+        self._admission = admission
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejections = 0
+
+    def get(self, key):
+        with self._lock:
+            if self._admission is not None:
+                self._admission.record(key)
+            value = self._entries.pop(key, None)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            if key in self._entries:
+                del self._entries[key]
+            elif len(self._entries) >= self.max_size:
+                victim = next(iter(self._entries))
+                if self._admission is not None and not self._admission.admit(key, victim):
+                    self.rejections += 1
+                    return
+                del self._entries[victim]
+                self.evictions += 1
+            self._entries[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._admission is not None:
+                self._admission.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'rejections': self.rejections,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TinyLFUCache(LRUCache):
+    '''
+    LRU cache using the 'TinyLFU' admission policy.
+    '''
+    def __init__(self, max_size, sample_size=None):
+        super(TinyLFUCache, self).__init__(max_size, TinyLFU(max_size, sample_size))
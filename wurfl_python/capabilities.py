@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import threading
+from array import array
+
+INT_MIN = -2 ** 31
+INT_MAX = 2 ** 31 - 1
+
+
+class Bitset(object):
+    '''
+    Array of bits, which can only grow.
+    '''
+    __slots__ = ('bytes', '_length')
+
+    def __init__(self, bits=()):
+        bits = list(bits)
+        self._length = len(bits)
+        bits.extend([0] * (-len(bits) % 8))
+        self.bytes = array('B', [
+            b0 | b1 << 1 | b2 << 2 | b3 << 3 | b4 << 4 | b5 << 5 | b6 << 6 | b7 << 7
+            for (b0, b1, b2, b3, b4, b5, b6, b7) in zip(*[iter(bits)] * 8)])
+
+    @classmethod
+    def frombytes(cls, data, length):
+        '''
+        Returns the bitset of the given length packed in data (see 'bytes').
+        '''
+        bitset = cls.__new__(cls)
+        bitset.bytes = array('B', data)
+        bitset._length = length
+        return bitset
+
+    def extend(self, bits):
+        '''
+        Appends the given bits. Bits already in the array are never
+        changed, so they can be read meanwhile.
+        '''
+        data = self.bytes
+        length = self._length
+        for bit in bits:
+            if not length & 7:
+                data.append(0)
+            if bit:
+                data[length >> 3] |= 1 << (length & 7)
+            length += 1
+        self._length = length
+
+    def tolist(self):
+        return [(byte >> shift) & 1 for byte in self.bytes for shift in xrange(8)][:self._length]
+
+    def __getitem__(self, index):
+        return (self.bytes[index >> 3] >> (index & 7)) & 1
+
+    def __len__(self):
+        return self._length
+
+
+class Column(object):
+    '''
+    Values of a capability for all devices, indexed by device ordinal. Only
+    the values defined by the devices themselves are collected on
+    registration. The column is resolved (i.e. the values inherited from
+    the fall back devices are filled in) on first lookup, up to the last
+    registered device, so capabilities never looked up are never resolved.
+    Resolving a device just copies the stored value of its fall back
+    device, which always has a lower ordinal. Resolving only appends the
+    newly registered ordinals to the arrays of the column, so lookups are
+    safe while other threads are resolving, and registering and looking up
+    devices in turn does not resolve the whole column every time.
+    '''
+    def __init__(self, store):
+        self.resolved = 0
+        self._store = store
+        self._defined = Bitset()
+        # True if all resolved ordinals define a value.
+        self._complete = True
+        self._values = self._create_values([])
+        self._own_ordinals = array('i')
+        self._own_values = []
+
+    @classmethod
+    def accepts(cls, value):
+        raise NotImplementedError('Please implement this method')
+
+    def add(self, ordinal, value):
+        self._own_ordinals.append(ordinal)
+        self._own_values.append(value)
+
+    def get(self, ordinal, default=None):
+        if ordinal < self.resolved and (self._complete or self._defined[ordinal]):
+            return self._values[ordinal]
+        return default
+
+    def items(self):
+        '''
+        Yields (ordinal, value) for all resolved ordinals defining a value
+        and for all collected values not resolved yet.
+        '''
+        for ordinal in xrange(self.resolved):
+            if self._defined[ordinal]:
+                yield ordinal, self._decode(self._values[ordinal])
+        for item in zip(self._own_ordinals, self._own_values):
+            yield item
+
+    def resolve(self, parents):
+        '''
+        Resolves the ordinals registered since the last call. Their values
+        are appended to the arrays of the column, so resolved ordinals, the
+        only ones looked up, never change, and 'resolved' is only increased
+        once all of them are appended.
+        '''
+        start = self.resolved
+        defined = self._defined
+        values = self._values
+        own = dict(zip(self._own_ordinals, self._own_values))
+        encode = self._encode
+        new_defined = []
+        new_values = []
+        for ordinal in xrange(start, len(parents)):
+            if ordinal in own:
+                new_defined.append(1)
+                new_values.append(encode(own[ordinal]))
+            else:
+                parent = parents[ordinal]
+                if parent >= start:
+                    new_defined.append(new_defined[parent - start])
+                    new_values.append(new_values[parent - start])
+                elif parent >= 0 and defined[parent]:
+                    new_defined.append(1)
+                    new_values.append(values[parent])
+                else:
+                    new_defined.append(0)
+                    new_values.append(0)
+        self._extend_values(new_values)
+        defined.extend(new_defined)
+        if self._complete and not all(new_defined):
+            self._complete = False
+        self._own_ordinals = array('i')
+        self._own_values = []
+        self.resolved = len(parents)
+
+    def dump(self):
+        '''
+        Returns the state of the resolved column as a tuple of builtin
+        types (see 'Store.dump()').
+        '''
+        return (self.resolved, self._defined.bytes.tostring(), self._complete) + self._dump_values()
+
+    @classmethod
+    def restore(cls, store, state):
+        resolved, defined, complete, typecode, values = state
+        column = cls(store)
+        column._defined = Bitset.frombytes(defined, resolved)
+        column._complete = complete
+        column._values = column._restore_values(typecode, values, resolved)
+        column.resolved = resolved
+        return column
+
+    def _create_values(self, values):
+        raise NotImplementedError('Please implement this method')
+
+    def _extend_values(self, values):
+        self._values.extend(values)
+
+    def _dump_values(self):
+        return self._values.typecode, self._values.tostring()
+
+    def _restore_values(self, typecode, data, length):
+        values = array(typecode)
+        values.fromstring(data)
+        return values
+
+    def _encode(self, value):
+        return value
+
+    def _decode(self, value):
+        return value
+
+
+class BoolColumn(Column):
+    @classmethod
+    def accepts(cls, value):
+        return type(value) is bool
+
+    def get(self, ordinal, default=None):
+        if ordinal < self.resolved and (self._complete or self._defined[ordinal]):
+            return (self._values.bytes[ordinal >> 3] >> (ordinal & 7)) & 1 == 1
+        return default
+
+    def _create_values(self, values):
+        return Bitset(values)
+
+    def _dump_values(self):
+        return None, self._values.bytes.tostring()
+
+    def _restore_values(self, typecode, data, length):
+        return Bitset.frombytes(data, length)
+
+    def _encode(self, value):
+        return 1 if value else 0
+
+    def _decode(self, value):
+        return value == 1
+
+
+class IntColumn(Column):
+    @classmethod
+    def accepts(cls, value):
+        return type(value) is int and INT_MIN <= value <= INT_MAX
+
+    def _create_values(self, values):
+        return array('i', values)
+
+
+class FloatColumn(Column):
+    @classmethod
+    def accepts(cls, value):
+        return type(value) is float
+
+    def _create_values(self, values):
+        return array('d', values)
+
+
+class EncodedColumn(Column):
+    '''
+    Column of codes of values in the table shared by all columns of the
+    store. Codes are stored as unsigned shorts unless the table is bigger.
+    '''
+    @classmethod
+    def accepts(cls, value):
+        return True
+
+    def get(self, ordinal, default=None):
+        if ordinal < self.resolved and (self._complete or self._defined[ordinal]):
+            return self._store.table[self._values[ordinal]]
+        return default
+
+    def _create_values(self, values):
+        return array('H' if len(self._store.table) <= 0x10000 else 'i', values)
+
+    def _extend_values(self, values):
+        if self._values.typecode == 'H' and len(self._store.table) > 0x10000:
+            # Codes no longer fit: the whole array is replaced at once.
+            self._values = self._create_values(self._values.tolist() + values)
+        else:
+            self._values.extend(values)
+
+    def _encode(self, value):
+        return self._store.encode(value)
+
+    def _decode(self, value):
+        return self._store.table[value]
+
+
+class Store(object):
+    '''
+    Columnar store of the capabilities of all registered devices: one
+    column per capability, indexed by device ordinal. Boolean capabilities
+    are stored in bitsets, integer and float ones in typed arrays and any
+    other values are dictionary encoded in a table shared by all columns.
+    The type of a column is chosen according to the first value added to
+    it (i.e. the type inferred by the processor for the capability); if a
+    value of another type is added later, the column falls back to
+    dictionary encoding.
+    '''
+    COLUMN_CLASSES = (BoolColumn, IntColumn, FloatColumn, EncodedColumn)
+
+    def __init__(self):
+        self.table = []
+        self._codes = {}
+        self._parents = array('i')
+        self._columns = {}
+        self._lock = threading.Lock()
+
+    def add(self, parent_ordinal, capabilities):
+        '''
+        Adds the capabilities defined by a new device, given as a
+        dictionary or as a list of (name, value) tuples, whose fall back
+        device ordinal is parent_ordinal (-1 if none), and returns its
+        ordinal.
+        '''
+        if isinstance(capabilities, dict):
+            capabilities = capabilities.iteritems()
+        with self._lock:
+            ordinal = len(self._parents)
+            for name, value in capabilities:
+                column = self._columns.get(name)
+                if column is None:
+                    column = self._columns[name] = self._create_column(value)
+                elif not column.accepts(value):
+                    column = self._columns[name] = self._generalize(column)
+                column.add(ordinal, value)
+            self._parents.append(parent_ordinal)
+            return ordinal
+
+    def get(self, ordinal, name, default=None):
+        '''
+        Returns the value of a capability of the device with the given
+        ordinal, inherited from its fall back devices if needed.
+        '''
+        column = self._columns.get(name)
+        if column is None:
+            return default
+        if ordinal >= column.resolved:
+            with self._lock:
+                if ordinal >= column.resolved:
+                    column.resolve(self._parents)
+        return column.get(ordinal, default)
+
+    def column(self, name):
+        '''
+        Returns the column of a capability, resolved up to the last
+        registered device, or None.
+        '''
+        column = self._columns.get(name)
+        if column is not None and column.resolved < len(self._parents):
+            with self._lock:
+                if column.resolved < len(self._parents):
+                    column.resolve(self._parents)
+        return column
+
+    def names(self):
+        return self._columns.keys()
+
+    def warm_up(self):
+        '''
+        Resolves all columns, otherwise resolved on first lookup.
+        '''
+        for name in self.names():
+            self.column(name)
+
+    def dump(self):
+        '''
+        Returns the state of the store, with all columns resolved, as a
+        tuple of builtin types (e.g. to be marshalled, see 'restore()').
+        '''
+        columns = []
+        for name in sorted(self._columns):
+            column = self.column(name)
+            columns.append((name, column.__class__.__name__, column.dump()))
+        return list(self.table), self._parents.tostring(), columns
+
+    @classmethod
+    def restore(cls, state):
+        '''
+        Returns a new store with the state returned by 'dump()'.
+        '''
+        table, parents, columns = state
+        column_classes = dict((column_class.__name__, column_class) for column_class in cls.COLUMN_CLASSES)
+        store = cls()
+        store.table = table
+        store._codes = dict(((value.__class__, value), code) for code, value in enumerate(table))
+        store._parents.fromstring(parents)
+        for name, column_class, column in columns:
+            store._columns[name] = column_classes[column_class].restore(store, column)
+        return store
+
+    def encode(self, value):
+        key = (value.__class__, value)
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self.table)
+            self.table.append(value)
+        return code
+
+    def __len__(self):
+        return len(self._parents)
+
+    def _create_column(self, value):
+        for column_class in self.COLUMN_CLASSES:
+            if column_class.accepts(value):
+                return column_class(self)
+
+    def _generalize(self, column):
+        result = EncodedColumn(self)
+        for ordinal, value in column.items():
+            result.add(ordinal, value)
+        return result
@@ -0,0 +1,660 @@
+# -*- coding: utf-8 -*-
+
+"""
+Binary database format. A database is written by wurfl-python-processor
+(--format=binary) from a fully built engine (see 'wurfl_python.Engine'), and
+memory mapped by the runtime (see 'wurfl_python.load()'), so nothing needs
+to be parsed, executed, normalized or sorted on startup. A database holds:
+
+  - A header: magic, format version, WURFL version and section offsets.
+  - A string table: offsets of UTF-8 encoded strings plus a blob.
+  - A device table: id, ua, fall back device ordinal and actual device
+    root flag of every device, indexed by ordinal, plus a hash table of
+    device ids.
+  - A capability column store: one resolved column per capability (see
+    'wurfl_python.capabilities'), plus the table of dictionary encoded
+    values.
+  - The sorted uas and device ordinals of every bucket of every handler.
+  - A hash table of raw uas of registered devices resolving to their own
+    device (see 'Chain.exact_match()').
+
+Integers are little endian and arrays are 8 bytes aligned. Every section
+starts with a small header holding the offsets of its arrays.
+
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import os
+import sys
+import mmap
+import struct
+import threading
+from array import array
+from zlib import crc32
+from wurfl_python.capabilities import BoolColumn, IntColumn, FloatColumn, EncodedColumn
+from wurfl_python.handlers.bucket import Bucket
+from wurfl_python.exceptions import InvalidDatabaseException, ReadOnlyDatabaseException
+
+MAGIC = b'WURFLPY\x00'
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct('<8sIIIIIIII')
+UINT32 = struct.Struct('<I')
+INT32 = struct.Struct('<i')
+DOUBLE = struct.Struct('<d')
+STRINGS = struct.Struct('<III')
+DEVICES = struct.Struct('<IIIII')
+HASH_TABLE = struct.Struct('<IIIII')
+CAPABILITIES = struct.Struct('<IIIII')
+COLUMN = struct.Struct('<IcBxxII')
+BUCKET = struct.Struct('<III')
+
+BOOL = b'b'
+INT = b'i'
+FLOAT = b'd'
+ENCODED = b's'
+
+COLUMN_TYPES = {
+    BoolColumn: BOOL,
+    IntColumn: INT,
+    FloatColumn: FLOAT,
+    EncodedColumn: ENCODED,
+}
+
+UNICODE_VALUE = b'u'
+BOOL_VALUE = b'b'
+INT_VALUE = b'i'
+FLOAT_VALUE = b'd'
+
+
+def write(path, engine):
+    '''
+    Writes the binary database of the given engine (see
+    'wurfl_python.Engine').
+    '''
+    Writer(engine).write(path)
+
+
+def _to_bytes(values, typecode):
+    items = array(typecode, values)
+    if sys.byteorder == 'big':
+        items.byteswap()
+    return items.tostring()
+
+
+def _from_bytes(data, typecode):
+    items = array(typecode)
+    items.fromstring(data)
+    if sys.byteorder == 'big':
+        items.byteswap()
+    return items
+
+
+def _hash(key):
+    return crc32(key) & 0xffffffff
+
+
+class Writer(object):
+    def __init__(self, engine):
+        self._engine = engine
+        self._chain = engine.chain
+        self._strings = []
+        self._string_indexes = {}
+        self._chunks = []
+        self._size = HEADER.size
+
+    def write(self, path):
+        devices = self._write_devices()
+        ids = self._write_ids()
+        capabilities = self._write_capabilities()
+        handlers = self._write_handlers()
+        exact_uas = self._write_exact_uas()
+        version = self._string(self._engine.version or u'')
+        strings = self._write_strings()
+        with open(path, 'wb') as output:
+            output.write(HEADER.pack(
+                MAGIC, FORMAT_VERSION, version,
+                strings, devices, ids, capabilities, handlers, exact_uas))
+            for chunk in self._chunks:
+                output.write(chunk)
+
+    def _append(self, data):
+        padding = -self._size % 8
+        if padding:
+            self._chunks.append(b'\x00' * padding)
+            self._size += padding
+        offset = self._size
+        self._chunks.append(data)
+        self._size += len(data)
+        return offset
+
+    def _string(self, value):
+        index = self._string_indexes.get(value)
+        if index is None:
+            index = self._string_indexes[value] = len(self._strings)
+            self._strings.append(value)
+        return index
+
+    def _write_hash_table(self, items):
+        '''
+        Writes a hash table (open addressing, linear probing) of the given
+        (string key, unsigned integer value) items.
+        '''
+        capacity = 8
+        while capacity < 2 * len(items):
+            capacity <<= 1
+        mask = capacity - 1
+        slots = [0] * capacity
+        for index, (key, value) in enumerate(items):
+            slot = _hash(key.encode('utf-8')) & mask
+            while slots[slot]:
+                slot = (slot + 1) & mask
+            slots[slot] = index + 1
+        return self._append(HASH_TABLE.pack(
+            capacity,
+            len(items),
+            self._append(_to_bytes(slots, 'I')),
+            self._append(_to_bytes([self._string(key) for (key, value) in items], 'I')),
+            self._append(_to_bytes([value for (key, value) in items], 'I'))))
+
+    def _write_devices(self):
+        devices = self._engine.ordinals
+        return self._append(DEVICES.pack(
+            len(devices),
+            self._append(_to_bytes([self._string(device.id) for device in devices], 'I')),
+            self._append(_to_bytes([self._string(device.ua) for device in devices], 'I')),
+            self._append(_to_bytes([device.parent_ordinal for device in devices], 'i')),
+            self._append(_to_bytes([1 if device.actual_device_root else 0 for device in devices], 'B'))))
+
+    def _write_ids(self):
+        devices = self._engine.devices
+        return self._write_hash_table([(id, devices[id].ordinal) for id in sorted(devices)])
+
+    def _write_capabilities(self):
+        store = self._engine.capabilities
+        records = []
+        for name in sorted(store.names()):
+            column = store.column(name)
+            defined = self._append(column._defined.bytes.tostring())
+            if isinstance(column, BoolColumn):
+                values = self._append(column._values.bytes.tostring())
+            elif isinstance(column, EncodedColumn):
+                values = self._append(_to_bytes(column._values, 'I'))
+            else:
+                values = self._append(_to_bytes(column._values, column._values.typecode))
+            records.append(COLUMN.pack(
+                self._string(name), COLUMN_TYPES[column.__class__],
+                1 if column._complete else 0, defined, values))
+
+        # Dictionary encoded values: type tag plus string representation.
+        tags = []
+        strings = []
+        for value in store.table:
+            if isinstance(value, unicode):
+                tags.append(UNICODE_VALUE)
+                strings.append(value)
+            elif isinstance(value, bool):
+                tags.append(BOOL_VALUE)
+                strings.append(u'1' if value else u'')
+            elif isinstance(value, (int, long)):
+                tags.append(INT_VALUE)
+                strings.append(unicode(value))
+            elif isinstance(value, float):
+                tags.append(FLOAT_VALUE)
+                strings.append(unicode(repr(value)))
+            else:
+                raise ValueError('Unsupported capability value: %r' % (value,))
+
+        return self._append(CAPABILITIES.pack(
+            len(records),
+            self._append(b''.join(records)),
+            len(tags),
+            self._append(b''.join(tags)),
+            self._append(_to_bytes([self._string(value) for value in strings], 'I'))))
+
+    def _write_handlers(self):
+        handlers = self._chain._handlers
+        devices = self._engine.devices
+        records = [UINT32.pack(len(handlers))]
+        for handler in handlers:
+            buckets = handler._get_buckets()
+            records.append(UINT32.pack(self._string(handler.__class__.__name__)))
+            records.append(UINT32.pack(len(buckets)))
+            for bucket in buckets:
+                records.append(BUCKET.pack(
+                    len(bucket),
+                    self._append(_to_bytes([self._string(ua) for ua in bucket.uas], 'I')),
+                    self._append(_to_bytes([devices[id].ordinal for id in bucket.device_ids], 'I'))))
+        return self._append(b''.join(records))
+
+    def _write_exact_uas(self):
+        chain = self._chain
+        devices = self._engine.devices
+        inexact_uas = chain._get_inexact_uas()
+        return self._write_hash_table([
+            (ua, devices[chain._exact_uas[ua]].ordinal)
+            for ua in sorted(chain._exact_uas) if ua not in inexact_uas])
+
+    def _write_strings(self):
+        blobs = [value.encode('utf-8') for value in self._strings]
+        offsets = [0]
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+        return self._append(STRINGS.pack(
+            len(blobs),
+            self._append(_to_bytes(offsets, 'I')),
+            self._append(b''.join(blobs))))
+
+
+class Database(object):
+    '''
+    Memory mapped binary database. Strings are decoded on access.
+    '''
+    def __init__(self, path):
+        with open(path, 'rb') as input:
+            if os.fstat(input.fileno()).st_size < HEADER.size:
+                raise InvalidDatabaseException('%s is not a WURFL Python binary database' % path)
+            self._mmap = mmap.mmap(input.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, format_version, version, strings, devices, ids, capabilities, handlers, exact_uas = \
+            HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise InvalidDatabaseException('%s is not a WURFL Python binary database' % path)
+        if format_version != FORMAT_VERSION:
+            raise InvalidDatabaseException('Unsupported binary database format version: %d' % format_version)
+
+        self.strings_count, self._strings_offsets, self._strings_blob = \
+            STRINGS.unpack_from(self._mmap, strings)
+        self.devices_count, self._device_ids, self._device_uas, self._device_parents, self._device_roots = \
+            DEVICES.unpack_from(self._mmap, devices)
+        self.version = self.string(version) or None
+        self._device_ids_cache = [None] * self.devices_count
+        self.ids = MappedHashTable(self, ids)
+        self._exact_uas = MappedHashTable(self, exact_uas)
+        self._capabilities = capabilities
+        self._handlers = handlers
+
+    def uint32(self, offset):
+        return UINT32.unpack_from(self._mmap, offset)[0]
+
+    def raw_string(self, index):
+        start, end = struct.unpack_from('<II', self._mmap, self._strings_offsets + 4 * index)
+        return self._mmap[self._strings_blob + start:self._strings_blob + end]
+
+    def string(self, index):
+        return self.raw_string(index).decode('utf-8')
+
+    def device(self, ordinal):
+        '''
+        Returns the id, ua, fall back device ordinal and actual device root
+        flag of the device with the given ordinal.
+        '''
+        return (
+            self.device_id(ordinal),
+            self.string(self.uint32(self._device_uas + 4 * ordinal)),
+            INT32.unpack_from(self._mmap, self._device_parents + 4 * ordinal)[0],
+            self._mmap[self._device_roots + ordinal] == b'\x01',
+        )
+
+    def device_id(self, ordinal):
+        id = self._device_ids_cache[ordinal]
+        if id is None:
+            id = self._device_ids_cache[ordinal] = self.string(self.uint32(self._device_ids + 4 * ordinal))
+        return id
+
+    def parent_ordinals(self):
+        return array('i', struct.unpack_from('<%di' % self.devices_count, self._mmap, self._device_parents))
+
+    def capabilities(self):
+        return MappedStore(self, self._capabilities)
+
+    def handlers(self):
+        '''
+        Returns a list of (handler class name, buckets) tuples, in chain
+        order.
+        '''
+        result = []
+        offset = self._handlers + 4
+        for i in xrange(self.uint32(self._handlers)):
+            name = self.string(self.uint32(offset))
+            count = self.uint32(offset + 4)
+            offset += 8
+            buckets = []
+            for j in xrange(count):
+                size, uas, ordinals = BUCKET.unpack_from(self._mmap, offset)
+                buckets.append(MappedBucket(
+                    MappedStrings(self, uas, size),
+                    MappedDeviceIds(self, ordinals, size)))
+                offset += BUCKET.size
+            result.append((name, buckets))
+        return result
+
+    def exact_uas(self):
+        return MappedExactUas(self)
+
+
+class MappedHashTable(object):
+    '''
+    Hash table of strings to unsigned integers in a database.
+    '''
+    def __init__(self, database, offset):
+        self._database = database
+        self._capacity, self._count, self._slots, self._keys, self._values = \
+            HASH_TABLE.unpack_from(database._mmap, offset)
+
+    def get(self, key, default=None):
+        database = self._database
+        raw_key = key.encode('utf-8')
+        mask = self._capacity - 1
+        slot = _hash(raw_key) & mask
+        while True:
+            index = database.uint32(self._slots + 4 * slot)
+            if not index:
+                return default
+            index -= 1
+            if database.raw_string(database.uint32(self._keys + 4 * index)) == raw_key:
+                return database.uint32(self._values + 4 * index)
+            slot = (slot + 1) & mask
+
+    def iterkeys(self):
+        '''
+        Yields all keys, sorted.
+        '''
+        database = self._database
+        for index in xrange(self._count):
+            yield database.string(database.uint32(self._keys + 4 * index))
+
+    def iteritems(self):
+        '''
+        Yields all (key, value) tuples, sorted by key.
+        '''
+        database = self._database
+        for index in xrange(self._count):
+            yield (
+                database.string(database.uint32(self._keys + 4 * index)),
+                database.uint32(self._values + 4 * index))
+
+    def __len__(self):
+        return self._count
+
+
+class MappedExactUas(object):
+    '''
+    Read only mapping of the raw uas of registered devices resolving to
+    their own device to their device ids.
+    '''
+    def __init__(self, database):
+        self._database = database
+
+    def get(self, ua, default=None):
+        ordinal = self._database._exact_uas.get(ua)
+        if ordinal is None:
+            return default
+        return self._database.device_id(ordinal)
+
+    def iteritems(self):
+        database = self._database
+        for ua, ordinal in database._exact_uas.iteritems():
+            yield ua, database.device_id(ordinal)
+
+    def __len__(self):
+        return len(self._database._exact_uas)
+
+
+class MappedStrings(object):
+    '''
+    Read only sequence of the strings referenced by an array of string
+    indexes in a database. Decoded strings are cached, so repeated bisections
+    decode the strings they visit once.
+    '''
+    def __init__(self, database, offset, size):
+        self._database = database
+        self._offset = offset
+        self._size = size
+        self._cache = None
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        cache = self._cache
+        if cache is None:
+            cache = self._cache = [None] * self._size
+        value = cache[index]
+        if value is None:
+            value = cache[index] = self._decode(index)
+        return value
+
+    def __iter__(self):
+        for index in xrange(self._size):
+            yield self[index]
+
+    def __len__(self):
+        return self._size
+
+    def _decode(self, index):
+        database = self._database
+        return database.string(database.uint32(self._offset + 4 * index))
+
+
+class MappedDeviceIds(MappedStrings):
+    '''
+    Read only sequence of the ids of the devices referenced by an array of
+    device ordinals in a database.
+    '''
+    def _decode(self, index):
+        database = self._database
+        return database.device_id(database.uint32(self._offset + 4 * index))
+
+
+class MappedBucket(Bucket):
+    '''
+    Read only bucket of a database.
+    '''
+    def __init__(self, uas, device_ids):
+        super(MappedBucket, self).__init__()
+        self._sorted = (uas, device_ids)
+
+    def set(self, ua, device_id):
+        raise ReadOnlyDatabaseException('Binary databases are read only')
+
+    def set_many(self, uas, device_ids):
+        raise ReadOnlyDatabaseException('Binary databases are read only')
+
+
+class MappedStore(object):
+    '''
+    Read only capability store of a database (see 'capabilities.Store').
+    Columns are already resolved.
+    '''
+    def __init__(self, database, offset):
+        self._database = database
+        mmap = database._mmap
+        columns_count, columns, values_count, self._value_tags, self._value_strings = \
+            CAPABILITIES.unpack_from(mmap, offset)
+        self._columns = {}
+        for index in xrange(columns_count):
+            name, type, complete, defined, values = COLUMN.unpack_from(mmap, columns + COLUMN.size * index)
+            self._columns[database.string(name)] = (type, complete == 1, defined, values)
+        self._table = [None] * values_count
+
+    def add(self, parent_ordinal, capabilities):
+        raise ReadOnlyDatabaseException('Binary databases are read only')
+
+    def get(self, ordinal, name, default=None):
+        column = self._columns.get(name)
+        if column is None or not 0 <= ordinal < self._database.devices_count:
+            return default
+        type, complete, defined, values = column
+        mmap = self._database._mmap
+        if not complete and not (ord(mmap[defined + (ordinal >> 3)]) >> (ordinal & 7)) & 1:
+            return default
+        if type == ENCODED:
+            return self._decode(UINT32.unpack_from(mmap, values + 4 * ordinal)[0])
+        elif type == BOOL:
+            return (ord(mmap[values + (ordinal >> 3)]) >> (ordinal & 7)) & 1 == 1
+        elif type == INT:
+            return INT32.unpack_from(mmap, values + 4 * ordinal)[0]
+        else:
+            return DOUBLE.unpack_from(mmap, values + 8 * ordinal)[0]
+
+    def names(self):
+        return self._columns.keys()
+
+    def warm_up(self):
+        # Columns are resolved already.
+        pass
+
+    def dump(self):
+        '''
+        Returns the state of the store as a tuple of builtin types, in the
+        format of 'capabilities.Store.dump()'.
+        '''
+        database = self._database
+        mmap = database._mmap
+        count = database.devices_count
+        bitset_size = (count + 7) // 8
+        columns = []
+        for name in sorted(self._columns):
+            type, complete, defined, values = self._columns[name]
+            if type == BOOL:
+                column_class, typecode, data = BoolColumn, None, mmap[values:values + bitset_size]
+            elif type == INT:
+                column_class, typecode = IntColumn, 'i'
+                data = _from_bytes(mmap[values:values + 4 * count], 'i').tostring()
+            elif type == FLOAT:
+                column_class, typecode = FloatColumn, 'd'
+                data = _from_bytes(mmap[values:values + 8 * count], 'd').tostring()
+            else:
+                column_class, typecode = EncodedColumn, 'i'
+                data = _from_bytes(mmap[values:values + 4 * count], 'i').tostring()
+            columns.append((name, column_class.__name__, (
+                count, mmap[defined:defined + bitset_size], complete, typecode, data)))
+        table = [self._decode(code) for code in xrange(len(self._table))]
+        return table, database.parent_ordinals().tostring(), columns
+
+    def __len__(self):
+        return self._database.devices_count
+
+    def _decode(self, code):
+        value = self._table[code]
+        if value is None:
+            database = self._database
+            tag = database._mmap[self._value_tags + code]
+            value = database.string(database.uint32(self._value_strings + 4 * code))
+            if tag == BOOL_VALUE:
+                value = value == u'1'
+            elif tag == INT_VALUE:
+                value = int(value)
+            elif tag == FLOAT_VALUE:
+                value = float(value)
+            self._table[code] = value
+        return value
+
+
+class MappedDevices(object):
+    '''
+    Read only mapping of device ids to the devices of a database. Devices are
+    created on first access, using the given factory:
+    factory(ordinal, parent_ordinal, id, ua, actual_device_root).
+    '''
+    def __init__(self, database, factory):
+        self._database = database
+        self._factory = factory
+        self._devices = [None] * database.devices_count
+        # Id -> device of the devices found so far.
+        self._found = {}
+        self._lock = threading.Lock()
+
+    def device(self, ordinal):
+        device = self._devices[ordinal]
+        if device is None:
+            with self._lock:
+                device = self._devices[ordinal]
+                if device is None:
+                    id, ua, parent_ordinal, actual_device_root = self._database.device(ordinal)
+                    device = self._devices[ordinal] = self._factory(
+                        ordinal, parent_ordinal, id, ua, actual_device_root)
+        return device
+
+    def get(self, id, default=None):
+        device = self._found.get(id)
+        if device is None:
+            ordinal = self._database.ids.get(id)
+            if ordinal is None:
+                return default
+            device = self._found[id] = self.device(ordinal)
+        return device
+
+    def __getitem__(self, id):
+        device = self.get(id)
+        if device is None:
+            raise KeyError(id)
+        return device
+
+    def __contains__(self, id):
+        return self._database.ids.get(id) is not None
+
+    def __iter__(self):
+        return self._database.ids.iterkeys()
+
+    def __len__(self):
+        return len(self._database.ids)
+
+    def iterkeys(self):
+        return iter(self)
+
+    def itervalues(self):
+        for id in self:
+            yield self[id]
+
+    def iteritems(self):
+        for id in self:
+            yield id, self[id]
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+
+class MappedOrdinals(object):
+    '''
+    Read only sequence of the devices of a database, indexed by ordinal.
+    '''
+    def __init__(self, devices):
+        self._devices = devices
+
+    def __getitem__(self, ordinal):
+        if not 0 <= ordinal < len(self):
+            raise IndexError(ordinal)
+        return self._devices.device(ordinal)
+
+    def __len__(self):
+        return self._devices._database.devices_count
+
+
+class MappedChildren(object):
+    '''
+    Read only mapping of device ordinals to the ordinals of their children,
+    computed on first access.
+    '''
+    def __init__(self, database):
+        self._database = database
+        self._children = None
+
+    def get(self, ordinal, default=None):
+        children = self._children
+        if children is None:
+            children = {}
+            for child, parent in enumerate(self._database.parent_ordinals()):
+                if parent >= 0:
+                    children.setdefault(parent, []).append(child)
+            self._children = children
+        return children.get(ordinal, default)
@@ -17,4 +17,25 @@ class UnregisteredParentDeviceException(WURFLException):
 
 
 class DeferredDeviceException(WURFLException):
+    '''
+    Raised by the processor when some devices cannot be dumped. missing maps
+    the ids of fall back devices which are not defined to the ids of the
+    devices falling back to them, and cycles lists the ids of the devices
+    of every cycle of devices falling back to each other.
+    '''
+    def __init__(self, message, missing=None, cycles=None):
+        WURFLException.__init__(self, message)
+        self.missing = missing if missing is not None else {}
+        self.cycles = cycles if cycles is not None else []
+
+
+class InvalidDatabaseException(WURFLException):
+    pass
+
+
+class ReadOnlyDatabaseException(WURFLException):
+    pass
+
+
+class IncompatibleSnapshotException(WURFLException):
     pass
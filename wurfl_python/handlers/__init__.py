@@ -12,7 +12,10 @@ from collections import OrderedDict
 from abc import ABCMeta
 from wurfl_python import constants
 from wurfl_python import normalizers
-from wurfl_python.handlers.matchers.ld import LDMatcher
+from wurfl_python import patterns
+from wurfl_python.handlers.bucket import Bucket
+from wurfl_python.handlers.dispatcher import KeywordDispatcher
+from wurfl_python.handlers.matchers.ld import LDIndex, LDMatcher
 from wurfl_python.handlers.matchers.ris import RISMatcher
 
 
@@ -22,72 +25,145 @@ class Handler(object):
     '''
     __metaclass__ = ABCMeta
 
+    # Lower cased keywords, at least one of which must be contained in (or,
+    # for prefixes, start) the user agent for can_handle() to return True.
+    # Used by 'KeywordDispatcher' to skip handlers. Handlers not declaring
+    # any of them are always consulted.
+    dispatch_keywords = None
+    dispatch_prefixes = None
+
+    # Maximum number of successful conclusive and recovery match results
+    # memoized per handler, keyed on the normalized ua. Zero disables the
+    # memo.
+    NORMALIZED_MEMO_SIZE = 1000
+
+    # True if the handler matches with get_device_id_from_ld(), so warm_up()
+    # builds its LD index.
+    USES_LD_MATCHER = False
+
     def __init__(self, normalizer=None):
         if normalizer is None:
             self._normalizer = normalizers.Null()
         else:
             self._normalizer = normalizer
-        self._uas_with_device_id = {}
-        self._ordered_uas = None
+        self._uas_with_device_id = Bucket()
+        self._ld_index = None
         self._next_handler = None
+        if self.NORMALIZED_MEMO_SIZE > 0:
+            # A plain dictionary, not a locking cache: single dictionary
+            # operations are atomic, so matching stays lock free.
+            self._normalized_memo = {}
+        else:
+            self._normalized_memo = None
 
     def set_next_handler(self, handler):
         self._next_handler = handler
 
-    def can_handle(self, ua):
+    def can_handle(self, ua, context):
         '''
         Returns True if this handler can handle the given ua.
         '''
         raise NotImplementedError('Please implement this method')
 
-    def filter(self, ua, device_id):
-        if self.can_handle(ua):
-            self._uas_with_device_id[self._normalizer.normalize(ua)] = device_id
-            self._ordered_uas = None
+    def filter(self, ua, device_id, context):
+        if self.can_handle(ua, context):
+            normalized_ua = self._normalizer.normalize_in_context(ua, context)
+            if normalized_ua == ua:
+                # Share the string with the device.
+                normalized_ua = ua
+            self._add(ua, normalized_ua, device_id)
             return None
 
         if self._next_handler is not None:
-            return self._next_handler.filter(ua, device_id)
+            return self._next_handler.filter(ua, device_id, context)
 
         return None
 
-    def match(self, ua):
+    def match(self, ua, context):
         '''
         Returns a matching device id for the given ua, if no matching
         device is found will return 'generic'.
         '''
-        if self.can_handle(ua):
-            return self.apply_match(ua)
+        if self.can_handle(ua, context):
+            return self.apply_match(ua, context)
 
         if self._next_handler is not None:
-            return self._next_handler.match(ua)
+            return self._next_handler.match(ua, context)
 
         return constants.GENERIC
 
-    def apply_match(self, ua):
+    def apply_match(self, ua, context):
         # Normalize.
-        ua = self._normalizer.normalize(ua)
+        ua = self._normalizer.normalize_in_context(ua, context)
+        # Exact, conclusive and recovery matches.
+        device_id = self.apply_normalized_match(ua)
+        # Try with catch all recovery Match.
+        if self._is_blank_or_generic(device_id):
+            device_id = self.apply_recovery_catch_all_match(ua, context)
+            # All attempts to match have failed.
+            if self._is_blank_or_generic(device_id):
+                device_id = constants.GENERIC
+        # Done!
+        return device_id
+
+    def apply_match_many(self, contexts):
+        '''
+        Batch version of apply_match(). Returns the list of device ids
+        matching the uas of the given match contexts, in the same order.
+        Every distinct normalized ua is matched just once.
+        '''
+        device_ids = []
+        normalized_device_ids = {}
+        for context in contexts:
+            ua = self._normalizer.normalize_in_context(context.ua, context)
+            if ua in normalized_device_ids:
+                device_id = normalized_device_ids[ua]
+            else:
+                device_id = normalized_device_ids[ua] = self.apply_normalized_match(ua)
+            # The catch all recovery match depends on the match context.
+            if self._is_blank_or_generic(device_id):
+                device_id = self.apply_recovery_catch_all_match(ua, context)
+                if self._is_blank_or_generic(device_id):
+                    device_id = constants.GENERIC
+            device_ids.append(device_id)
+        return device_ids
+
+    def apply_normalized_match(self, ua):
+        '''
+        Exact, conclusive and recovery matches of an already normalized ua.
+        Unlike the catch all recovery match, they only depend on the ua, so
+        conclusive and recovery results are memoized. Many distinct raw uas
+        collapse to the same normalized one.
+        '''
         # Start with an Exact match.
         device_id = self.apply_exact_match(ua)
-        # Try with the conclusive Match.
         if self._is_blank_or_generic(device_id):
+            memo = self._normalized_memo
+            if memo is not None:
+                device_id = memo.get(ua)
+                if device_id is not None:
+                    return device_id
+            # Try with the conclusive Match.
             device_id = self.apply_conclusive_match(ua)
             # Try with recovery match.
             if self._is_blank_or_generic(device_id):
                 device_id = self.apply_recovery_match(ua)
-                # Try with catch all recovery Match.
-                if self._is_blank_or_generic(device_id):
-                    device_id = self.apply_recovery_catch_all_match(ua)
-                    # All attempts to match have failed.
-                    if self._is_blank_or_generic(device_id):
-                        device_id = constants.GENERIC
-        # Done!
+            if memo is not None and not self._is_blank_or_generic(device_id):
+                self._memoize(memo, ua, device_id)
         return device_id
 
+    def _memoize(self, memo, ua, device_id):
+        if len(memo) >= self.NORMALIZED_MEMO_SIZE:
+            # Evicts an arbitrary entry. Another thread may have emptied
+            # the memo meanwhile.
+            try:
+                memo.popitem()
+            except KeyError:
+                pass
+        memo[ua] = device_id
+
     def apply_exact_match(self, ua):
-        if ua in self._uas_with_device_id:
-            return self._uas_with_device_id[ua]
-        return constants.NO_MATCH
+        return self._uas_with_device_id.get(ua, constants.NO_MATCH)
 
     def apply_conclusive_match(self, ua):
         match = self.look_for_matching_ua(ua)
@@ -102,11 +178,11 @@ class Handler(object):
     def apply_recovery_match(self, ua):
         pass
 
-    def apply_recovery_catch_all_match(self, ua):
-        if Utils.is_desktop_browser_heavy_duty_analysis(ua):
+    def apply_recovery_catch_all_match(self, ua, context):
+        if Utils.is_desktop_browser_heavy_duty_analysis(ua, context):
             return constants.GENERIC_WEB_BROWSER
-        mobile = Utils.is_mobile_browser(ua)
-        desktop = Utils.is_desktop_browser(ua)
+        mobile = Utils.is_mobile_browser(ua, context)
+        desktop = Utils.is_desktop_browser(ua, context)
         if not desktop:
             device_id = Utils.get_mobile_catch_all_id(ua)
             if device_id != constants.NO_MATCH:
@@ -124,22 +200,70 @@ class Handler(object):
         return constants.NO_MATCH
 
     def get_device_id_from_ld(self, ua, tolerance=None):
-        match = Utils.ld_match(self._get_ordered_uas(), ua, tolerance)
+        match = Utils.ld_match(self._get_ld_index(), ua, tolerance)
         if match:
             return self._uas_with_device_id[match]
         return constants.NO_MATCH
 
+    def warm_up(self):
+        '''
+        Builds the indexes of this handler, otherwise built by the first
+        match needing them: the sorted lists of its buckets and, if used,
+        its LD index.
+        '''
+        for bucket in self._get_buckets():
+            bucket.uas
+        if self.USES_LD_MATCHER:
+            Utils.ld_prepare(self._get_ld_index())
+
     def _is_blank_or_generic(self, device_id):
         return \
             device_id is None or \
             device_id == constants.GENERIC or \
             len(device_id.strip()) == 0
 
+    def _add(self, ua, normalized_ua, device_id):
+        self._add_to_buckets(self._get_bucket_indexes(ua), normalized_ua, device_id)
+
+    def _add_to_buckets(self, indexes, normalized_ua, device_id):
+        '''
+        Adds a normalized ua to the buckets with the given indexes (see
+        '_get_buckets()').
+        '''
+        buckets = self._get_buckets()
+        for index in indexes:
+            buckets[index].set(normalized_ua, device_id)
+        self._reset_indexes()
+
+    def _get_bucket_indexes(self, ua):
+        '''
+        Returns the indexes of the buckets (see '_get_buckets()') a ua owned
+        by this handler belongs to.
+        '''
+        return (0,)
+
+    def _get_buckets(self):
+        return [self._uas_with_device_id]
+
+    def _set_buckets(self, buckets):
+        '''
+        Replaces the buckets of this handler (see '_get_buckets()').
+        '''
+        (self._uas_with_device_id,) = buckets
+        self._reset_indexes()
+
+    def _reset_indexes(self):
+        self._ld_index = None
+        if self._normalized_memo is not None:
+            self._normalized_memo.clear()
+
     def _get_ordered_uas(self):
-        if self._ordered_uas is None:
-            self._ordered_uas = self._uas_with_device_id.keys()
-            self._ordered_uas.sort()
-        return self._ordered_uas
+        return self._uas_with_device_id.uas
+
+    def _get_ld_index(self):
+        if self._ld_index is None:
+            self._ld_index = LDIndex(self._get_ordered_uas())
+        return self._ld_index
 
 
 class Chain(Handler):
@@ -149,29 +273,250 @@ class Chain(Handler):
     def __init__(self):
         super(Chain, self).__init__()
         self._handlers = []
+        self._handlers_by_name = {}
+        self._dispatcher = None
+        # Raw ua -> device id of every registered device, and the raw uas
+        # which match() does not resolve to their own device.
+        self._exact_uas = {}
+        self._inexact_uas = set()
+        self._inexact_uas_outdated = False
+        self.exact_match_enabled = True
+        self.exact_match_hits = 0
 
     def add_handler(self, handler):
         size = len(self._handlers)
         if size > 0:
             self._handlers[size-1].set_next_handler(handler)
         self._handlers.append(handler)
+        self._handlers_by_name[handler.__class__.__name__] = handler
+        self._dispatcher = None
         return self
 
-    def filter(self, ua, device_id):
-        Utils.reset()
-        return self._handlers[0].filter(ua, device_id)
+    def filter(self, ua, device_id, context=None):
+        self._exact_uas[ua] = device_id
+        self._inexact_uas_outdated = True
+        if context is None:
+            context = MatchContext(ua)
+        handler = self.get_handler(ua, context)
+        if handler is not None:
+            handler.filter(ua, device_id, context)
+        return None
+
+    def classify(self, ua):
+        '''
+        Returns the class name of the handler owning the given ua, the
+        normalized ua and the indexes of the buckets of the handler it
+        belongs to, as filter() would compute them. The handler name is
+        None if no handler owns the ua.
+        '''
+        context = MatchContext(ua)
+        handler = self.get_handler(ua, context)
+        if handler is None:
+            return None, None, ()
+        return (
+            handler.__class__.__name__,
+            handler._normalizer.normalize_in_context(ua, context),
+            handler._get_bucket_indexes(ua))
+
+    def add(self, ua, device_id, handler_name, normalized_ua, indexes):
+        '''
+        Same as filter(), but using a classification of the ua previously
+        computed by classify(), so no handler is consulted and nothing is
+        normalized. A None normalized ua stands for the ua itself. Falls
+        back to filter() for unknown handlers.
+        '''
+        handler = self._handlers_by_name.get(handler_name)
+        if handler is None and handler_name is not None:
+            return self.filter(ua, device_id)
+        self._exact_uas[ua] = device_id
+        self._inexact_uas_outdated = True
+        if handler is None:
+            return None
+        if normalized_ua is None or normalized_ua == ua:
+            # Share the string with the device.
+            normalized_ua = ua
+        handler._add_to_buckets(indexes, normalized_ua, device_id)
+        return None
+
+    def add_many(self, records):
+        '''
+        Bulk version of add() for (ua, device_id, classification) tuples.
+        Uas without classification (None) or classified for unknown
+        handlers are classified first. Uas are appended to every bucket at
+        once and the indexes of every handler are reset once.
+        '''
+        handlers_by_name = self._handlers_by_name
+        exact_uas = self._exact_uas
+        pending = {}
+        for ua, device_id, classification in records:
+            if classification is None or classification[0] not in handlers_by_name:
+                classification = self.classify(ua)
+            handler_name, normalized_ua, indexes = classification
+            exact_uas[ua] = device_id
+            if handler_name is None:
+                continue
+            if normalized_ua is None or normalized_ua == ua:
+                # Share the string with the device.
+                normalized_ua = ua
+            for index in indexes:
+                key = (handler_name, index)
+                items = pending.get(key)
+                if items is None:
+                    items = pending[key] = ([], [])
+                items[0].append(normalized_ua)
+                items[1].append(device_id)
+        self._inexact_uas_outdated = True
+
+        handlers = set()
+        for (handler_name, index), (uas, device_ids) in pending.iteritems():
+            handler = handlers_by_name[handler_name]
+            handler._get_buckets()[index].set_many(uas, device_ids)
+            handlers.add(handler)
+        for handler in handlers:
+            handler._reset_indexes()
+
+    def match(self, ua, context=None):
+        if context is None:
+            context = MatchContext(ua)
+        handler = self.get_handler(ua, context)
+        if handler is not None:
+            return handler.apply_match(ua, context)
+        return constants.GENERIC
+
+    def match_many(self, uas):
+        '''
+        Batch version of match(). Returns the list of device ids matching
+        the given uas, in the same order. Every distinct ua is dispatched
+        and normalized just once, and then matched by its handler together
+        with all other uas owned by the same handler.
+        '''
+        groups = {}
+        device_ids = {}
+        for ua in uas:
+            if ua not in device_ids:
+                device_id = self.exact_match(ua)
+                if device_id is not None:
+                    device_ids[ua] = device_id
+                    continue
+                device_ids[ua] = constants.GENERIC
+                context = MatchContext(ua)
+                handler = self.get_handler(ua, context)
+                if handler is not None:
+                    groups.setdefault(handler, []).append(context)
+        for handler in self._handlers:
+            if handler in groups:
+                contexts = groups[handler]
+                for context, device_id in zip(contexts, handler.apply_match_many(contexts)):
+                    device_ids[context.ua] = device_id
+        return [device_ids[ua] for ua in uas]
+
+    def warm_up(self):
+        '''
+        Builds the dispatcher, the table of uas of registered devices and
+        the indexes of all handlers (see 'Handler.warm_up()'), otherwise
+        built by the first matches needing them.
+        '''
+        self._get_dispatcher()
+        self._get_inexact_uas()
+        for handler in self._handlers:
+            handler.warm_up()
+
+    def exact_match(self, ua):
+        '''
+        Returns the id of the device registered with the given ua, as long
+        as match() resolves that ua to it, or None. A single dictionary
+        lookup instead of dispatching, normalizing and looking up the ua in
+        the handler bucket.
+        '''
+        if self.exact_match_enabled:
+            device_id = self._exact_uas.get(ua)
+            if device_id is not None and ua not in self._get_inexact_uas():
+                self.exact_match_hits += 1
+                return device_id
+        return None
+
+    def get_handler(self, ua, context):
+        '''
+        Returns the first handler in the chain able to handle the given ua,
+        or None.
+        '''
+        for handler in self._get_dispatcher().candidates(ua, context):
+            if handler.can_handle(ua, context):
+                return handler
+        return None
+
+    def match_linear(self, ua, context=None):
+        '''
+        Same as match() but walking the whole chain of handlers, as WURFL
+        PHP does. Useful to check and benchmark the dispatcher.
+        '''
+        if context is None:
+            context = MatchContext(ua)
+        return self._handlers[0].match(ua, context)
 
-    def match(self, ua):
-        Utils.reset()
-        return self._handlers[0].match(ua)
+    def _set_exact_uas(self, exact_uas, inexact_uas=()):
+        '''
+        Replaces the table of raw uas of registered devices, given the uas
+        in it which match() does not resolve to their own device.
+        '''
+        self._exact_uas = exact_uas
+        self._inexact_uas = set(inexact_uas)
+        self._inexact_uas_outdated = False
+
+    def _get_dispatcher(self):
+        if self._dispatcher is None:
+            self._dispatcher = KeywordDispatcher(self._handlers, Utils, MatchContext)
+        return self._dispatcher
+
+    def _get_inexact_uas(self):
+        if self._inexact_uas_outdated:
+            # A registered ua resolves to its own device if that device
+            # still owns an entry in a handler bucket (i.e. no other ua
+            # normalized the same way was registered later) and the device
+            # was registered once. Generic devices are left to the chain,
+            # which does not stop at exact matches of them.
+            owners = set()
+            for handler in self._handlers:
+                owners.update(handler._uas_with_device_id.device_ids)
+            registrations = {}
+            for device_id in self._exact_uas.itervalues():
+                registrations[device_id] = registrations.get(device_id, 0) + 1
+            self._inexact_uas = set(
+                ua for ua, device_id in self._exact_uas.iteritems()
+                if device_id not in owners or
+                registrations[device_id] > 1 or
+                self._is_blank_or_generic(device_id))
+            self._inexact_uas_outdated = False
+        return self._inexact_uas
+
+
+class MatchContext(object):
+    '''
+    State of a single match() or filter() call: the user agent, its lower
+    cased form and the desktop, mobile and Smart TV flags, lazily computed
+    by 'Utils' on first use. Replaces the class level caches used by WURFL
+    PHP, so matching is reentrant and can run concurrently in several
+    threads. Results of staged normalizers are cached too.
+    '''
+    __slots__ = ('ua', 'lower_ua', 'desktop_browser', 'mobile_browser', 'smart_tv', 'normalized_uas')
+
+    def __init__(self, ua):
+        self.ua = ua
+        self.lower_ua = ua.lower()
+        self.desktop_browser = None
+        self.mobile_browser = None
+        self.smart_tv = None
+        self.normalized_uas = None
 
 
 class AlcatelHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_AlcatelHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_prefixes = [u'alcatel']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return \
             Utils.check_if_starts_with(ua, u'Alcatel') or\
@@ -182,6 +527,8 @@ class AndroidHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_AndroidHandler'.
     '''
+    dispatch_keywords = [u'android']
+
     constant_ids = [
         u'generic_android',
         u'generic_android_ver1_5',
@@ -239,8 +586,8 @@ class AndroidHandler(Handler):
         u'generic_android_ver2_3_netfrontlifebrowser',
     ]
 
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_contains(ua, u'Android')
 
@@ -403,14 +750,14 @@ class AndroidHandler(Handler):
         (u'Honeycomb', u'3.0'),
         # (u'Ice Cream Sandwich', u'4.0'),
     ])
+    android_release_pattern = re.compile(u'|'.join(map(re.escape, android_release_map.keys())))
 
     @classmethod
     def get_android_version(cls, ua, use_default=True):
         # Replace Android version names with their numbers.
         # ex: Froyo => 2.2
-        pattern = u'|'.join(map(re.escape, cls.android_release_map.keys()))
-        ua = re.sub(pattern, lambda m: cls.android_release_map[m.group()], ua)
-        matches = re.search(r'Android (\d\.\d)', ua)
+        ua = cls.android_release_pattern.sub(lambda m: cls.android_release_map[m.group()], ua)
+        matches = patterns.ANDROID_VERSION.search(ua)
         if matches is not None:
             version = matches.group(1)
             if version in cls.valid_android_versions:
@@ -422,7 +769,7 @@ class AndroidHandler(Handler):
 
     @classmethod
     def get_opera_on_android_version(cls, ua, use_default=True):
-        matches = re.search(r'Version\/(\d\d)', ua)
+        matches = patterns.OPERA_ON_ANDROID_VERSION.search(ua)
         if matches is not None:
             version = matches.group(1)
             if version in cls.valid_opera_versions:
@@ -431,7 +778,7 @@ class AndroidHandler(Handler):
 
     @classmethod
     def get_android_model(cls, ua, use_default=True):
-        matches = re.search(r'Android [^;]+; xx-xx; (.+?) Build/', ua)
+        matches = patterns.ANDROID_MODEL.search(ua)
         if matches is None:
             return None
 
@@ -445,18 +792,18 @@ class AndroidHandler(Handler):
         # HTC.
         if model.find(u'HTC') != -1:
             # Normalize "HTC/".
-            model = re.sub(r'HTC[ _\-/]', r'HTC~', model)
+            model = patterns.ANDROID_MODEL_HTC.sub(r'HTC~', model)
             # Remove the version.
-            model = re.sub(r'(/| V?[\d\.]).*$', r'', model)
-            model = re.sub(r'/.*$', r'', model)
+            model = patterns.ANDROID_MODEL_HTC_VERSION.sub(r'', model)
+            model = patterns.ANDROID_MODEL_HTC_SLASH.sub(r'', model)
         # Samsung.
-        model = re.sub(r'(SAMSUNG[^/]+)/.*$', r'\1', model)
+        model = patterns.ANDROID_MODEL_SAMSUNG.sub(r'\1', model)
         # Orange.
-        model = re.sub(r'ORANGE/.*$', r'ORANGE', model)
+        model = patterns.ANDROID_MODEL_ORANGE.sub(r'ORANGE', model)
         # LG.
-        model = re.sub(r'(LG-[^/]+)/[vV].*$', r'\1', model)
+        model = patterns.ANDROID_MODEL_LG.sub(r'\1', model)
         # Serial Number.
-        model = re.sub(r'\[[\d]{10}\]', r'', model)
+        model = patterns.ANDROID_MODEL_SERIAL_NUMBER.sub(r'', model)
 
         return model.strip()
 
@@ -465,6 +812,8 @@ class AppleHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_AppleHandler'.
     '''
+    dispatch_keywords = [u'iphone', u'ipod', u'ipad']
+
     constant_ids = [
         u'apple_ipod_touch_ver1',
         u'apple_ipod_touch_ver2',
@@ -483,8 +832,8 @@ class AppleHandler(Handler):
         u'apple_iphone_ver5',
     ]
 
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return \
             Utils.check_if_starts_with(ua, u'Mozilla/5') and \
@@ -506,7 +855,7 @@ class AppleHandler(Handler):
         return self.get_device_id_from_ris(ua, tolerance)
 
     def apply_recovery_match(self, ua):
-        matches = re.search(r' (\d)_(\d)[ _]', ua)
+        matches = patterns.APPLE_VERSION.search(ua)
         if matches is not None:
             major_version = int(matches.group(1))
             minor_version = int(matches.group(2))
@@ -540,8 +889,10 @@ class BenQHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_BenQHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_prefixes = [u'benq']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return \
             Utils.check_if_starts_with(ua, u'BenQ') or \
@@ -552,6 +903,8 @@ class BlackBerryHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_BlackBerryHandler'.
     '''
+    dispatch_keywords = [u'blackberry']
+
     constant_ids = OrderedDict([
         (u'2.', u'blackberry_generic_ver2'),
         (u'3.2', u'blackberry_generic_ver3_sub2'),
@@ -570,8 +923,8 @@ class BlackBerryHandler(Handler):
         (u'6.', u'blackberry_generic_ver6'),
     ])
 
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_contains_case_insensitive(ua, u'BlackBerry')
 
@@ -586,7 +939,7 @@ class BlackBerryHandler(Handler):
 
     def apply_recovery_match(self, ua):
         # No need for case insensitivity here, BlackBerry was fixed in the normalizer.
-        matches = re.search(r'BlackBerry[^/\s]+/(\d.\d)', ua)
+        matches = patterns.BLACKBERRY_VERSION.search(ua)
         if matches is not None:
             version = matches.group(1)
             for vercode, device_id in self.constant_ids.iteritems():
@@ -643,7 +996,9 @@ class BotCrawlerTranscoderHandler(Handler):
         u'ichiro'
     ]
 
-    def can_handle(self, ua):
+    dispatch_keywords = map(unicode.lower, _bot_crawler_transcoder)
+
+    def can_handle(self, ua, context):
         for key in self._bot_crawler_transcoder:
             if Utils.check_if_contains_case_insensitive(ua, key):
                 return True
@@ -656,17 +1011,19 @@ class CatchAllHandler(Handler):
     '''
     MOZILLA_TOLERANCE = 5
 
+    USES_LD_MATCHER = True
+
     MOZILLA5 = u'CATCH_ALL_MOZILLA5'
     MOZILLA4 = u'CATCH_ALL_MOZILLA4'
 
     def __init__(self, *args, **kwargs):
         super(CatchAllHandler, self).__init__(*args, **kwargs)
-        self._mozilla4_uas_with_device_id = {}
-        self._mozilla4_ordered_uas = None
-        self._mozilla5_uas_with_device_id = {}
-        self._mozilla5_ordered_uas = None
+        self._mozilla4_uas_with_device_id = Bucket()
+        self._mozilla4_ld_index = None
+        self._mozilla5_uas_with_device_id = Bucket()
+        self._mozilla5_ld_index = None
 
-    def can_handle(self, ua):
+    def can_handle(self, ua, context):
         return True
 
     def apply_conclusive_match(self, ua):
@@ -679,12 +1036,13 @@ class CatchAllHandler(Handler):
         return device_id
 
     def apply_exact_match(self, ua):
-        if ua in self._uas_with_device_id:
-            return self._uas_with_device_id[ua]
-        if ua in self._mozilla4_uas_with_device_id:
-            return self._mozilla4_uas_with_device_id[ua]
-        if ua in self._mozilla5_uas_with_device_id:
-            return self._mozilla5_uas_with_device_id[ua]
+        for bucket in (
+                self._uas_with_device_id,
+                self._mozilla4_uas_with_device_id,
+                self._mozilla5_uas_with_device_id):
+            device_id = bucket.get(ua)
+            if device_id is not None:
+                return device_id
         return constants.NO_MATCH
 
     def _apply_mozilla_conclusive_match(self, ua):
@@ -692,31 +1050,52 @@ class CatchAllHandler(Handler):
             return self._apply_mozilla5_conclusive_match(ua)
         if self._is_mozilla4(ua):
             return self._apply_mozilla4_conclusive_match(ua)
-        match = Utils.ld_match(self._get_ordered_uas(), ua, self.MOZILLA_TOLERANCE)
+        match = Utils.ld_match(self._get_ld_index(), ua, self.MOZILLA_TOLERANCE)
         return self._uas_with_device_id[match]
 
     def _apply_mozilla5_conclusive_match(self, ua):
         if ua not in self._mozilla5_uas_with_device_id:
-            match = Utils.ld_match(self._get_mozilla5_ordered_uas(), ua, self.MOZILLA_TOLERANCE)
+            match = Utils.ld_match(self._get_mozilla5_ld_index(), ua, self.MOZILLA_TOLERANCE)
         if match:
             return self._mozilla5_uas_with_device_id[match]
         return constants.NO_MATCH
 
     def _apply_mozilla4_conclusive_match(self, ua):
         if ua not in self._mozilla4_uas_with_device_id:
-            match = Utils.ld_match(self._get_mozilla4_ordered_uas(), ua, self.MOZILLA_TOLERANCE)
+            match = Utils.ld_match(self._get_mozilla4_ld_index(), ua, self.MOZILLA_TOLERANCE)
         if match:
             return self._mozilla4_uas_with_device_id[match]
         return constants.NO_MATCH
 
-    def filter(self, ua, device_id):
+    def warm_up(self):
+        super(CatchAllHandler, self).warm_up()
+        Utils.ld_prepare(self._get_mozilla4_ld_index())
+        Utils.ld_prepare(self._get_mozilla5_ld_index())
+
+    def _get_bucket_indexes(self, ua):
+        # Buckets share the normalized ua.
+        indexes = [0]
         if self._is_mozilla4(ua):
-            self._mozilla4_uas_with_device_id[self._normalizer.normalize(ua)] = device_id
-            self._mozilla4_ordered_uas = None
+            indexes.append(1)
         if self._is_mozilla5(ua):
-            self._mozilla5_uas_with_device_id[self._normalizer.normalize(ua)] = device_id
-            self._mozilla5_ordered_uas = None
-        super(CatchAllHandler, self).filter(ua, device_id)
+            indexes.append(2)
+        return tuple(indexes)
+
+    def _get_buckets(self):
+        return [
+            self._uas_with_device_id,
+            self._mozilla4_uas_with_device_id,
+            self._mozilla5_uas_with_device_id,
+        ]
+
+    def _set_buckets(self, buckets):
+        self._uas_with_device_id, self._mozilla4_uas_with_device_id, self._mozilla5_uas_with_device_id = buckets
+        self._reset_indexes()
+
+    def _reset_indexes(self):
+        self._mozilla4_ld_index = None
+        self._mozilla5_ld_index = None
+        super(CatchAllHandler, self)._reset_indexes()
 
     def _is_mozilla5(self, ua):
         return Utils.check_if_starts_with(ua, 'Mozilla/5')
@@ -728,28 +1107,34 @@ class CatchAllHandler(Handler):
         return Utils.check_if_starts_with(ua, u'Mozilla')
 
     def _get_mozilla4_ordered_uas(self):
-        if self._mozilla4_ordered_uas is None:
-            self._mozilla4_ordered_uas = self._mozilla4_uas_with_device_id.keys()
-            self._mozilla4_ordered_uas.sort()
-        return self._mozilla4_ordered_uas
+        return self._mozilla4_uas_with_device_id.uas
 
     def _get_mozilla5_ordered_uas(self):
-        if self._mozilla5_ordered_uas is None:
-            self._mozilla5_ordered_uas = self._mozilla5_uas_with_device_id.keys()
-            self._mozilla5_ordered_uas.sort()
-        return self._mozilla5_ordered_uas
+        return self._mozilla5_uas_with_device_id.uas
+
+    def _get_mozilla4_ld_index(self):
+        if self._mozilla4_ld_index is None:
+            self._mozilla4_ld_index = LDIndex(self._get_mozilla4_ordered_uas())
+        return self._mozilla4_ld_index
+
+    def _get_mozilla5_ld_index(self):
+        if self._mozilla5_ld_index is None:
+            self._mozilla5_ld_index = LDIndex(self._get_mozilla5_ordered_uas())
+        return self._mozilla5_ld_index
 
 
 class ChromeHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_ChromeHandler'.
     '''
+    dispatch_keywords = [u'chrome']
+
     constant_ids = [
         u'google_chrome',
     ]
 
-    def can_handle(self, ua):
-        if Utils.is_mobile_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_mobile_browser(ua, context):
             return False
         return Utils.check_if_contains(ua, u'Chrome')
 
@@ -765,13 +1150,15 @@ class DoCoMoHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_DoCoMoHandler'.
     '''
+    dispatch_prefixes = [u'docomo']
+
     constant_ids = [
         u'docomo_generic_jap_ver1',
         u'docomo_generic_jap_ver2',
     ]
 
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_starts_with(ua, u'DoCoMo')
 
@@ -792,6 +1179,8 @@ class FirefoxHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_FirefoxHandler'.
     '''
+    dispatch_keywords = [u'firefox']
+
     constant_ids = [
         u'firefox',
         u'firefox_1',
@@ -808,8 +1197,8 @@ class FirefoxHandler(Handler):
         u'firefox_12_0',
     ]
 
-    def can_handle(self, ua):
-        if Utils.is_mobile_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_mobile_browser(ua, context):
             return False
         if Utils.check_if_contains_any_of(ua, [u'Tablet', u'Sony', u'Novarra', u'Opera']):
             return False
@@ -819,7 +1208,7 @@ class FirefoxHandler(Handler):
         return self.get_device_id_from_ris(ua, Utils.index_of_or_length(ua, u'.'))
 
     def apply_recovery_match(self, ua):
-        matches = re.search(r'Firefox\/(\d+)\.\d', ua)
+        matches = patterns.FIREFOX_VERSION.search(ua)
         if matches is not None:
             firefox_version = matches.group(1)
             if int(firefox_version) <= 3:
@@ -835,8 +1224,10 @@ class GrundigHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_GrundigHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_prefixes = [u'grundig']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_starts_with_any_of(ua, [u'Grundig', u'GRUNDIG'])
 
@@ -845,8 +1236,10 @@ class HTCHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_HTCHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_keywords = [u'htc', u'xv6875']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_contains_any_of(ua, [u'HTC', u'XV6875'])
 
@@ -855,11 +1248,13 @@ class HTCMacHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_HTCMacHandler'.
     '''
+    dispatch_keywords = [u'htc']
+
     constant_ids = [
         u'generic_android_htc_disguised_as_mac',
     ]
 
-    def can_handle(self, ua):
+    def can_handle(self, ua, context):
         return \
             Utils.check_if_starts_with(ua, u'Mozilla/5.0 (Macintosh') and \
             Utils.check_if_contains(ua, u'HTC')
@@ -876,9 +1271,9 @@ class HTCMacHandler(Handler):
 
     @classmethod
     def get_htcmac_model(cls, ua):
-        matches = re.search(r'(HTC[^;\)]+)', ua)
+        matches = patterns.HTCMAC_MODEL.search(ua)
         if matches is not None:
-            model = re.sub(r'[ _\-/]', r'~', matches.group(1))
+            model = patterns.HTCMAC_MODEL_SEPARATOR.sub(r'~', matches.group(1))
             return model
         return None
 
@@ -887,11 +1282,13 @@ class JavaMidletHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_JavaMidletHandler'.
     '''
+    dispatch_keywords = [u'untrusted/1.0']
+
     constant_ids = [
         u'generic_midp_midlet',
     ]
 
-    def can_handle(self, ua):
+    def can_handle(self, ua, context):
         return Utils.check_if_contains(ua, u'UNTRUSTED/1.0')
 
     def apply_conclusive_match(self, ua):
@@ -902,12 +1299,14 @@ class KDDIHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_KDDIHandler'.
     '''
+    dispatch_keywords = [u'kddi-']
+
     constant_ids = [
         u'opwv_v62_generic',
     ]
 
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_contains(ua, u'KDDI-')
 
@@ -926,6 +1325,8 @@ class KindleHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_KindleHandler'.
     '''
+    dispatch_keywords = [u'kindle', u'silk']
+
     constant_ids = [
         u'amazon_kindle_ver1',
         u'amazon_kindle2_ver1',
@@ -935,7 +1336,7 @@ class KindleHandler(Handler):
         u'generic_amazon_kindle',
     ]
 
-    def can_handle(self, ua):
+    def can_handle(self, ua, context):
         return Utils.check_if_contains_any_of(ua, [u'Kindle', u'Silk'])
 
     def apply_conclusive_match(self, ua):
@@ -973,8 +1374,10 @@ class KonquerorHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_KonquerorHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_mobile_browser(ua):
+    dispatch_keywords = [u'konqueror']
+
+    def can_handle(self, ua, context):
+        if Utils.is_mobile_browser(ua, context):
             return False
         return Utils.check_if_contains(ua, u'Konqueror')
 
@@ -983,8 +1386,10 @@ class KyoceraHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_KyoceraHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_prefixes = [u'kyocera', u'qc-', u'kwc-']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_starts_with_any_of(ua, [u'kyocera', u'QC-', u'KWC-'])
 
@@ -993,8 +1398,10 @@ class LGHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_LGHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_prefixes = [u'lg']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_starts_with_any_of(ua, [u'lg', u'LG'])
 
@@ -1010,6 +1417,8 @@ class LGUPLUSHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_LGUPLUSHandler'.
     '''
+    dispatch_keywords = [u'lguplus', u'lgtelecom']
+
     constant_ids = [
         u'generic_lguplus_rexos_facebook_browser',
         u'generic_lguplus_rexos_webviewer_browser',
@@ -1035,8 +1444,8 @@ class LGUPLUSHandler(Handler):
         ]),
     ])
 
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_contains_any_of(ua, [u'LGUPLUS', u'lgtelecom'])
 
@@ -1054,6 +1463,8 @@ class MSIEHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_MSIEHandler'.
     '''
+    dispatch_keywords = [u'msie']
+
     constant_ids = [
         u'msie',
         u'msie_4',
@@ -1065,8 +1476,8 @@ class MSIEHandler(Handler):
         u'msie_9',
     ]
 
-    def can_handle(self, ua):
-        if Utils.is_mobile_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_mobile_browser(ua, context):
             return False
         if Utils.check_if_contains_any_of(ua, [u'Opera', u'armv', u'MOTO', u'BREW']):
             return False
@@ -1075,7 +1486,7 @@ class MSIEHandler(Handler):
             Utils.check_if_contains(ua, u'MSIE')
 
     def apply_conclusive_match(self, ua):
-        matches = re.search(r'^Mozilla\/4\.0 \(compatible; MSIE (\d)\.(\d);', ua)
+        matches = patterns.MSIE_VERSION.search(ua)
         if matches is not None:
             value = int(matches.group(1))
             # Cases are intentionally out of sequence for performance.
@@ -1101,8 +1512,10 @@ class MitsubishiHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_MitsubishiHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_prefixes = [u'mitsu']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_starts_with(ua, u'Mitsu')
 
@@ -1115,12 +1528,17 @@ class MotorolaHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_MotorolaHandler'.
     '''
+    dispatch_keywords = [u'motorola']
+    dispatch_prefixes = [u'mot-', u'moto']
+
+    USES_LD_MATCHER = True
+
     constant_ids = [
         u'mot_mib22_generic',
     ]
 
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return \
             Utils.check_if_starts_with_any_of(ua, [u'Mot-', u'MOT-', u'MOTO', u'moto']) or \
@@ -1141,10 +1559,14 @@ class NecHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_NecHandler'.
     '''
+    dispatch_prefixes = [u'nec-', u'kgt']
+
+    USES_LD_MATCHER = True
+
     NEC_KGT_TOLERANCE = 2
 
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_starts_with_any_of(ua, [u'NEC-', u'KGT'])
 
@@ -1159,14 +1581,18 @@ class NintendoHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_NintendoHandler'.
     '''
+    dispatch_keywords = [u'nintendo', u'nitro']
+
+    USES_LD_MATCHER = True
+
     constant_ids = [
         u'nintendo_wii_ver1',
         u'nintendo_dsi_ver1',
         u'nintendo_ds_ver1',
     ]
 
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         if Utils.check_if_contains(ua, u'Nintendo'):
             return True
@@ -1191,14 +1617,16 @@ class NokiaHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_NokiaHandler'.
     '''
+    dispatch_keywords = [u'nokia']
+
     constant_ids = [
         u'nokia_generic_series60',
         u'nokia_generic_series80',
         u'nokia_generic_meego',
     ]
 
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_contains(ua, u'Nokia')
 
@@ -1220,12 +1648,14 @@ class NokiaOviBrowserHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_NokiaOviBrowserHandler'.
     '''
+    dispatch_keywords = [u's40ovibrowser']
+
     constant_ids = [
         u'nokia_generic_series40_ovibrosr',
     ]
 
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_contains(ua, u'S40OviBrowser')
 
@@ -1244,6 +1674,8 @@ class OperaHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_OperaHandler'.
     '''
+    dispatch_keywords = [u'opera']
+
     constant_ids = [
         u'opera',
         u'opera_7',
@@ -1254,8 +1686,8 @@ class OperaHandler(Handler):
         u'opera_12',
     ]
 
-    def can_handle(self, ua):
-        if Utils.is_mobile_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_mobile_browser(ua, context):
             return False
         return Utils.check_if_contains(ua, u'Opera')
 
@@ -1276,7 +1708,7 @@ class OperaHandler(Handler):
 
     @classmethod
     def get_opera_version(cls, ua):
-        matches = re.search(r'Opera[ /]?(\d+\.\d+)', ua)
+        matches = patterns.OPERA_VERSION.search(ua)
         if matches is not None:
             return matches.group(1)
         return None
@@ -1286,6 +1718,8 @@ class OperaMiniHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_OperaMiniHandler'.
     '''
+    dispatch_keywords = [u'opera mini']
+
     _opera_minis = OrderedDict([
         (u'Opera Mini/1', u'generic_opera_mini_version1'),
         (u'Opera Mini/2', u'generic_opera_mini_version2'),
@@ -1294,7 +1728,7 @@ class OperaMiniHandler(Handler):
         (u'Opera Mini/5', u'generic_opera_mini_version5'),
     ])
 
-    def can_handle(self, ua):
+    def can_handle(self, ua, context):
         return Utils.check_if_contains(ua, u'Opera Mini')
 
     def apply_recovery_match(self, ua):
@@ -1310,8 +1744,10 @@ class PanasonicHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_PanasonicHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_prefixes = [u'panasonic']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_starts_with(ua, u'Panasonic')
 
@@ -1320,10 +1756,12 @@ class PantechHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_PantechHandler'.
     '''
+    dispatch_prefixes = [u'pantech', u'pt-', u'pg-']
+
     PANTECH_TOLERANCE = 5
 
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_starts_with_any_of(ua, [u'Pantech', u'PT-', u'PANTECH', u'PG-'])
 
@@ -1339,8 +1777,10 @@ class PhilipsHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_PhilipsHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_prefixes = [u'philips']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return \
             Utils.check_if_starts_with(ua, u'Philips') or \
@@ -1351,8 +1791,10 @@ class PortalmmmHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_PortalmmmHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_prefixes = [u'portalmmm']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_starts_with(ua, u'portalmmm')
 
@@ -1364,8 +1806,10 @@ class QtekHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_QtekHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_prefixes = [u'qtek']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_starts_with(ua, u'Qtek')
 
@@ -1374,12 +1818,14 @@ class ReksioHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_ReksioHandler'.
     '''
+    dispatch_prefixes = [u'reksio']
+
     constant_ids = [
         'generic_reksio',
     ]
 
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_starts_with(ua, 'Reksio')
 
@@ -1391,8 +1837,10 @@ class SPVHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_SPVHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_keywords = [u'spv']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_contains(ua, u'SPV')
 
@@ -1405,8 +1853,10 @@ class SafariHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_SafariHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_mobile_browser(ua):
+    dispatch_keywords = [u'safari']
+
+    def can_handle(self, ua, context):
+        if Utils.is_mobile_browser(ua, context):
             return False
         return \
             Utils.check_if_starts_with(ua, u'Mozilla') and \
@@ -1417,8 +1867,10 @@ class SagemHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_SagemHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_prefixes = [u'sagem']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_starts_with_any_of(ua, [u'Sagem', u'SAGEM'])
 
@@ -1427,8 +1879,13 @@ class SamsungHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_SamsungHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_keywords = [u'samsung']
+    dispatch_prefixes = [u'sec-', u'sph', u'sgh', u'sch']
+
+    USES_LD_MATCHER = True
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return \
             Utils.check_if_contains_any_of(ua, [u'Samsung', u'SAMSUNG']) or \
@@ -1457,8 +1914,11 @@ class SanyoHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_SanyoHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_keywords = [u'mobilephone']
+    dispatch_prefixes = [u'sanyo']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return \
             Utils.check_if_starts_with_any_of(ua, [u'Sanyo', u'SANYO']) or \
@@ -1477,8 +1937,10 @@ class SharpHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_SharpHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_prefixes = [u'sharp']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_starts_with_any_of(ua, [u'Sharp', u'SHARP'])
 
@@ -1487,8 +1949,10 @@ class SiemensHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_SiemensHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_prefixes = [u'sie-']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_starts_with(ua, u'SIE-')
 
@@ -1504,8 +1968,12 @@ class SmartTVHandler(Handler):
         u'generic_smarttv_boxeebox_browser',
     ]
 
-    def can_handle(self, ua):
-        return Utils.is_smart_tv(ua)
+    @property
+    def dispatch_keywords(self):
+        return Utils._smart_tv_browsers
+
+    def can_handle(self, ua, context):
+        return Utils.is_smart_tv(ua, context)
 
     def apply_conclusive_match(self, ua):
         tolerance = len(ua)
@@ -1527,8 +1995,10 @@ class SonyEricssonHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_SonyEricssonHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_keywords = [u'sony']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_contains(ua, u'Sony')
 
@@ -1544,8 +2014,10 @@ class ToshibaHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_ToshibaHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_prefixes = [u'toshiba']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_starts_with(ua, u'Toshiba')
 
@@ -1554,8 +2026,10 @@ class VodafoneHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_VodafoneHandler'.
     '''
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    dispatch_prefixes = [u'vodafone']
+
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_starts_with(ua, u'Vodafone')
 
@@ -1568,13 +2042,15 @@ class WebOSHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_WebOSHandler'.
     '''
+    dispatch_keywords = [u'webos', u'hpwos']
+
     constant_ids = [
         u'hp_tablet_webos_generic',
         u'hp_webos_generic',
     ]
 
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_contains_any_of(ua, [u'webOS', u'hpwOS'])
 
@@ -1594,7 +2070,7 @@ class WebOSHandler(Handler):
         #   Mozilla/5.0 (hp-tablet; Linux; hpwOS/3.0.5; U; es-US) AppleWebKit/534.6 (KHTML, like Gecko) wOSBrowser/234.83 Safari/534.6 TouchPad/1.0
         #   Mozilla/5.0 (Linux; webOS/2.2.4; U; de-DE) AppleWebKit/534.6 (KHTML, like Gecko) webOSBrowser/221.56 Safari/534.6 Pre/3.0
         #   Mozilla/5.0 (webOS/1.4.0; U; en-US) AppleWebKit/532.2 (KHTML, like Gecko) Version/1.0 Safari/532.2 Pre/1.0
-        matches = re.search(r' ([^/]+)/([\d\.]+)$', ua)
+        matches = patterns.WEBOS_MODEL_VERSION.search(ua)
         if matches is not None:
             return matches.group(1) + ' ' + matches.group(2)
         else:
@@ -1602,7 +2078,7 @@ class WebOSHandler(Handler):
 
     @classmethod
     def get_webos_version(cls, ua):
-        matches = re.search(r'(?:hpw|web)OS.(\d)\.', ua)
+        matches = patterns.WEBOS_VERSION.search(ua)
         if matches is not None:
             return u'webOS' + matches.group(1)
         else:
@@ -1613,12 +2089,14 @@ class WindowsPhoneDesktopHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_WindowsPhoneDesktopHandler'.
     '''
+    dispatch_keywords = [u'zunewp7']
+
     constant_ids = [
         u'generic_ms_phone_os7_desktopmode',
         u'generic_ms_phone_os7_5_desktopmode',
     ]
 
-    def can_handle(self, ua):
+    def can_handle(self, ua, context):
         return Utils.check_if_contains(ua, u'ZuneWP7')
 
     def apply_conclusive_match(self, ua):
@@ -1635,14 +2113,16 @@ class WindowsPhoneHandler(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_WindowsPhoneHandler'.
     '''
+    dispatch_keywords = [u'windows phone']
+
     constant_ids = [
         u'generic_ms_winmo6_5',
         u'generic_ms_phone_os7',
         u'generic_ms_phone_os7_5',
     ]
 
-    def can_handle(self, ua):
-        if Utils.is_desktop_browser(ua):
+    def can_handle(self, ua, context):
+        if Utils.is_desktop_browser(ua, context):
             return False
         return Utils.check_if_contains(ua, u'Windows Phone')
 
@@ -1664,6 +2144,9 @@ class Utils(Handler):
     '''
     @see WURFL PHP 'WURFL_Handlers_Utils'.
     '''
+    # Matcher used by ld_match() (see 'wurfl_python.set_ld_matcher()').
+    LD_MATCHER = LDMatcher
+
     _mobile_browsers = [
         u'midp',
         u'mobile',
@@ -1790,7 +2273,11 @@ class Utils(Handler):
 
     @classmethod
     def ld_match(cls, collection, needle, tolerance=7):
-        return LDMatcher.INSTANCE().match(collection, needle, tolerance)
+        return cls.LD_MATCHER.INSTANCE().match(collection, needle, tolerance)
+
+    @classmethod
+    def ld_prepare(cls, index):
+        cls.LD_MATCHER.INSTANCE().prepare(index)
 
     @classmethod
     def index_of_or_length(cls, string, target, starting_index=0):
@@ -1809,34 +2296,12 @@ class Utils(Handler):
         return positions[0] if len(positions) > 0 else len(ua)
 
     @classmethod
-    def reset(cls):
-        cls._is_desktop_browser = None
-        cls._is_mobile_browser = None
-        cls._is_smart_tv = None
-
-    @classmethod
-    def is_mobile_browser(cls, ua):
-        if cls._is_mobile_browser is not None:
-            return cls._is_mobile_browser
-        cls._is_mobile_browser = False
-        ua = ua.lower()
-        for key in cls._mobile_browsers:
-            if ua.find(key) != -1:
-                cls._is_mobile_browser = True
-                break
-        return cls._is_mobile_browser
+    def is_mobile_browser(cls, ua, context=None):
+        return cls._check_flag(ua, context, 'mobile_browser', cls._mobile_browsers)
 
     @classmethod
-    def is_desktop_browser(cls, ua):
-        if cls._is_desktop_browser is not None:
-            return cls._is_desktop_browser
-        cls._is_desktop_browser = False
-        ua = ua.lower()
-        for key in cls._desktop_browsers:
-            if ua.find(key) != -1:
-                cls._is_desktop_browser = True
-                break
-        return cls._is_desktop_browser
+    def is_desktop_browser(cls, ua, context=None):
+        return cls._check_flag(ua, context, 'desktop_browser', cls._desktop_browsers)
 
     @classmethod
     def get_mobile_catch_all_id(cls, ua):
@@ -1846,9 +2311,9 @@ class Utils(Handler):
         return constants.NO_MATCH
 
     @classmethod
-    def is_desktop_browser_heavy_duty_analysis(cls, ua):
+    def is_desktop_browser_heavy_duty_analysis(cls, ua, context=None):
         # Check Smart TV keywords.
-        if Utils.is_smart_tv(ua):
+        if Utils.is_smart_tv(ua, context):
             return False
 
         # Chrome.
@@ -1856,7 +2321,7 @@ class Utils(Handler):
             return True
 
         # Check mobile keywords.
-        if Utils.is_mobile_browser(ua):
+        if Utils.is_mobile_browser(ua, context):
             return False
 
         if Utils.check_if_contains(ua, u'PPC'):
@@ -1867,7 +2332,7 @@ class Utils(Handler):
             return True
 
         # Safari.
-        matches = re.search(r'^Mozilla/5\.0 \((?:Macintosh|Windows)[^\)]+\) AppleWebKit/[\d\.]+ \(KHTML, like Gecko\) Version/[\d\.]+ Safari/[\d\.]+$', ua)
+        matches = patterns.DESKTOP_SAFARI.search(ua)
         if matches is not None:
             return True
 
@@ -1876,32 +2341,48 @@ class Utils(Handler):
             return True
 
         # Check desktop keywords.
-        if Utils.is_desktop_browser(ua):
+        if Utils.is_desktop_browser(ua, context):
             return True
 
         # Internet Explorer 9.
-        matches = re.search(r'^Mozilla\/5\.0 \(compatible; MSIE 9\.0; Windows NT \d\.\d', ua)
+        matches = patterns.DESKTOP_MSIE9.search(ua)
         if matches is not None:
             return True
 
         # Internet Explorer <9.
-        matches = re.search(r'^Mozilla\/4\.0 \(compatible; MSIE \d\.\d; Windows NT \d\.\d', ua)
+        matches = patterns.DESKTOP_MSIE.search(ua)
         if matches is not None:
             return True
 
         return False
 
     @classmethod
-    def is_smart_tv(cls, ua):
-        if cls._is_smart_tv is not None:
-            return cls._is_smart_tv
-        cls._is_smart_tv = False
-        ua = ua.lower()
-        for key in cls._smart_tv_browsers:
-            if ua.find(key) != -1:
-                cls._is_smart_tv = True
+    def is_smart_tv(cls, ua, context=None):
+        return cls._check_flag(ua, context, 'smart_tv', cls._smart_tv_browsers)
+
+    @classmethod
+    def _check_flag(cls, ua, context, name, keywords):
+        '''
+        Looks for any of the given lower cased keywords in the ua. When a
+        match context is provided the result is memoized there, so every
+        flag is computed just once per call, on the first ua (original or
+        normalized) it is requested for.
+        '''
+        if context is not None:
+            result = getattr(context, name)
+            if result is not None:
+                return result
+            lower_ua = context.lower_ua if ua is context.ua else ua.lower()
+        else:
+            lower_ua = ua.lower()
+        result = False
+        for key in keywords:
+            if lower_ua.find(key) != -1:
+                result = True
                 break
-        return cls._is_smart_tv
+        if context is not None:
+            setattr(context, name, result)
+        return result
 
     @classmethod
     def ordinal_index_of(cls, haystack, needle, ordinal):
@@ -1970,4 +2451,4 @@ class Utils(Handler):
 
     @classmethod
     def remove_locale(cls, ua):
-        return re.sub(r'; ?[a-z]{2}(?:-[a-zA-Z]{2})?(?:\.utf8|\.big5)?\b-?', r'; xx-xx', ua)
+        return patterns.LOCALE.sub(r'; xx-xx', ua)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import threading
+from bisect import bisect_left
+
+
+class Bucket(object):
+    '''
+    Compact replacement for the dictionary of normalized uas to device ids
+    of a handler (plus its sorted list of keys). Uas are kept in a sorted
+    list and device ids in a parallel list, both referencing the strings
+    already held by the devices whenever possible. Exact lookups bisect
+    the sorted list, which is directly usable by the RIS and LD matchers.
+
+    Uas are appended unsorted on registration and merged into the sorted
+    lists on first lookup. The most recently set device id of a ua wins,
+    as with a dictionary. Merged lists are published at once, so lookups
+    are safe while other threads are matching.
+    '''
+    def __init__(self):
+        self._pending_uas = []
+        self._pending_device_ids = []
+        self._sorted = ([], [])
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_sorted(cls, uas, device_ids):
+        '''
+        Returns a bucket holding the given sorted, unique uas and their
+        device ids.
+        '''
+        bucket = cls()
+        bucket._sorted = (uas, device_ids)
+        return bucket
+
+    @property
+    def uas(self):
+        '''
+        Sorted list of uas. Must not be modified.
+        '''
+        return self._get_sorted()[0]
+
+    @property
+    def device_ids(self):
+        '''
+        Device ids of the sorted uas. Must not be modified.
+        '''
+        return self._get_sorted()[1]
+
+    def set(self, ua, device_id):
+        with self._lock:
+            self._pending_uas.append(ua)
+            self._pending_device_ids.append(device_id)
+
+    def set_many(self, uas, device_ids):
+        with self._lock:
+            self._pending_uas.extend(uas)
+            self._pending_device_ids.extend(device_ids)
+
+    def get(self, ua, default=None):
+        uas, device_ids = self._get_sorted()
+        index = bisect_left(uas, ua)
+        if index < len(uas) and uas[index] == ua:
+            return device_ids[index]
+        return default
+
+    def __getitem__(self, ua):
+        device_id = self.get(ua)
+        if device_id is None:
+            raise KeyError(ua)
+        return device_id
+
+    def __contains__(self, ua):
+        return self.get(ua) is not None
+
+    def __len__(self):
+        return len(self.uas)
+
+    def _get_sorted(self):
+        if self._pending_uas:
+            with self._lock:
+                if self._pending_uas:
+                    self._sorted = self._merge()
+                    self._pending_uas = []
+                    self._pending_device_ids = []
+        return self._sorted
+
+    def _merge(self):
+        uas, device_ids = self._sorted
+        uas = uas + self._pending_uas
+        device_ids = device_ids + self._pending_device_ids
+        # Stable sort, so for duplicated uas the last one set is the last
+        # one of its run.
+        positions = sorted(xrange(len(uas)), key=uas.__getitem__)
+        merged_uas = []
+        merged_device_ids = []
+        for index, position in enumerate(positions):
+            if index + 1 < len(positions) and uas[positions[index + 1]] == uas[position]:
+                continue
+            merged_uas.append(uas[position])
+            merged_device_ids.append(device_ids[position])
+        return merged_uas, merged_device_ids
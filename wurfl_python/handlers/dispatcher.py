@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+"""
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+from collections import deque
+
+
+class KeywordDispatcher(object):
+    '''
+    Compiled replacement for the linear can_handle() walk over a chain of
+    handlers. Every handler declares, through its 'dispatch_keywords' and
+    'dispatch_prefixes' attributes, lower cased keywords at least one of
+    which must be contained in (or, for prefixes, start) the user agent for
+    its can_handle() to return True. All keywords are compiled into a single
+    Aho-Corasick automaton and all prefixes into a trie, so a user agent is
+    scanned only once and only the handlers whose keywords were found (plus
+    those not declaring any keyword) are consulted, always in chain order.
+
+    Desktop, mobile and Smart TV keywords are compiled into the same
+    automaton. Those flags are memoized in the match context on first use,
+    so before yielding a handler the flags that the linear walk would have
+    computed while rejecting the skipped handlers are seeded from the scan.
+    That keeps results identical to the linear walk.
+    '''
+    _FLAGS = (
+        ('desktop_browser', '_desktop_browsers'),
+        ('mobile_browser', '_mobile_browsers'),
+        ('smart_tv', '_smart_tv_browsers'),
+    )
+
+    def __init__(self, handlers, utils, context_class):
+        self._handlers = list(handlers)
+        self._context_class = context_class
+        self._always = 0
+        keywords = {}
+        prefixes = {}
+        for index, handler in enumerate(self._handlers):
+            bit = 1 << index
+            if handler.dispatch_keywords is None and handler.dispatch_prefixes is None:
+                self._always |= bit
+                continue
+            for keyword in handler.dispatch_keywords or ():
+                keywords[keyword] = keywords.get(keyword, 0) | bit
+            for prefix in handler.dispatch_prefixes or ():
+                prefixes[prefix] = prefixes.get(prefix, 0) | bit
+
+        # Flags are tracked using the bits above the handler ones.
+        self._handlers_mask = (1 << len(self._handlers)) - 1
+        self._flag_bits = []
+        for offset, (attribute, keywords_attribute) in enumerate(self._FLAGS):
+            bit = 1 << (len(self._handlers) + offset)
+            self._flag_bits.append((attribute, bit))
+            for keyword in getattr(utils, keywords_attribute):
+                keywords[keyword] = keywords.get(keyword, 0) | bit
+
+        self._goto, self._output = self._build_automaton(keywords)
+        self._prefix_goto, self._prefix_output = self._build_trie(prefixes)
+        self._flags_before = self._probe_flags()
+
+    def candidates(self, ua, context):
+        '''
+        Yields, in chain order, the handlers that may be able to handle the
+        given ua. Context flags are seeded before yielding each handler.
+        '''
+        mask = self._always | self._scan(context.lower_ua)
+        if ua and max(ua) > u'\x7f':
+            # Case insensitive checks in handlers rely on upper(), which is
+            # not consistent with lower() for a few non ASCII characters.
+            mask |= self._handlers_mask
+        handlers = mask & self._handlers_mask
+        while handlers:
+            lowest = handlers & -handlers
+            index = lowest.bit_length() - 1
+            for attribute, bit in self._flags_before[index]:
+                if getattr(context, attribute) is None:
+                    setattr(context, attribute, (mask & bit) != 0)
+            yield self._handlers[index]
+            handlers ^= lowest
+
+    def _scan(self, lower_ua):
+        mask = 0
+
+        # Prefixes.
+        state = 0
+        goto = self._prefix_goto
+        output = self._prefix_output
+        for char in lower_ua:
+            state = goto[state].get(char)
+            if state is None:
+                break
+            mask |= output[state]
+
+        # Keywords.
+        state = 0
+        goto = self._goto
+        output = self._output
+        for char in lower_ua:
+            state = goto[state].get(char, 0)
+            mask |= output[state]
+
+        return mask
+
+    def _probe_flags(self):
+        '''
+        Finds out which flags the can_handle() of every handler computes
+        unconditionally and returns, for every position in the chain, the
+        flags computed while walking all previous handlers.
+        '''
+        result = []
+        computed = []
+        for handler in self._handlers:
+            result.append(tuple(computed))
+            context = self._context_class(u'')
+            handler.can_handle(u'', context)
+            for attribute, bit in self._flag_bits:
+                if getattr(context, attribute) is not None and \
+                   (attribute, bit) not in computed:
+                    computed.append((attribute, bit))
+        return result
+
+    def _build_trie(self, words):
+        goto = [{}]
+        output = [0]
+        for word, bits in words.iteritems():
+            state = 0
+            for char in word:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto.append({})
+                    output.append(0)
+                    goto[state][char] = next_state
+                state = next_state
+            output[state] |= bits
+        return goto, output
+
+    def _build_automaton(self, words):
+        goto, output = self._build_trie(words)
+
+        # Compute failure links breadth first and turn the trie into a
+        # deterministic automaton, so scanning needs a single dictionary
+        # lookup per character. Missing transitions go back to the root.
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].itervalues())
+        while queue:
+            state = queue.popleft()
+            output[state] |= output[fail[state]]
+            delta[state] = dict(delta[fail[state]])
+            for char, next_state in goto[state].iteritems():
+                fail[next_state] = delta[fail[state]].get(char, 0)
+                delta[state][char] = next_state
+                queue.append(next_state)
+        return delta, output
@@ -6,9 +6,104 @@
 """
 
 from __future__ import absolute_import
+from array import array
+from bisect import bisect_left, bisect_right
+from weakref import WeakKeyDictionary
 from wurfl_python.handlers import matchers
 import Levenshtein
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class LDIndex(object):
+    '''
+    Candidate index over a sorted collection of uas for 'LDMatcher'.
+
+    Uas are kept sorted by length, so only those whose length is within the
+    tolerance are considered, and an inverted index links every q-gram to
+    the positions of the uas containing it. Every edit operation breaks at
+    most one of a set of non overlapping q-grams of the needle, so any ua
+    within distance k of it contains at least one of any k + 1 of them.
+    The rarest ones are chosen and only the uas containing them are
+    candidates. Candidates are returned in collection order, so ties are
+    broken exactly as when scanning the whole collection.
+    '''
+    GRAM_LENGTH = 3
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._lengths = array('i', [len(ua) for ua in collection])
+        self._by_length = array('i', sorted(xrange(len(collection)), key=self._lengths.__getitem__))
+        self._sorted_lengths = [self._lengths[position] for position in self._by_length]
+        q = self.GRAM_LENGTH
+        grams = {}
+        for position, ua in enumerate(collection):
+            for gram in set(ua[i:i + q] for i in xrange(len(ua) - q + 1)):
+                postings = grams.get(gram)
+                if postings is None:
+                    postings = grams[gram] = array('i')
+                postings.append(position)
+        self._grams = grams
+
+    def candidates(self, needle, tolerance):
+        '''
+        Returns, in collection order, a subset of the uas of the collection
+        including all those within the given edit distance of the needle.
+        '''
+        collection = self.collection
+        return [collection[position] for position in self.positions(needle, tolerance)]
+
+    def positions(self, needle, tolerance):
+        '''
+        Same as candidates(), but returns sorted positions in the collection.
+        '''
+        if tolerance is None or tolerance < 0:
+            return []
+        length = len(needle)
+        low = bisect_left(self._sorted_lengths, length - tolerance)
+        high = bisect_right(self._sorted_lengths, length + tolerance)
+        positions = self._filter(needle, tolerance, high - low)
+        if positions is None:
+            positions = sorted(self._by_length[low:high])
+        else:
+            lengths = self._lengths
+            positions = sorted(
+                position for position in positions
+                if abs(lengths[position] - length) <= tolerance)
+        return positions
+
+    def _filter(self, needle, tolerance, limit):
+        # Greedily choose tolerance + 1 non overlapping q-grams of the needle
+        # with the shortest posting lists. Returns None if not possible or
+        # if they would not filter better than the length window.
+        q = self.GRAM_LENGTH
+        grams = self._grams
+        empty = ()
+        options = sorted(
+            (len(grams.get(needle[i:i + q], empty)), i)
+            for i in xrange(len(needle) - q + 1))
+        covered = bytearray(len(needle))
+        chosen = []
+        total = 0
+        for size, i in options:
+            if len(chosen) > tolerance:
+                break
+            if not any(covered[i:i + q]):
+                if total + size >= limit:
+                    return None
+                covered[i:i + q] = b'\x01' * q
+                chosen.append(needle[i:i + q])
+                total += size
+        if len(chosen) <= tolerance:
+            return None
+        positions = set()
+        for gram in chosen:
+            positions.update(grams.get(gram, empty))
+        return positions
+
 
 class LDMatcher(matchers.Interface):
     '''
@@ -26,6 +121,11 @@ class LDMatcher(matchers.Interface):
         return cls()
 
     def match(self, collection, needle, tolerance):
+        '''
+        The collection may be a sorted list of uas or an 'LDIndex' over it.
+        '''
+        if isinstance(collection, LDIndex):
+            collection = collection.candidates(needle, tolerance)
         best = tolerance
         match = u''
         for ua in collection:
@@ -35,3 +135,160 @@ class LDMatcher(matchers.Interface):
                     best = current - 1
                     match = ua
         return match
+
+    def prepare(self, index):
+        '''
+        Computes whatever the matcher computes for the given 'LDIndex' on
+        first match, if anything.
+        '''
+        pass
+
+
+class NumPyLDMatcher(LDMatcher):
+    '''
+    Drop-in replacement for 'LDMatcher' computing the bounded edit distances
+    between the needle and a whole block of candidates at once. Candidates
+    are encoded as arrays of code points and a banded dynamic programming
+    matrix (only cells within the tolerance of the diagonal) is filled one
+    needle character at a time for all of them, using NumPy. Candidates
+    whose whole row exceeds the tolerance are abandoned. Requires NumPy
+    (see 'wurfl_python.set_ld_matcher()').
+    '''
+    _instance = None
+
+    # Candidates whose distances are computed at once (see 'match()').
+    BLOCK_SIZE = 256
+
+    # Abandoned candidates are dropped from the block once they are at
+    # least this fraction of it.
+    COMPACTION_RATIO = 0.5
+
+    # Code points of the uas of every index, computed on first use.
+    _encoded = WeakKeyDictionary()
+
+    def __new__(cls, *args, **kwargs):
+        if numpy is None:
+            raise ImportError('NumPyLDMatcher requires NumPy')
+        return super(NumPyLDMatcher, cls).__new__(cls, *args, **kwargs)
+
+    def match(self, collection, needle, tolerance):
+        if tolerance is None or tolerance < 0:
+            return u''
+        if isinstance(collection, LDIndex):
+            positions = collection.positions(needle, tolerance)
+            codes = self._get_codes(collection)
+            uas = collection.collection
+        else:
+            uas = [ua for ua in collection if abs(len(needle) - len(ua)) <= tolerance]
+            positions = range(len(uas))
+            codes = self._encode(uas)
+        if not positions:
+            return u''
+
+        # Blocks of candidates, in collection order. Once a candidate is
+        # found, the following ones only win with a lower distance, so the
+        # bound of the next blocks is lowered: fewer candidates are within
+        # its length window, the band is narrower and candidates are
+        # abandoned sooner.
+        lengths = codes[1]
+        positions = numpy.asarray(positions)
+        length = len(needle)
+        bound = tolerance
+        match = u''
+        for start in xrange(0, len(positions), self.BLOCK_SIZE):
+            block = positions[start:start + self.BLOCK_SIZE]
+            block = block[numpy.abs(lengths[block] - length) <= bound]
+            if not len(block):
+                continue
+            distances = self.distances(codes, block, needle, bound)
+            # First candidate (i.e. in collection order) with the minimum
+            # distance.
+            best = int(distances.argmin())
+            if distances[best] <= bound:
+                match = uas[block[best]]
+                bound = int(distances[best]) - 1
+                if bound < 0:
+                    break
+        return match
+
+    def distances(self, codes, positions, needle, tolerance):
+        '''
+        Returns the edit distances between the needle and the uas at the
+        given positions of the encoded collection, or tolerance + 1 for those
+        exceeding the tolerance. Lengths of the uas must be within the
+        tolerance of the needle length.
+        '''
+        k = tolerance
+        limit = k + 1
+        n = len(needle)
+        width = 2 * k + 1
+        matrix, lengths = codes
+        positions = numpy.asarray(positions)
+        result = numpy.empty(len(positions), dtype=numpy.int16)
+        result.fill(limit)
+
+        # Character j - 1 of the candidates is stored in column j + k, so
+        # cells j = i - k ... i + k of row i use columns i ... i + 2k.
+        columns = min(matrix.shape[1], n + k)
+        block = numpy.empty((len(positions), n + 2 * k + 1), dtype=matrix.dtype)
+        block.fill(-1)
+        block[:, k + 1:k + 1 + columns] = matrix[positions, :columns]
+        active = numpy.arange(len(positions))
+        needle = [ord(char) for char in needle]
+
+        # Band index d (0 ... 2k) of row i holds the cell j = i + d - k.
+        offsets = numpy.arange(width, dtype=numpy.int16)
+        row = numpy.minimum(offsets - k, limit).astype(numpy.int16)
+        row[:k] = limit
+        row = numpy.tile(row, (len(positions), 1))
+        shifted = numpy.empty_like(row)
+        for i in xrange(1, n + 1):
+            # Substitution (or match) and deletion.
+            cost = block[:, i:i + width] != needle[i - 1]
+            shifted[:, :-1] = row[:, 1:]
+            shifted[:, -1] = limit
+            row += cost
+            numpy.minimum(row, shifted + 1, row)
+            if i <= k:
+                row[:, :k - i] = limit
+                row[:, k - i] = i
+            # Insertion: row[d] = min(row[e] + d - e) for e <= d.
+            row -= offsets
+            numpy.minimum.accumulate(row, axis=1, out=row)
+            row += offsets
+            numpy.minimum(row, limit, row)
+
+            alive = row.min(axis=1) < limit
+            if not alive.all():
+                if not alive.any():
+                    return result
+                if alive.sum() <= len(active) * self.COMPACTION_RATIO:
+                    active = active[alive]
+                    block = block[alive]
+                    row = row[alive]
+                    shifted = numpy.empty_like(row)
+
+        ends = lengths[positions[active]] - n + k
+        result[active] = row[numpy.arange(len(active)), ends]
+        return result
+
+    def prepare(self, index):
+        self._get_codes(index)
+
+    def _get_codes(self, index):
+        codes = self._encoded.get(index)
+        if codes is None:
+            codes = self._encoded[index] = self._encode(index.collection)
+        return codes
+
+    def _encode(self, uas):
+        '''
+        Returns a matrix with the code points of the given uas, padded with
+        -1, and an array with their lengths.
+        '''
+        lengths = numpy.array([len(ua) for ua in uas], dtype=numpy.int32)
+        matrix = numpy.empty((len(uas), lengths.max() if len(uas) else 0), dtype=numpy.int32)
+        matrix.fill(-1)
+        for position, ua in enumerate(uas):
+            matrix[position, :len(ua)] = [ord(char) for char in ua]
+        return matrix, lengths
@@ -6,6 +6,7 @@
 """
 
 from __future__ import absolute_import
+from bisect import bisect_left
 from wurfl_python.handlers import matchers
 
 
@@ -25,45 +26,38 @@ class RISMatcher(matchers.Interface):
         return cls()
 
     def match(self, collection, needle, tolerance):
-        match = None
+        '''
+        WURFL PHP binary searches the sorted collection, keeps the first
+        visited ua sharing the longest prefix with the needle and then walks
+        backwards while the previous ua shares that same prefix. The binary
+        search always visits both neighbours of the insertion point of the
+        needle, and those share the longest prefix with it. Therefore the
+        result is the first ua starting with the longest shared prefix,
+        which is found here with two bisections.
+        '''
+        index = bisect_left(collection, needle)
         best_distance = 0
-        low = 0
-        high = len(collection) - 1
-        best_index = 0
-
-        while low <= high:
-            mid = int(round(low + high) / 2)
-            find = collection[mid]
-            distance = self._longest_common_prefix_length(needle, find)
-            if distance >= tolerance and distance > best_distance:
-                best_index = mid
-                match = find
-                best_distance = distance
-
-            cmp = (find > needle) - (find < needle)
-            if cmp < 0:
-                low = mid + 1
-            elif cmp > 0:
-                high = mid - 1
-            else:
-                break
-
-        if best_distance < tolerance:
+        if index < len(collection):
+            best_distance = self._longest_common_prefix_length(needle, collection[index])
+        if index > 0:
+            best_distance = max(
+                best_distance,
+                self._longest_common_prefix_length(needle, collection[index - 1]))
+
+        if best_distance == 0 or best_distance < tolerance:
             return None
-        if best_index == 0:
-            return match
-        return self._first_of_the_bests(collection, needle, best_index, best_distance)
-
-    def _first_of_the_bests(self, collection, needle, best_index, best_distance):
-        while best_index > 0 and self._longest_common_prefix_length(collection[best_index-1], needle) == best_distance:
-            best_index = best_index - 1
-        return collection[best_index]
+        return collection[bisect_left(collection, needle[:best_distance], 0, index)]
 
     def _longest_common_prefix_length(self, s, t):
+        # Bisect the length using (C level) slice comparisons.
         length = min(len(s), len(t))
-        i = 0
-        while i < length:
-            if s[i] != t[i]:
-                break
-            i = i + 1
-        return i
+        if s[:length] == t[:length]:
+            return length
+        low, high = 0, length
+        while high - low > 1:
+            middle = (low + high) // 2
+            if s[:middle] == t[:middle]:
+                low = middle
+            else:
+                high = middle
+        return low
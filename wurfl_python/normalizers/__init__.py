@@ -7,7 +7,6 @@
 
 from __future__ import absolute_import
 from abc import ABCMeta
-import copy
 
 
 class Interface(object):
@@ -19,6 +18,13 @@ class Interface(object):
     def normalize(self, ua):
         raise NotImplementedError('Please implement this method')
 
+    def normalize_in_context(self, ua, context):
+        '''
+        Same as normalize(), but results may be shared through the given
+        match context.
+        '''
+        return self.normalize(ua)
+
 
 class Null(Interface):
     '''
@@ -31,17 +37,60 @@ class Null(Interface):
 class UserAgentNormalizer(Interface):
     '''
     @see WURFL PHP 'WURFL_Request_UserAgentNormalizer'.
+
+    Normalizers created by add_normalizer() are staged: they apply the
+    original normalizer (e.g. the generic one shared by all handlers) and
+    then just the added one. When normalizing in a match context, the
+    result of every stage is cached in it, so the generic normalization
+    is computed once per ua whatever the number of handlers normalizing it.
     '''
-    def __init__(self, normalizers=[]):
+    def __init__(self, normalizers=[], stage=None):
         self._normalizers = normalizers
+        self._stage = stage
 
     def add_normalizer(self, normalizer):
-        normalizers = copy.copy(self._normalizers)
-        normalizers.append(normalizer)
-        return UserAgentNormalizer(normalizers)
+        return UserAgentNormalizer([normalizer], self)
 
     def normalize(self, ua):
         normalized_ua = ua
+        if self._stage is not None:
+            normalized_ua = self._stage.normalize(normalized_ua)
         for normalizer in self._normalizers:
             normalized_ua = normalizer.normalize(normalized_ua)
         return normalized_ua
+
+    def normalize_in_context(self, ua, context):
+        if context is None or ua is not context.ua:
+            return self.normalize(ua)
+        normalized_uas = context.normalized_uas
+        if normalized_uas is None:
+            normalized_uas = context.normalized_uas = {}
+        normalized_ua = normalized_uas.get(self)
+        if normalized_ua is None:
+            if self._stage is not None:
+                normalized_ua = self._stage.normalize_in_context(ua, context)
+            else:
+                normalized_ua = ua
+            for normalizer in self._normalizers:
+                normalized_ua = normalizer.normalize(normalized_ua)
+            normalized_uas[self] = normalized_ua
+        return normalized_ua
+
+
+class Guarded(Interface):
+    '''
+    Applies a list of normalizers only if the ua matches the given compiled
+    regular expression, which must match every ua that any of them would
+    modify. A single search replaces one pass per normalizer for the vast
+    majority of uas, which none of them modify.
+    '''
+    def __init__(self, pattern, normalizers):
+        self._pattern = pattern
+        self._normalizers = normalizers
+
+    def normalize(self, ua):
+        if self._pattern.search(ua) is None:
+            return ua
+        for normalizer in self._normalizers:
+            ua = normalizer.normalize(ua)
+        return ua
@@ -6,8 +6,8 @@
 """
 
 from __future__ import absolute_import
-import re
 from wurfl_python import normalizers
+from wurfl_python import patterns
 from wurfl_python import handlers
 
 
@@ -15,10 +15,10 @@ class BabelFish(normalizers.Interface):
     '''
     @see WURFL PHP 'WURFL_Request_UserAgentNormalizer_Generic_BabelFish'.
     '''
-    BABEL_FISH_REGEX = r'\s*\(via babelfish.yahoo.com\)\s*'
+    BABEL_FISH_REGEX = patterns.BABEL_FISH
 
     def normalize(self, ua):
-        return re.sub(self.BABEL_FISH_REGEX, r'', ua)
+        return self.BABEL_FISH_REGEX.sub(r'', ua)
 
 
 class BlackBerry(normalizers.Interface):
@@ -27,7 +27,7 @@ class BlackBerry(normalizers.Interface):
     '''
     def normalize(self, ua):
         # Normalize mixed-case BlackBerry.
-        ua = re.sub(r'(?i)blackberry', r'BlackBerry', ua)
+        ua = patterns.BLACKBERRY.sub(r'BlackBerry', ua)
         index = ua.find(u'BlackBerry')
         if index > 0 and ua.find(u'AppleWebKit') == -1:
             return ua[index:]
@@ -46,20 +46,20 @@ class NovarraGoogleTranslator(normalizers.Interface):
     '''
     @see WURFL PHP 'WURFL_Request_UserAgentNormalizer_Generic_NovarraGoogleTranslator'.
     '''
-    NOVARRA_GOOGLE_TRANSLATOR_PATTERN = r'(\sNovarra-Vision.*)|(,gzip\(gfe\)\s+\(via translate.google.com\))'
+    NOVARRA_GOOGLE_TRANSLATOR_PATTERN = patterns.NOVARRA_GOOGLE_TRANSLATOR
 
     def normalize(self, ua):
-        return re.sub(self.NOVARRA_GOOGLE_TRANSLATOR_PATTERN, r'', ua)
+        return self.NOVARRA_GOOGLE_TRANSLATOR_PATTERN.sub(r'', ua)
 
 
 class SerialNumbers(normalizers.Interface):
     '''
     @see WURFL PHP 'WURFL_Request_UserAgentNormalizer_Generic_SerialNumbers'.
     '''
-    SERIAL_NUMBERS_PATTERN = r'(\[(TF|NT|ST)[\d|X]+\])|(\/SN[\d|X]+)'
+    SERIAL_NUMBERS_PATTERN = patterns.SERIAL_NUMBERS
 
     def normalize(self, ua):
-        return re.sub(self.SERIAL_NUMBERS_PATTERN, r'', ua)
+        return self.SERIAL_NUMBERS_PATTERN.sub(r'', ua)
 
 
 class UCWEB(normalizers.Interface):
@@ -69,8 +69,8 @@ class UCWEB(normalizers.Interface):
     def normalize(self, ua):
         # Starts with 'JUC' or 'Mozilla/5.0(Linux;U;Android'.
         if ua.startswith(u'JUC') or ua.startswith(u'Mozilla/5.0(Linux;U;Android'):
-            ua = re.sub(r'^(JUC \(Linux; U;)(?= \d)', r'\1 Android', ua)
-            ua = re.sub(r'(Android|JUC|[;\)])(?=[\w|\(])', r'\1', ua)
+            ua = patterns.UCWEB_JUC.sub(r'\1 Android', ua)
+            ua = patterns.UCWEB_SEPARATORS.sub(r'\1', ua)
         return ua
 
 
@@ -89,7 +89,7 @@ class YesWAP(normalizers.Interface):
     '''
     @see WURFL PHP 'WURFL_Request_UserAgentNormalizer_Generic_YesWAP'.
     '''
-    YES_WAP_REGEX = r'\s*Mozilla\/4\.0 \(YesWAP mobile phone proxy\)'
+    YES_WAP_REGEX = patterns.YES_WAP
 
     def normalize(self, ua):
-        return re.sub(self.YES_WAP_REGEX, r'', ua)
+        return self.YES_WAP_REGEX.sub(r'', ua)
@@ -6,9 +6,9 @@
 """
 
 from __future__ import absolute_import
-import re
 from wurfl_python import constants
 from wurfl_python import normalizers
+from wurfl_python import patterns
 from wurfl_python import handlers
 
 
@@ -17,7 +17,7 @@ class Android(normalizers.Interface):
     @see WURFL PHP 'WURFL_Request_UserAgentNormalizer_Specific_Android'.
     '''
     def normalize(self, ua):
-        ua = re.sub(r'(Android)[ \-](\d\.\d)([^; \/\)]+)', r'\1 \2', ua)
+        ua = patterns.ANDROID_VERSION_SUFFIX.sub(r'\1 \2', ua)
         skip_normalization = [
             u'Opera Mini',
             u'Opera Mobi',
@@ -126,10 +126,10 @@ class LGUPLUS(normalizers.Interface):
     '''
     @see WURFL PHP 'WURFL_Request_UserAgentNormalizer_Specific_LGUPLUS'.
     '''
-    LGPLUS_PATTERN = r'Mozilla.*(Windows (?:NT|CE)).*(POLARIS|WV).*lgtelecom;.*;(.*);.*'
+    LGPLUS_PATTERN = patterns.LGPLUS
 
     def normalize(self, ua):
-        return re.sub(self.LGPLUS_PATTERN, r'\3 \1 \2', ua)
+        return self.LGPLUS_PATTERN.sub(r'\3 \1 \2', ua)
 
 
 class MSIE(normalizers.Interface):
@@ -155,7 +155,7 @@ class Opera(normalizers.Interface):
         # Normalize: Opera/9.80 (X11; Linux x86_64; U; sv) Presto/2.9.168 Version/11.50
         # Into: Opera/11.50 (X11; Linux x86_64; U; sv) Presto/2.9.168 Version/11.50
         if handlers.Utils.check_if_starts_with(ua, u'Opera/9.80'):
-            matches = re.search(r'Version/(\d+\.\d+)', ua)
+            matches = patterns.OPERA_VERSION_TOKEN.search(ua)
             if matches is not None:
                 ua = ua.replace(u'Opera/9.80', u'Opera/' + matches.group(1))
         return ua
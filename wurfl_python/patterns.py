@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""
+Regular expressions used by handlers and normalizers, compiled once on
+import. Calling re.search() or re.sub() with a string pattern looks it up
+in the bounded cache of the 're' module, which Python 2 flushes completely
+once it holds more than re._MAXCACHE patterns, so under an application
+using its own regular expressions they would be compiled over and over.
+
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import re
+
+
+# AndroidHandler.
+ANDROID_VERSION = re.compile(r'Android (\d\.\d)')
+OPERA_ON_ANDROID_VERSION = re.compile(r'Version\/(\d\d)')
+ANDROID_MODEL = re.compile(r'Android [^;]+; xx-xx; (.+?) Build/')
+ANDROID_MODEL_HTC = re.compile(r'HTC[ _\-/]')
+ANDROID_MODEL_HTC_VERSION = re.compile(r'(/| V?[\d\.]).*$')
+ANDROID_MODEL_HTC_SLASH = re.compile(r'/.*$')
+ANDROID_MODEL_SAMSUNG = re.compile(r'(SAMSUNG[^/]+)/.*$')
+ANDROID_MODEL_ORANGE = re.compile(r'ORANGE/.*$')
+ANDROID_MODEL_LG = re.compile(r'(LG-[^/]+)/[vV].*$')
+ANDROID_MODEL_SERIAL_NUMBER = re.compile(r'\[[\d]{10}\]')
+
+# AppleHandler.
+APPLE_VERSION = re.compile(r' (\d)_(\d)[ _]')
+
+# BlackBerryHandler.
+BLACKBERRY_VERSION = re.compile(r'BlackBerry[^/\s]+/(\d.\d)')
+
+# FirefoxHandler.
+FIREFOX_VERSION = re.compile(r'Firefox\/(\d+)\.\d')
+
+# HTCMacHandler.
+HTCMAC_MODEL = re.compile(r'(HTC[^;\)]+)')
+HTCMAC_MODEL_SEPARATOR = re.compile(r'[ _\-/]')
+
+# MSIEHandler.
+MSIE_VERSION = re.compile(r'^Mozilla\/4\.0 \(compatible; MSIE (\d)\.(\d);')
+
+# OperaHandler.
+OPERA_VERSION = re.compile(r'Opera[ /]?(\d+\.\d+)')
+
+# WebOSHandler.
+WEBOS_MODEL_VERSION = re.compile(r' ([^/]+)/([\d\.]+)$')
+WEBOS_VERSION = re.compile(r'(?:hpw|web)OS.(\d)\.')
+
+# Utils.
+DESKTOP_SAFARI = re.compile(r'^Mozilla/5\.0 \((?:Macintosh|Windows)[^\)]+\) AppleWebKit/[\d\.]+ \(KHTML, like Gecko\) Version/[\d\.]+ Safari/[\d\.]+$')
+DESKTOP_MSIE9 = re.compile(r'^Mozilla\/5\.0 \(compatible; MSIE 9\.0; Windows NT \d\.\d')
+DESKTOP_MSIE = re.compile(r'^Mozilla\/4\.0 \(compatible; MSIE \d\.\d; Windows NT \d\.\d')
+LOCALE = re.compile(r'; ?[a-z]{2}(?:-[a-zA-Z]{2})?(?:\.utf8|\.big5)?\b-?')
+
+
+# Generic normalizers.
+BABEL_FISH = re.compile(r'\s*\(via babelfish.yahoo.com\)\s*')
+BLACKBERRY = re.compile(r'(?i)blackberry')
+NOVARRA_GOOGLE_TRANSLATOR = re.compile(r'(\sNovarra-Vision.*)|(,gzip\(gfe\)\s+\(via translate.google.com\))')
+SERIAL_NUMBERS = re.compile(r'(\[(TF|NT|ST)[\d|X]+\])|(\/SN[\d|X]+)')
+UCWEB_JUC = re.compile(r'^(JUC \(Linux; U;)(?= \d)')
+UCWEB_SEPARATORS = re.compile(r'(Android|JUC|[;\)])(?=[\w|\(])')
+YES_WAP = re.compile(r'\s*Mozilla\/4\.0 \(YesWAP mobile phone proxy\)')
+# Matches every ua modified by the BlackBerry, YesWAP, BabelFish,
+# SerialNumbers or NovarraGoogleTranslator generic normalizers.
+GENERIC_NORMALIZERS_GUARD = re.compile(r'(?i)blackberry|yeswap|babelfish|\[(?:tf|nt|st)|/sn|novarra-vision|,gzip\(gfe\)')
+
+# Specific normalizers.
+ANDROID_VERSION_SUFFIX = re.compile(r'(Android)[ \-](\d\.\d)([^; \/\)]+)')
+LGPLUS = re.compile(r'Mozilla.*(Windows (?:NT|CE)).*(POLARIS|WV).*lgtelecom;.*;(.*);.*')
+OPERA_VERSION_TOKEN = re.compile(r'Version/(\d+\.\d+)')
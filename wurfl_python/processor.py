@@ -6,20 +6,29 @@
 """
 
 from __future__ import absolute_import
+import re
 import sys
+import json
 import codecs
+import hashlib
 from time import ctime
+from collections import deque, OrderedDict
 from optparse import OptionParser
 
 try:
-    from xml.etree.ElementTree import parse
+    from xml.etree.cElementTree import iterparse
 except ImportError:
     try:
-        from cElementTree import parse
+        from xml.etree.ElementTree import iterparse
     except ImportError:
-        from elementtree.ElementTree import parse
+        try:
+            from cElementTree import iterparse
+        except ImportError:
+            from elementtree.ElementTree import iterparse
 
-from wurfl_python.exceptions import DeferredDeviceException
+from wurfl_python.exceptions import DeferredDeviceException, InvalidDatabaseException
+
+MANIFEST_FORMAT_VERSION = 1
 
 
 class Device(object):
@@ -43,126 +52,644 @@ class Device(object):
                 for capability in group:
                     self.capabilities[capability.attrib['name']] = capability.attrib['value']
 
+    def patch(self, device):
+        '''
+        Patches the device with a patching device of the same id: its
+        capabilities are added, or override the current ones, while the ua,
+        fall back device and actual device root flag are kept.
+        @see WURFL PHP 'WURFL_Xml_DevicePatcher'.
+        '''
+        self.capabilities.update(device.capabilities)
+
+
+class Encoder(object):
+    '''
+    Encodes devices into records to be registered: capabilities typed
+    according to the inferred capability types, digest (see
+    '_get_digest()') and classification of the ua. For Python modules, the
+    record is made of the literal preceding the capabilities, the sorted
+    list of (name, value) capabilities, the literal of the fall back device
+    and the literal of the classification, the capabilities and the
+    classification to be written as indexes into the tables of the module
+    (see 'Processor._encode_record()'). Devices are encoded independently of
+    each other, so batches of devices can be encoded by a pool of processes
+    (see 'Processor').
+    '''
+    def __init__(self, capability_types, format, previous=None):
+        '''
+        @param capability_types: Capability types, by name.
+        @type capability_types: dict
+        @param format: Output format (see 'Processor.FORMATS').
+        @type format: string
+        @param previous: None or the digests of the devices of the previous
+                         database, by id. Unchanged devices are not
+                         encoded.
+        @type previous: dict
+        '''
+        self.capability_types = capability_types
+        self.format = format
+        self.previous = previous
+
+    def encode(self, devices):
+        '''
+        Returns a list of (id, digest, record) for the given devices. The
+        record is None for devices unchanged since the previous database.
+        '''
+        return [self._encode_device(device) for device in devices]
+
+    def _encode_device(self, device):
+        id = unicode(device.id)
+        typed_capabilities = self._get_typed_capabilities(device)
+        digest = self._get_digest(device, typed_capabilities)
+        if self.previous is not None and self.previous.get(id) == digest:
+            return id, digest, None
+
+        if self.format == 'binary':
+            from wurfl_python import _chain
+            ua = unicode(device.ua)
+            return id, digest, (
+                id,
+                ua,
+                device.actual_device_root,
+                typed_capabilities,
+                unicode(device.parent) if device.parent != u'root' else None,
+                _chain.classify(ua))
+
+        ua = device.ua if not device.ua.endswith(u'\\') else u'%s\\' % device.ua
+        head = u"(ur'''%s''', ur'''%s''', %s, " % (device.id, ua, device.actual_device_root)
+        return id, digest, (
+            head,
+            sorted(typed_capabilities.iteritems()),
+            u"ur'''%s'''" % device.parent if device.parent != u'root' else u'None',
+            self._get_classification(ua))
+
+    def _get_digest(self, device, typed_capabilities):
+        '''
+        Returns the digest of the registration of the given device: id, ua,
+        actual device root flag, typed capabilities and fall back device.
+        '''
+        return hashlib.sha1(repr((
+            unicode(device.id),
+            unicode(device.ua),
+            device.actual_device_root,
+            sorted((unicode(name), value) for name, value in typed_capabilities.iteritems()),
+            unicode(device.parent),
+        ))).hexdigest()[:16]
+
+    def _get_classification(self, ua):
+        '''
+        Returns the literal of the classification of the given ua by the
+        handler chain (see 'Chain.classify()'), so modules register devices
+        without normalizing their uas nor consulting the chain. The normalized
+        ua is None if it equals the ua.
+        '''
+        from wurfl_python import _chain
+        # Same value the module will get from the raw literal.
+        ua = self._get_literal_value(ua)
+        handler_name, normalized_ua, indexes = _chain.classify(ua)
+        return u'(%s, %s, %r)' % (
+            u"u'%s'" % handler_name if handler_name is not None else u'None',
+            repr(normalized_ua) if normalized_ua != ua else u'None',
+            indexes)
+
+    def _get_literal_value(self, text):
+        '''
+        Returns the value of the raw unicode literal (triple quoted) of the
+        given text in a UTF-8 module, without evaluating it: as the Python 2
+        compiler does, only the \\uXXXX and \\UXXXXXXXX escapes in the ASCII
+        runs of the text are decoded (i.e. backslashes preceding non ASCII
+        characters are literal).
+        '''
+        return u''.join(
+            part if ord(part[0]) > 0x7f else part.encode('ascii').decode('raw_unicode_escape')
+            for part in re.split(u'([^\\x00-\\x7f]+)', text) if part)
+
+    def _get_typed_capabilities(self, device):
+        '''
+        Returns the capabilities of the given device, typed according to
+        the inferred capability types.
+        '''
+        capabilities = {}
+        for capability, value in device.capabilities.iteritems():
+            capability_type = self.capability_types.get(capability, None)
+            if capability_type == int:
+                capabilities[capability] = int(value.strip())
+            elif capability_type == float:
+                # Same precision as written to Python modules ('%f').
+                capabilities[capability] = float(u'%f' % float(value.strip()))
+            elif capability_type == bool:
+                if value.lower() == u'true':
+                    capabilities[capability] = True
+                elif value.lower() == u'false':
+                    capabilities[capability] = False
+            else:
+                capabilities[capability] = unicode(value)
+        return capabilities
+
+
+# Encoder of the processes of the pool used by 'Processor' (see
+# '_init_worker()').
+_encoder = None
+
+
+def _init_worker(capability_types, format, previous):
+    global _encoder
+    _encoder = Encoder(capability_types, format, previous)
+
+
+def _encode(devices):
+    return _encoder.encode(devices)
+
 
 class Processor(object):
-    def __init__(self, input, groups, output):
+    FORMATS = ('python', 'binary')
+
+    # Devices registered by every Repository.register_many() (or
+    # register_encoded()) call.
+    CHUNK_SIZE = 1000
+
+    def __init__(self, input, groups, output, format='python', patches=(), previous=None, jobs=1):
         '''
         @param input: WURFL XML file path. It can be a regular, zip, bzip2
                       or gzipped file.
         @type input: string
         @param groups: None or list of WURFL capability group names.
         @type groups: list
-        @param output: Python database file path.
+        @param output: Python or binary database file path. A manifest of
+                       the database (see '_write_manifest()') is written to
+                       the same path plus '.manifest'.
         @type output: string
+        @param format: Output format: 'python' (a Python module registering
+                       all devices) or 'binary' (see 'wurfl_python.database').
+        @type format: string
+        @param patches: WURFL XML patch file paths, applied in order.
+        @type patches: list
+        @param previous: None or the path of a Python database module
+                         previously generated (or of its manifest). If given,
+                         a delta module to be applied on top of it (see
+                         'wurfl_python.reload()') is generated instead.
+        @type previous: string
+        @param jobs: Number of processes encoding devices (see 'Encoder').
+                     The output is the same whatever the number of jobs.
+        @type jobs: int
         '''
         # Capability groups.
         self.groups = set(groups) if groups is not None else None
 
-        # XML input.
-        if input.endswith('.gz'):
-            import gzip
-            input = gzip.open(input, 'rb')
-        elif input.endswith('.bz2'):
-            from bz2 import BZ2File
-            input = BZ2File(input)
-        elif input.endswith('.zip'):
-            from zipfile import ZipFile
-            from cStringIO import StringIO
-            zfile = ZipFile(input)
-            input = StringIO(zfile.read(zfile.namelist()[0]))
+        # XML input, streamed (see '_iter_devices()').
+        self.input = input
+        self.version = None
+
+        # Patching devices, by id.
+        self.patches = list(patches)
+        self._load_patching_devices()
+
+        # Previous database.
+        if previous is not None:
+            if format != 'python':
+                raise ValueError('Deltas can only be generated for the python format')
+            self._load_manifest(previous)
         else:
-            input = open(input, 'rb')
-        self.tree = parse(input)
+            self.previous = None
 
-        # Python output.
-        self.output = codecs.open(output, 'wb', 'utf8')
+        self.format = format
+        self.jobs = jobs
 
-        # Fetch normalized capability types.
+        # Fetch normalized capability types (and the version) in a first
+        # pass over the input.
         self._load_capability_types()
 
+        # Output, opened once the input has been read, so an unreadable
+        # input does not truncate a previously generated database.
+        self.output_path = output
+        if format == 'binary':
+            self.output = None
+        else:
+            self.output = codecs.open(output, 'wb', 'utf8')
+
     def process(self):
         # Initialice.
         self.deferred = {}
         self.done = set()
+        self.records = []
+        self.manifest = []
+        # Table of (name, value) constants of Python modules: literal of
+        # the index (see '_add_constant()'), by (name, value).
+        self.constants = {}
+        self.new_constants = []
+        # Table of classifications of Python modules: index, by literal.
+        self.classifications = {}
+        self.new_classifications = []
+        self.batch = []
+        self.pending = deque()
+
+        # Binary databases are built in an engine of their own, so devices
+        # registered by the process (e.g. an imported database module, or
+        # a previous build) are not written.
+        if self.format == 'binary':
+            import wurfl_python
+            self.engine = wurfl_python.Engine()
+        else:
+            self.engine = None
+
+        # Encoding of devices.
+        previous = None
+        if self.previous is not None:
+            previous = dict((id, digest) for id, (position, digest) in self.previous.iteritems())
+        arguments = (self.capability_types, self.format, previous)
+        if self.jobs > 1:
+            import multiprocessing
+            self.pool = multiprocessing.Pool(self.jobs, _init_worker, arguments)
+        else:
+            self.pool = None
+            self.encoder = Encoder(*arguments)
+        try:
+            self._process_devices()
+        finally:
+            if self.pool is not None:
+                self.pool.terminate()
+                self.pool.join()
+                self.pool = None
+
+        if self.previous is not None:
+            self._write_delta()
+            return
+        self._flush_records()
 
+        # Write binary database.
+        if self.format == 'binary':
+            from wurfl_python import database
+            database.write(self.output_path, self.engine)
+        self._write_manifest()
+
+    def _process_devices(self):
         # Dump Python header.
         self._dump_header()
 
-        # Process devices.
-        for item in self.tree.getroot().find('devices'):
+        # Process devices, in a second pass over the input. Devices defined
+        # by the patches only are processed at the end.
+        patching_devices = OrderedDict(self.patching_devices)
+        for item in self._iter_devices():
             # Instantiate device.
             device = Device(item, self.groups)
+            patching_device = patching_devices.pop(device.id, None)
+            if patching_device is not None:
+                device.patch(patching_device)
+            self._add_device(device)
+        for device in patching_devices.itervalues():
+            self._add_device(device)
+
+        # Devices still deferred fall back to missing devices or to each
+        # other.
+        if self.deferred:
+            self._raise_deferred()
 
-            # Ready to dump?
-            if device.parent != 'root' and (device.parent not in self.done):
-                if device.parent not in self.deferred:
-                    self.deferred[device.parent] = []
-                self.deferred[device.parent].append(device)
+        self._end_encoding()
+
+    def _add_device(self, device):
+        # Ready to dump?
+        if device.parent != 'root' and (device.parent not in self.done):
+            if device.parent not in self.deferred:
+                self.deferred[device.parent] = []
+            self.deferred[device.parent].append(device)
+        else:
+            self._process_device(device)
+
+    def _open(self, path):
+        '''
+        Opens a XML file as a stream. Compressed files are decompressed
+        while read.
+        '''
+        if path.endswith('.gz'):
+            import gzip
+            return gzip.open(path, 'rb')
+        elif path.endswith('.bz2'):
+            from bz2 import BZ2File
+            return BZ2File(path)
+        elif path.endswith('.zip'):
+            from zipfile import ZipFile
+            zfile = ZipFile(path)
+            return zfile.open(zfile.namelist()[0])
+        else:
+            return open(path, 'rb')
+
+    def _iter_devices(self, path=None):
+        '''
+        Yields the device elements of the XML input (or of the given patch
+        file), parsed incrementally. Every element is cleared and dropped from
+        the tree when the next one is requested, so memory is bounded by the
+        largest device instead of the whole input. The version is fetched on
+        the way.
+        '''
+        input = self._open(path if path is not None else self.input)
+        try:
+            devices = None
+            for event, element in iterparse(input, events=('start', 'end')):
+                if event == 'start':
+                    if element.tag == 'devices':
+                        devices = element
+                elif element.tag == 'device':
+                    yield element
+                    element.clear()
+                    if devices is not None:
+                        devices.remove(element)
+                elif element.tag == 'ver' and path is None and self.version is None:
+                    self.version = (element.text or u'').strip()
+        finally:
+            input.close()
+
+    def _process_device(self, device):
+        '''
+        Dumps the given device, whose fall back device is already dumped, and
+        then any deferred devices (devices that have been defined in the WURFL
+        before their fall_back has been defined) released by it: deferred
+        devices are indexed by fall back device id, so each one is dumped as
+        soon as its fall back device is, in document order among siblings.
+        '''
+        pending = deque([device])
+        while pending:
+            device = pending.popleft()
+            self.done.add(device.id)
+            self._dump_device(device)
+            children = self.deferred.pop(device.id, None)
+            if children is not None:
+                pending.extend(children)
+
+    def _raise_deferred(self):
+        '''
+        Raises DeferredDeviceException reporting why the deferred devices
+        cannot be dumped: the fall back devices which are not defined, and the
+        cycles of devices falling back to each other. Other deferred devices
+        fall back to any of those.
+        '''
+        devices = dict(
+            (device.id, device)
+            for children in self.deferred.itervalues()
+            for device in children)
+        missing = {}
+        cycles = []
+        visited = set()
+        for id in sorted(devices):
+            path = []
+            positions = {}
+            while id in devices and id not in visited:
+                if id in positions:
+                    cycles.append(path[positions[id]:])
+                    break
+                positions[id] = len(path)
+                path.append(id)
+                id = devices[id].parent
             else:
-                self.done.add(device.id)
-                self._dump_device(device)
-                self._process_deferred()
-
-        # Process deferred devices.
-        while self.deferred:
-            deferred_len = len(self.deferred)
-            self._process_deferred()
-            if deferred_len == len(self.deferred):
-                raise DeferredDeviceException('%s devices still deferred: %s' % (deferred_len, self.deferred.keys()))
-
-    def _process_deferred(self):
-        '''
-        Called to process any deferred devices (devices that have been defined
-        in the WURFL before their fall_back has been defined). It is called
-        after any device has been handled and also called in a loop
-        after all device definitions in the WURFL database have been exhausted.
-        '''
-        dumped = []
-        for parent in self.deferred:
-            if parent in self.done:
-                for device in self.deferred[parent]:
-                    self.done.add(device.id)
-                    self._dump_device(device)
-                dumped.append(parent)
-        for id in dumped:
-            del self.deferred[id]
+                if id not in devices:
+                    missing.setdefault(id, []).append(path[-1])
+            visited.update(path)
+        for children in missing.itervalues():
+            children.sort()
+
+        problems = []
+        for parent, children in sorted(missing.iteritems()):
+            problems.append('%s (fall back device of %s) is not defined' % (parent, ', '.join(children)))
+        for cycle in cycles:
+            problems.append('%s fall back to each other' % ' -> '.join(cycle + cycle[:1]))
+        raise DeferredDeviceException(
+            '%d devices still deferred: %s' % (len(devices), '; '.join(problems)),
+            missing, cycles)
 
     def _dump_header(self):
+        if self.format == 'binary':
+            self.engine.set_version(unicode(self.version))
+            return
         self.output.write(u"# -*- coding: utf-8 -*-\n")
         self.output.write(u"# Generated on: %s.\n" % ctime())
-        self.output.write(u"# Version: %s.\n\n" % self.tree.findtext("*/ver").strip())
+        self.output.write(u"# Version: %s.\n" % self.version)
+        if self.previous is not None:
+            self.output.write(u"# Delta of version: %s.\n" % self.previous_version)
+        self.output.write(u"\n")
         self.output.write(u"from __future__ import absolute_import\n")
-        self.output.write(u"from wurfl_python import Repository, match, find\n\n")
+        self.output.write(u"from wurfl_python import Repository, match, match_many, find\n\n")
+        if self.previous is None:
+            self.output.write(u"Repository.set_version(ur'''%s''')\n\n" % self.version)
+        self.output.write(u"CAPABILITIES = []\n")
+        self.output.write(u"CLASSIFICATIONS = []\n\n")
 
     def _dump_device(self, device):
-        capabilities = []
-        for capability in sorted(device.capabilities):
-            value = device.capabilities[capability]
-            capability_type = self.capability_types.get(capability, None)
-            if capability_type == int:
-                capabilities.append(u"ur'''%s''':%d" % (capability, int(value.strip())))
-            elif capability_type == float:
-                capabilities.append(u"ur'''%s''':%f" % (capability, float(value.strip())))
-            elif capability_type == bool:
-                if value.lower() == u'true':
-                    capabilities.append(u"ur'''%s''':True" % capability)
-                elif value.lower() == u'false':
-                    capabilities.append(u"ur'''%s''':False" % capability)
+        '''
+        Queues the given device to be encoded (see 'Encoder'). Devices are
+        encoded in batches, by a pool of processes if 'jobs' is greater than
+        one, and written in the order they are dumped.
+        '''
+        self.batch.append(device)
+        if len(self.batch) >= self.CHUNK_SIZE:
+            self._encode_batch()
+
+    def _encode_batch(self):
+        if not self.batch:
+            return
+        if self.pool is None:
+            self._write_encoded(self.encoder.encode(self.batch))
+        else:
+            self.pending.append(self.pool.apply_async(_encode, (self.batch,)))
+            # Bound the number of batches in flight, so devices keep being
+            # streamed.
+            while len(self.pending) > 2 * self.jobs:
+                self._write_encoded(self.pending.popleft().get())
+        self.batch = []
+
+    def _write_encoded(self, encoded):
+        for id, digest, record in encoded:
+            self.manifest.append((id, digest))
+            # Deltas only include new and changed devices.
+            if record is not None:
+                if self.format == 'python':
+                    record = self._encode_record(record)
+                self.records.append(record)
+                if len(self.records) >= self.CHUNK_SIZE and self.previous is None:
+                    self._flush_records()
+
+    def _encode_record(self, record):
+        '''
+        Returns the literal of a record encoded by 'Encoder', with its
+        capabilities as a tuple of indexes into the table of (name, value)
+        constants of the module and its classification as an index into the
+        table of classifications of the module. New constants and
+        classifications are added to the tables when records are written
+        (see '_write_constants()').
+        '''
+        head, capabilities, parent, classification = record
+        # Capabilities are typed by name, so values of a name are never
+        # equal but of different types (e.g. True and 1).
+        get = self.constants.get
+        indexes = []
+        for item in capabilities:
+            index = get(item)
+            if index is None:
+                index = self._add_constant(*item)
+            indexes.append(index)
+        classification_index = self.classifications.get(classification)
+        if classification_index is None:
+            classification_index = self.classifications[classification] = len(self.classifications)
+            self.new_classifications.append(classification)
+        return u'%s(%s), %s, %d)' % (head, u''.join(indexes), parent, classification_index)
+
+    def _add_constant(self, name, value):
+        '''
+        Adds the given capability to the table of constants and returns
+        the literal of its index in the tuple of a record.
+        '''
+        if isinstance(value, bool):
+            literal = u'%s' % value
+        elif isinstance(value, (int, long)):
+            literal = u'%d' % value
+        elif isinstance(value, float):
+            literal = u'%f' % value
+        else:
+            literal = u"ur'''%s'''" % value
+        index = self.constants[(name, value)] = u'%d,' % len(self.constants)
+        self.new_constants.append(u"(ur'''%s''', %s)" % (name, literal))
+        return index
+
+    def _write_constants(self):
+        '''
+        Extends the tables of constants and classifications of the module
+        with the ones added since the last call.
+        '''
+        if self.new_constants:
+            self.output.write(u"CAPABILITIES.extend([\n%s,\n])\n" % u',\n'.join(
+                u'    %s' % constant for constant in self.new_constants))
+            self.new_constants = []
+        if self.new_classifications:
+            self.output.write(u"CLASSIFICATIONS.extend([\n%s,\n])\n" % u',\n'.join(
+                u'    %s' % classification for classification in self.new_classifications))
+            self.new_classifications = []
+
+    def _end_encoding(self):
+        '''
+        Encodes the devices still queued and waits for all batches in
+        flight.
+        '''
+        self._encode_batch()
+        while self.pending:
+            self._write_encoded(self.pending.popleft().get())
+
+    def _flush_records(self):
+        '''
+        Registers in the engine of the binary database (or, for Python
+        modules, writes the registration of) the devices dumped since the
+        last call, at once.
+        '''
+        if not self.records:
+            return
+        if self.format == 'binary':
+            self.engine.register_many(self.records)
+        else:
+            self._write_constants()
+            self.output.write(
+                u"Repository.register_encoded(CAPABILITIES, CLASSIFICATIONS, [\n%s,\n])\n\n" % u',\n'.join(
+                    self.records))
+        self.records = []
+
+    def _write_delta(self):
+        '''
+        Writes the delta to be applied on top of the previous database: the
+        registration order of the devices and the records of the new and
+        changed devices. The order is a list of (start, stop) ranges of
+        positions of devices in the previous database and of ids of new
+        devices, so devices are registered in the same order (i.e. with the
+        same ordinals) as a full build would.
+        '''
+        order = []
+        for id, digest in self.manifest:
+            previous = self.previous.get(id)
+            if previous is None:
+                order.append(u"ur'''%s'''" % id)
+            elif order and isinstance(order[-1], list) and order[-1][1] == previous[0]:
+                order[-1][1] += 1
             else:
-                capabilities.append(u"ur'''%s''':ur'''%s'''" % (capability, value))
+                order.append([previous[0], previous[0] + 1])
+        self._write_constants()
+        self.output.write(u"Repository.set_delta(ur'''%s''', %d, ur'''%s''', [%s], [%s\n], CAPABILITIES, CLASSIFICATIONS)\n" % (
+            self.previous_version,
+            len(self.previous),
+            self.version,
+            u', '.join(item if not isinstance(item, list) else u'(%d, %d)' % tuple(item) for item in order),
+            u''.join(u'\n%s,' % record for record in self.records)))
+        self.records = []
 
-        self.output.write(u"Repository.register(ur'''%s''', ur'''%s''', %s, {%s}, %s)\n\n" % (
-            device.id,
-            device.ua if not device.ua.endswith(u'\\') else u'%s\\' % device.ua,
-            device.actual_device_root,
-            u','.join(capabilities),
-            u"ur'''%s'''" % device.parent if device.parent != u'root' else u'None'))
+    def _write_manifest(self):
+        '''
+        Writes the manifest of the generated database, used to generate
+        deltas on top of it: the versions of the WURFL database and of the
+        library, the capability groups and the id and digest (see
+        '_get_digest()') of every device, in registration order.
+        '''
+        import wurfl_python
+        with open(self.output_path + '.manifest', 'wb') as output:
+            json.dump({
+                'format': MANIFEST_FORMAT_VERSION,
+                'output': self.format,
+                'library': wurfl_python.__version__,
+                'version': self.version,
+                'groups': sorted(self.groups) if self.groups is not None else None,
+                'devices': self.manifest,
+            }, output, separators=(',', ':'))
+
+    def _load_manifest(self, path):
+        '''
+        Loads the manifest of the previous database (see '_write_manifest()').
+        '''
+        import wurfl_python
+        if not path.endswith('.manifest'):
+            path += '.manifest'
+        try:
+            with open(path, 'rb') as input:
+                manifest = json.load(input)
+            format_version = manifest['format']
+            devices = manifest['devices']
+        except (IOError, ValueError, TypeError, KeyError):
+            raise InvalidDatabaseException('%s is not a WURFL Python manifest' % path)
+        if format_version != MANIFEST_FORMAT_VERSION:
+            raise InvalidDatabaseException('Unsupported manifest format version: %s' % format_version)
+        if manifest['output'] != 'python':
+            raise InvalidDatabaseException('%s is not the manifest of a Python database module' % path)
+        if manifest['library'] != wurfl_python.__version__:
+            raise InvalidDatabaseException('%s was generated by wurfl-python %s' % (path, manifest['library']))
+        groups = sorted(self.groups) if self.groups is not None else None
+        if manifest['groups'] != groups:
+            raise InvalidDatabaseException('%s was generated for other capability groups' % path)
+        self.previous_version = manifest['version']
+        # Position and digest, by id.
+        self.previous = dict((id, (position, digest)) for position, (id, digest) in enumerate(devices))
+
+    def _load_patching_devices(self):
+        '''
+        Loads the devices defined by the patch files. Devices defined by
+        several patch files are patched in turn.
+        @see WURFL PHP 'WURFL_DeviceRepositoryBuilder'.
+        '''
+        self.patching_devices = OrderedDict()
+        for path in self.patches:
+            for item in self._iter_devices(path):
+                device = Device(item, self.groups)
+                if device.id in self.patching_devices:
+                    self.patching_devices[device.id].patch(device)
+                else:
+                    self.patching_devices[device.id] = device
+
+    def _iter_capabilities(self):
+        '''
+        Yields (name, value) for all capabilities in the input, and then for
+        the capabilities of the patching devices.
+        '''
+        for device in self._iter_devices():
+            for capability in device.findall('group/capability'):
+                yield capability.attrib['name'], capability.attrib['value']
+        for device in self.patching_devices.itervalues():
+            for item in device.capabilities.iteritems():
+                yield item
 
     def _load_capability_types(self):
         self.capability_types = {}
-        for capability in self.tree.findall('devices/device/group/capability'):
-            name = capability.attrib['name']
-            value = capability.attrib['value']
+        for name, value in self._iter_capabilities():
             if name not in self.capability_types:
                 try:
                     int(value)
@@ -211,7 +738,15 @@ def main():
         '--output',
         dest='output',
         default='wurfl.py',
-        help='Name of the database Python module to produce. Defaults to wurfl.py.')
+        help='Name of the database Python module (or binary database) to produce. Defaults to wurfl.py.')
+    option_parser.add_option(
+        '-f',
+        '--format',
+        dest='format',
+        default='python',
+        type='choice',
+        choices=Processor.FORMATS,
+        help='Output format: python (a Python module) or binary (a memory mappable database, see wurfl_python.load()). Defaults to python.')
     option_parser.add_option(
         '-g',
         '--group',
@@ -220,9 +755,36 @@ def main():
         action='append',
         help='Name of a capability group to be included in the output database. If no groups are specified, all input database capabilities groups are included in the output.')
 
+    option_parser.add_option(
+        '-p',
+        '--patch',
+        dest='patches',
+        default=[],
+        action='append',
+        help='Name of a WURFL patch file to be applied to the input database. Several patch files are applied in order.')
+    option_parser.add_option(
+        '--previous',
+        dest='previous',
+        default=None,
+        help='Name of a database Python module previously generated (or of its manifest). If given, the output is a delta module including only the devices changed since then, to be applied on top of it (see wurfl_python.reload()).')
+
+    option_parser.add_option(
+        '-j',
+        '--jobs',
+        dest='jobs',
+        default=1,
+        type='int',
+        help='Number of processes encoding devices. The output is the same whatever the number of jobs. Defaults to 1.')
+
     options, args = option_parser.parse_args()
+    if options.previous is not None and options.format != 'python':
+        option_parser.error('--previous requires the python format')
+    if options.jobs < 1:
+        option_parser.error('--jobs must be at least 1')
     if args:
-        wurfl = Processor(args[0], options.groups, options.output)
+        wurfl = Processor(
+            args[0], options.groups, options.output, options.format, options.patches, options.previous,
+            options.jobs)
         wurfl.process()
     else:
         sys.stderr.write(option_parser.get_usage())
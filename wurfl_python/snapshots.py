@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+"""
+Snapshots of the fully built matching engine: devices, capabilities (with
+all columns resolved), the sorted buckets of every handler and the table
+of uas of registered devices. A snapshot is restored (see
+'wurfl_python.restore()') with a single read of the file, so nothing is
+parsed, normalized, sorted or resolved on startup. Unlike a binary
+database (see 'wurfl_python.database'), the restored engine is the same
+as one built by registering devices: nothing is decoded on lookups and
+more devices can be registered afterwards.
+
+Snapshots are marshalled and hold arrays in native byte order, so they are
+keyed by the library version, the Python version and the byte order of
+the process which wrote them, besides the WURFL version. Marshalled data
+is not secure against erroneous or maliciously constructed data: only
+restore snapshots from trusted sources (e.g. built on CI and shipped with
+the application).
+
+:copyright: (c) 2013 by Carlos Abalde, see AUTHORS.txt for more details.
+:license: GPL, see LICENSE.txt for more details.
+"""
+
+from __future__ import absolute_import
+import sys
+import struct
+import marshal
+from array import array
+from wurfl_python.capabilities import Store
+from wurfl_python.handlers.bucket import Bucket
+from wurfl_python.exceptions import InvalidDatabaseException, IncompatibleSnapshotException
+
+MAGIC = b'WURFLSN\x00'
+FORMAT_VERSION = 1
+
+# Magic, format version and length of the marshalled key.
+HEADER = struct.Struct('<8sII')
+
+
+def key(version):
+    '''
+    Returns the key of a snapshot of the given WURFL version written by this
+    process.
+    '''
+    import wurfl_python
+    return (wurfl_python.__version__, tuple(sys.version_info[:2]), sys.byteorder, version)
+
+
+def write(path, engine):
+    '''
+    Writes a snapshot of the given engine (see 'wurfl_python.Engine').
+    '''
+    strings = []
+    string_indexes = {}
+
+    def indexes(values):
+        result = array('I')
+        for value in values:
+            index = string_indexes.get(value)
+            if index is None:
+                index = string_indexes[value] = len(strings)
+                strings.append(value)
+            result.append(index)
+        return result.tostring()
+
+    chain = engine.chain
+    devices = engine.ordinals
+    ordinals = dict((device.id, device.ordinal) for device in devices)
+    inexact_uas = chain._get_inexact_uas()
+    exact_uas = sorted(chain._exact_uas.iteritems())
+    state = (
+        indexes(device.id for device in devices),
+        indexes(device.ua for device in devices),
+        array('i', [device.parent_ordinal for device in devices]).tostring(),
+        array('B', [1 if device.actual_device_root else 0 for device in devices]).tostring(),
+        engine.capabilities.dump(),
+        [(handler.__class__.__name__, [
+            (indexes(bucket.uas), array('I', [ordinals[id] for id in bucket.device_ids]).tostring())
+            for bucket in handler._get_buckets()])
+            for handler in chain._handlers],
+        indexes(ua for ua, device_id in exact_uas),
+        array('I', [ordinals[device_id] for ua, device_id in exact_uas]).tostring(),
+        indexes(sorted(inexact_uas)),
+        strings,
+    )
+    data = marshal.dumps(key(engine.version))
+    with open(path, 'wb') as output:
+        output.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(data)))
+        output.write(data)
+        output.write(marshal.dumps(state))
+
+
+class Snapshot(object):
+    '''
+    Engine state restored from a snapshot file, read at once. If version is
+    given, the snapshot must be of that WURFL version. Devices are created
+    by calling factory with their ordinal, fall back device ordinal, id, ua
+    and actual device root flag.
+    '''
+    def __init__(self, path, factory, version=None):
+        with open(path, 'rb') as input:
+            data = input.read()
+        if len(data) < HEADER.size:
+            raise InvalidDatabaseException('%s is not a WURFL Python snapshot' % path)
+        magic, format_version, length = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise InvalidDatabaseException('%s is not a WURFL Python snapshot' % path)
+        if format_version != FORMAT_VERSION:
+            raise InvalidDatabaseException('Unsupported snapshot format version: %d' % format_version)
+        try:
+            snapshot_key = marshal.loads(data[HEADER.size:HEADER.size + length])
+            self.version = snapshot_key[-1]
+        except (ValueError, EOFError, TypeError, IndexError):
+            raise InvalidDatabaseException('%s is not a WURFL Python snapshot' % path)
+        if snapshot_key != key(self.version):
+            raise IncompatibleSnapshotException(
+                '%s was written by wurfl-python %s on Python %s (%s endian)' % (
+                    path, snapshot_key[0], '.'.join(str(part) for part in snapshot_key[1]), snapshot_key[2]))
+        if version is not None and self.version != version:
+            raise IncompatibleSnapshotException(
+                '%s holds WURFL version %s, not %s' % (path, self.version, version))
+        try:
+            (ids, uas, parents, roots, capabilities, handlers,
+             exact_uas, exact_ordinals, inexact_uas, strings) = marshal.loads(data[HEADER.size + length:])
+        except (ValueError, EOFError, TypeError):
+            raise InvalidDatabaseException('%s is a truncated or corrupted snapshot' % path)
+        del data
+
+        def values(indexes):
+            return map(strings.__getitem__, self._array('I', indexes))
+
+        ids = values(ids)
+        self.devices = map(
+            factory, xrange(len(ids)), self._array('i', parents), ids, values(uas),
+            [root == 1 for root in self._array('B', roots)])
+        self.capabilities = Store.restore(capabilities)
+        self.handlers = [
+            (name, [
+                Bucket.from_sorted(values(bucket_uas), [ids[ordinal] for ordinal in self._array('I', ordinals)])
+                for bucket_uas, ordinals in buckets])
+            for name, buckets in handlers]
+        self.exact_uas = dict(zip(
+            values(exact_uas), [ids[ordinal] for ordinal in self._array('I', exact_ordinals)]))
+        self.inexact_uas = values(inexact_uas)
+
+    def _array(self, typecode, data):
+        result = array(typecode)
+        result.fromstring(data)
+        return result